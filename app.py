@@ -8,16 +8,16 @@ from pathlib import Path
 import streamlit as st
 
 # ====== IMPORTS ======
-from corelogic import get_llm
-from utils import extract_text_from_pdf_bytes, resumen_documento
-from promots import get_prompt_summary_str
 from database_supabase import (
     init_database,
-    guardar_analisis,
-    buscar_por_nombre_pdf,
-    is_production
+    is_production,
+    listar_historial,
+    obtener_analisis_por_id,
+    obtener_estadisticas,
+    obtener_consumo_tokens
 )
-from table_generator import generar_tablas_desde_resumen
+from trabajos import obtener_gestor, ESTADO_PENDIENTE, ESTADO_EN_PROCESO, ESTADO_COMPLETADO, ESTADO_ERROR
+from metricas import iniciar_metricas
 
 # ====================================
 
@@ -29,6 +29,21 @@ HERO_PATH = ASSETS / "banner.png"
 LOGO = ASSETS / "logo.png"
 CORP = "#0f6db4"
 
+# Texto de cada etapa del procesamiento por lotes
+ETIQUETAS_ETAPA = {
+    "en_cola": "🕒 En cola",
+    "extrayendo": "🔍 Extrayendo texto...",
+    "extraido": "📄 Texto extraído, esperando al modelo",
+    "resumiendo": "📝 Generando resumen...",
+    "tablas": "📊 Generando tablas...",
+    "listo": "✅ Listo",
+    "cache": "📚 Disponible en caché",
+    "error": "❌ Error",
+}
+
+# Registros por página en el historial
+HISTORIAL_POR_PAGINA = 20
+
 st.set_page_config(
     page_title="Analizador MultiPDF IA - Magnetron",
     page_icon=str(LOGO) if LOGO.exists() else "📄",
@@ -130,6 +145,265 @@ def hero_header(title, subtitle):
         unsafe_allow_html=True
     )
 
+def formatear_metricas(metricas):
+    """Texto corto con el tiempo al primer token y total de cada etapa"""
+    partes = []
+    for etapa, valores in metricas.items():
+        ttft = valores.get("ttft_s")
+        ttft_txt = f"{ttft:.1f}s" if ttft is not None else "—"
+        partes.append(f"{etapa}: primer token {ttft_txt} · total {valores['total_s']:.1f}s")
+    return " | ".join(partes)
+
+def formatear_consumo(consumo):
+    """Texto corto con los tokens y el costo del análisis"""
+    texto = (f"{consumo['llamadas']} llamadas · {consumo['tokens_entrada']:,} tokens de entrada · "
+             f"{consumo['tokens_salida']:,} de salida")
+    if consumo.get("costo_usd") is not None:
+        texto += f" · US$ {consumo['costo_usd']:.4f}"
+    return texto
+
+def mostrar_progreso(progreso):
+    """Una línea de estado por archivo según el avance informado por el trabajo"""
+    for nombre, estado in progreso.items():
+        etiqueta = ETIQUETAS_ETAPA.get(estado["etapa"], estado["etapa"])
+        if estado.get("error"):
+            etiqueta = f"{etiqueta}: {estado['error']}"
+        st.markdown(f"**{nombre}** — {etiqueta}")
+        if estado.get("avance") is not None:
+            st.progress(estado["avance"], text=estado.get("detalle"))
+        elif estado.get("detalle"):
+            st.caption(estado["detalle"])
+
+def cargar_resultados(trabajo):
+    """Pasa los resultados de un trabajo terminado al session_state"""
+    resultados = trabajo["resultados"]
+    st.session_state.cache_info = None
+    st.session_state.metricas = {}
+    st.session_state.consumo = None
+    
+    if len(resultados) == 1 and (len(trabajo["nombres"]) == 1 or trabajo["combinado"]):
+        resultado = resultados[0]
+        st.session_state.ultimo_resumen = resultado["resumen"]
+        st.session_state.ultimas_tablas = resultado.get("tablas")
+        st.session_state.nombre_pdfs = resultado["nombre"]
+        st.session_state.metricas = resultado.get("metricas") or {}
+        st.session_state.consumo = resultado.get("consumo")
+        st.session_state.resultados_lote = []
+        if resultado.get("desde_cache"):
+            st.session_state.cache_info = {"nombre": resultado["nombre"], "fecha_hora": resultado.get("fecha_hora")}
+    else:
+        st.session_state.ultimo_resumen = None
+        st.session_state.ultimas_tablas = None
+        st.session_state.nombre_pdfs = ""
+        st.session_state.resultados_lote = resultados
+
+def cargar_analisis_historial(analisis_id):
+    """Trae el texto completo de un análisis del historial al session_state"""
+    analisis = obtener_analisis_por_id(analisis_id)
+    if not analisis:
+        st.error("❌ No se pudo cargar el análisis")
+        return
+    st.session_state.ultimo_resumen = analisis["resumen"]
+    st.session_state.ultimas_tablas = analisis.get("tablas_tecnicas")
+    st.session_state.nombre_pdfs = analisis["nombre_pdf"]
+    st.session_state.metricas = {}
+    st.session_state.consumo = None
+    st.session_state.resultados_lote = []
+    st.session_state.cache_info = None
+    st.rerun()
+
+@st.fragment
+def panel_historial():
+    """
+    Historial de análisis guardados, por páginas y solo con metadatos; el
+    resumen y las tablas se cargan al pulsar "Ver".
+    """
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        prefijo = st.text_input("Nombre del PDF empieza por", key="historial_prefijo").strip()
+    with col2:
+        fechas = st.date_input("Fechas", value=(), key="historial_fechas")
+    with col3:
+        solo_mios = st.checkbox("Solo los míos", value=True, key="historial_solo_mios")
+    
+    # Cursor de inicio de cada página visitada; se reinicia al cambiar los filtros
+    filtros = (prefijo, tuple(fechas), solo_mios)
+    if st.session_state.historial_filtros != filtros:
+        st.session_state.historial_filtros = filtros
+        st.session_state.historial_cursores = [None]
+    cursores = st.session_state.historial_cursores
+    
+    registros, siguiente = listar_historial(
+        usuario=st.session_state.usuario if solo_mios else None,
+        desde=fechas[0] if len(fechas) > 0 else None,
+        hasta=fechas[1] if len(fechas) > 1 else None,
+        prefijo_nombre=prefijo or None,
+        despues_de=cursores[-1],
+        limite=HISTORIAL_POR_PAGINA
+    )
+    if not registros:
+        st.caption("Sin análisis para estos filtros")
+    for registro in registros:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            fecha = registro["fecha_hora"].strftime('%d/%m/%Y %H:%M')
+            detalle = f"{registro['usuario']} · {fecha}"
+            if registro.get("costo_usd") is not None:
+                detalle += f" · US$ {registro['costo_usd']:.4f}"
+            st.markdown(f"**{registro['nombre_pdf']}** — {detalle}")
+        with col2:
+            if st.button("👁️ Ver", key=f"historial_{registro['id']}", use_container_width=True):
+                cargar_analisis_historial(registro["id"])
+    
+    col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+    with col_anterior:
+        if st.button("⬅️ Anterior", key="historial_anterior", disabled=len(cursores) == 1,
+                     use_container_width=True):
+            cursores.pop()
+            st.rerun(scope="fragment")
+    with col_pagina:
+        st.caption(f"Página {len(cursores)}")
+    with col_siguiente:
+        if st.button("Siguiente ➡️", key="historial_siguiente", disabled=siguiente is None,
+                     use_container_width=True):
+            cursores.append(siguiente)
+            st.rerun(scope="fragment")
+
+def panel_estadisticas():
+    """Totales del historial y consumo de tokens por usuario y por día"""
+    estadisticas = obtener_estadisticas()
+    col1, col2 = st.columns(2)
+    col1.metric("Análisis", estadisticas["total_analisis"])
+    col2.metric("Usuarios", estadisticas["total_usuarios"])
+    if estadisticas["top_usuarios"]:
+        st.caption("Más activos: " + " · ".join(f"{usuario} ({total})" for usuario, total in estadisticas["top_usuarios"]))
+    
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        dias = st.selectbox("Período", [7, 30, 90], index=1, format_func=lambda d: f"Últimos {d} días",
+                            key="consumo_dias")
+    with col2:
+        solo_mios = st.checkbox("Solo mi consumo", key="consumo_solo_mios")
+    consumo = obtener_consumo_tokens(dias=dias, usuario=st.session_state.usuario if solo_mios else None)
+    if not consumo:
+        st.caption("Sin consumo registrado en el período")
+        return
+    
+    filas = [
+        {
+            "Día": fila["dia"],
+            # Las filas antiguas sin usuario se guardan con usuario ''
+            "Usuario": fila["usuario"] or "(sin usuario)",
+            "Análisis": fila["analisis"],
+            "Llamadas": fila["llamadas_llm"],
+            "Tokens entrada": fila["tokens_entrada"],
+            "Tokens salida": fila["tokens_salida"],
+            "Costo US$": float(fila["costo_usd"]),
+        }
+        for fila in consumo
+    ]
+    st.caption(
+        f"🔢 {sum(f['Tokens entrada'] for f in filas):,} tokens de entrada · "
+        f"{sum(f['Tokens salida'] for f in filas):,} de salida · "
+        f"US$ {sum(f['Costo US$'] for f in filas):.4f}"
+    )
+    st.dataframe(filas, use_container_width=True, hide_index=True)
+
+def enviar_trabajo(archivos, combinado=False, forzar=False):
+    """Encola el análisis en segundo plano y deja su ID en la sesión"""
+    st.session_state.trabajo_id = obtener_gestor().enviar(
+        st.session_state.usuario, archivos, combinado=combinado, forzar=forzar
+    )
+    st.session_state.cache_info = None
+    st.rerun()
+
+@st.fragment(run_every=1.5)
+def panel_trabajo():
+    """
+    Consulta periódicamente el trabajo en curso y muestra su avance.
+    Al terminar, carga los resultados y vuelve a ejecutar la app completa.
+    """
+    trabajo_id = st.session_state.get("trabajo_id")
+    if not trabajo_id:
+        return
+    
+    trabajo = obtener_gestor().obtener(trabajo_id)
+    if trabajo is None:
+        st.session_state.trabajo_id = None
+        return
+    
+    if trabajo["estado"] == ESTADO_COMPLETADO:
+        st.session_state.trabajo_id = None
+        cargar_resultados(trabajo)
+        st.rerun(scope="app")
+    elif trabajo["estado"] == ESTADO_ERROR:
+        st.session_state.trabajo_id = None
+        st.error(f"❌ Error: {trabajo['error']}")
+    elif trabajo["estado"] == ESTADO_PENDIENTE:
+        posicion = trabajo.get("posicion")
+        st.info(f"🕒 Análisis en cola{f' (posición {posicion})' if posicion else ''}. Puedes cerrar la pestaña y volver más tarde.")
+    else:
+        st.info("⏳ Procesando en segundo plano. Puedes cerrar la pestaña y volver más tarde.")
+        mostrar_progreso(trabajo["progreso"])
+        
+        # Texto parcial del resumen y las tablas mientras se generan
+        parcial = trabajo.get("parcial")
+        if parcial and parcial["resumen"]:
+            st.markdown("---")
+            col_resumen, col_tablas = st.columns([1, 1])
+            with col_resumen:
+                st.markdown("### 📄 Resumen Ejecutivo")
+                st.markdown(parcial["resumen"] + " ▌")
+            with col_tablas:
+                st.markdown("### 📊 Tablas Técnicas")
+                for numero in sorted(parcial["tablas"]):
+                    st.markdown(parcial["tablas"][numero])
+
+def mostrar_resultado(nombre, resumen, tablas, metricas=None, clave="", consumo=None):
+    """Muestra un resumen y sus tablas en dos columnas con botones de descarga"""
+    # Dos columnas: Resumen | Tablas
+    col_resumen, col_tablas = st.columns([1, 1])
+    
+    with col_resumen:
+        st.markdown("### 📄 Resumen Ejecutivo")
+        if nombre:
+            st.caption(f"📎 **Archivo:** {nombre}")
+        if metricas:
+            st.caption(f"⏱️ {formatear_metricas(metricas)}")
+        if consumo:
+            st.caption(f"🔢 {formatear_consumo(consumo)}")
+        
+        st.markdown(resumen)
+        
+        # Botón descarga resumen
+        nombre_archivo = limpiar_nombre_archivo(nombre)
+        st.download_button(
+            label="📥 Descargar Resumen (TXT)",
+            data=resumen,
+            file_name=f"resumen_{nombre_archivo}.txt",
+            mime="text/plain",
+            use_container_width=True,
+            key=f"download_resumen{clave}"
+        )
+    
+    with col_tablas:
+        st.markdown("### 📊 Tablas Técnicas")
+        
+        if tablas:
+            st.markdown(tablas)
+            
+            # Botón descarga tablas
+            st.download_button(
+                label="📥 Descargar Tablas (Markdown)",
+                data=tablas,
+                file_name=f"tablas_{nombre_archivo}.md",
+                mime="text/markdown",
+                use_container_width=True,
+                key=f"download_tablas{clave}"
+            )
+        else:
+            st.info("⏳ Las tablas se generan automáticamente después del resumen")
+
 # -----------------------------
 # PANTALLA DE BIENVENIDA
 # -----------------------------
@@ -179,12 +453,34 @@ def main():
     if 'nombre_pdfs' not in st.session_state:
         st.session_state.nombre_pdfs = ""
 
+    if 'metricas' not in st.session_state:
+        st.session_state.metricas = {}
+
+    if 'consumo' not in st.session_state:
+        st.session_state.consumo = None
+
+    if 'resultados_lote' not in st.session_state:
+        st.session_state.resultados_lote = []
+
+    if 'trabajo_id' not in st.session_state:
+        st.session_state.trabajo_id = None
+
+    if 'cache_info' not in st.session_state:
+        st.session_state.cache_info = None
+
+    if 'historial_cursores' not in st.session_state:
+        st.session_state.historial_cursores = [None]
+        st.session_state.historial_filtros = None
+
     # Inicializar BD
     try:
         init_database()
     except:
         pass
 
+    # Log JSON de etapas y endpoint /metrics (si METRICAS_PUERTO está definido)
+    iniciar_metricas()
+
     # Control de sesión
     if not st.session_state.usuario:
         pantalla_bienvenida()
@@ -207,8 +503,20 @@ def main():
             st.session_state.ultimo_resumen = None
             st.session_state.ultimas_tablas = None
             st.session_state.nombre_pdfs = ""
+            st.session_state.metricas = {}
+            st.session_state.consumo = None
+            st.session_state.resultados_lote = []
+            st.session_state.trabajo_id = None
+            st.session_state.cache_info = None
             st.rerun()
 
+    # Reanudar el seguimiento de un trabajo activo tras una reconexión
+    if not st.session_state.trabajo_id:
+        for trabajo in obtener_gestor().listar(st.session_state.usuario, limite=5):
+            if trabajo["estado"] in (ESTADO_PENDIENTE, ESTADO_EN_PROCESO):
+                st.session_state.trabajo_id = trabajo["id"]
+                break
+
     # Descripción
     st.info(
         "📋 **Sube uno o varios pliegos en PDF** y genera un **Resumen Ejecutivo** "
@@ -218,120 +526,93 @@ def main():
     # Carga de archivos
     st.markdown("### 📁 Arrastra o selecciona tus archivos PDF")
 
-    uploaded_file = st.file_uploader(
+    uploaded_files = st.file_uploader(
         "Limit 200MB per file • PDF",
         type=["pdf"],
+        accept_multiple_files=True,
         help="Arrastra tus archivos PDF aquí"
     )
+    uploaded_file = uploaded_files[0] if len(uploaded_files or []) == 1 else None
+
+    # Procesamiento por lotes (varios archivos)
+    if uploaded_files and len(uploaded_files) > 1:
+        st.success(f"✅ {len(uploaded_files)} archivos cargados: " + ", ".join(f"**{a.name}**" for a in uploaded_files))
+
+        modo = st.radio(
+            "Tipo de resumen",
+            ["📑 Un resumen por archivo", "🧩 Un resumen combinado del conjunto"],
+            horizontal=True,
+            help="El resumen combinado trata todos los archivos como un mismo pliego (p. ej. pliego principal + anexos)"
+        )
+        combinado = modo.startswith("🧩")
+
+        if st.button("🚀 Generar Resúmenes y Tablas", type="primary", use_container_width=True,
+                     disabled=bool(st.session_state.trabajo_id)):
+            enviar_trabajo(
+                [(archivo.name, archivo.getbuffer()) for archivo in uploaded_files],
+                combinado=combinado
+            )
 
     # Procesamiento
     if uploaded_file:
         st.success(f"✅ Archivo cargado: **{uploaded_file.name}**")
 
-        if st.button("🚀 Generar Resumen y Tablas", type="primary", use_container_width=True):
-            with st.spinner("⏳ Procesando PDF..."):
-                try:
-                    nombre_pdf = uploaded_file.name
-
-                    # Buscar en BD
-                    analisis_existente = buscar_por_nombre_pdf(nombre_pdf)
-
-                    regenerar = False
-
-                    if analisis_existente:
-                        st.info(f"📚 Este PDF ya fue analizado el {analisis_existente['fecha_hora'].strftime('%d/%m/%Y %H:%M')}")
-
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            st.success("✅ Resumen disponible en caché")
-                        with col2:
-                            regenerar = st.button("🔄 Regenerar", key="regenerar")
-
-                        if not regenerar:
-                            st.session_state.ultimo_resumen = analisis_existente['resumen']
-                            st.session_state.ultimas_tablas = analisis_existente.get('tablas_tecnicas')
-                            st.session_state.nombre_pdfs = nombre_pdf
-                            st.rerun()
-
-                    # Procesar
-                    if not analisis_existente or regenerar:
-                        pdf_bytes = uploaded_file.read()
-                        docs = extract_text_from_pdf_bytes(pdf_bytes, nombre_pdf)
-
-                        if not docs:
-                            st.error("⚠️ No se pudo extraer texto del PDF")
-                        else:
-                            llm = get_llm()
-                            prompt = get_prompt_summary_str()
-                            
-                            # Generar resumen
-                            with st.spinner("📝 Generando resumen ejecutivo..."):
-                                resumen = resumen_documento(docs, llm, prompt)
-                                st.session_state.ultimo_resumen = resumen
-                            
-                            # Generar tablas en paralelo
-                            with st.spinner("📊 Generando tablas técnicas en paralelo..."):
-                                tablas = generar_tablas_desde_resumen(resumen, llm)
-                                st.session_state.ultimas_tablas = tablas
-                            
-                            st.session_state.nombre_pdfs = nombre_pdf
-
-                            try:
-                                guardar_analisis(
-                                    nombre_archivo=nombre_pdf,
-                                    resumen=resumen,
-                                    tablas=tablas
-                                )
-                            except Exception as e:
-                                st.warning(f"⚠️ No se pudo guardar en BD: {e}")
-
-                            st.rerun()
-
-                except Exception as e:
-                    st.error(f"❌ Error: {e}")
+        if st.button("🚀 Generar Resumen y Tablas", type="primary", use_container_width=True,
+                     disabled=bool(st.session_state.trabajo_id)):
+            enviar_trabajo([(uploaded_file.name, uploaded_file.getbuffer())])
+
+        # Resultado recuperado de la caché: permitir regenerarlo
+        cache_info = st.session_state.cache_info
+        if cache_info and cache_info["nombre"] == uploaded_file.name and not st.session_state.trabajo_id:
+            st.info(f"📚 Este PDF ya fue analizado el {cache_info['fecha_hora']}")
+
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.success("✅ Resumen disponible en caché")
+            with col2:
+                if st.button("🔄 Regenerar", key="regenerar", use_container_width=True):
+                    enviar_trabajo([(uploaded_file.name, uploaded_file.getbuffer())], forzar=True)
+
+    # Avance del trabajo en segundo plano
+    panel_trabajo()
+
+    # Trabajos recientes del usuario (sobreviven a reconexiones)
+    trabajos_recientes = obtener_gestor().listar(st.session_state.usuario, limite=5)
+    if trabajos_recientes:
+        with st.expander("🗂️ Mis análisis recientes"):
+            for trabajo in trabajos_recientes:
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    creado = time.strftime('%d/%m/%Y %H:%M', time.localtime(trabajo["creado"]))
+                    st.markdown(f"**{', '.join(trabajo['nombres'])}** — {trabajo['estado']} · {creado}")
+                with col2:
+                    if trabajo["estado"] == ESTADO_COMPLETADO and st.button("👁️ Ver", key=f"ver_{trabajo['id']}", use_container_width=True):
+                        cargar_resultados(trabajo)
+                        st.rerun()
+
+    # Historial guardado en la base de datos
+    if is_production():
+        with st.expander("📚 Historial de análisis"):
+            panel_historial()
+        with st.expander("📊 Estadísticas y consumo del LLM"):
+            panel_estadisticas()
 
     # Mostrar resultados en dos columnas
     if st.session_state.ultimo_resumen:
         st.markdown("---")
-        
-        # Dos columnas: Resumen | Tablas
-        col_resumen, col_tablas = st.columns([1, 1])
-        
-        with col_resumen:
-            st.markdown("### 📄 Resumen Ejecutivo")
-            if st.session_state.nombre_pdfs:
-                st.caption(f"📎 **Archivo:** {st.session_state.nombre_pdfs}")
-            
-            st.markdown(st.session_state.ultimo_resumen)
-            
-            # Botón descarga resumen
-            nombre_archivo = limpiar_nombre_archivo(st.session_state.nombre_pdfs)
-            st.download_button(
-                label="📥 Descargar Resumen (TXT)",
-                data=st.session_state.ultimo_resumen,
-                file_name=f"resumen_{nombre_archivo}.txt",
-                mime="text/plain",
-                use_container_width=True,
-                key="download_resumen"
-            )
-        
-        with col_tablas:
-            st.markdown("### 📊 Tablas Técnicas")
-            
-            if st.session_state.ultimas_tablas:
-                st.markdown(st.session_state.ultimas_tablas)
-                
-                # Botón descarga tablas
-                st.download_button(
-                    label="📥 Descargar Tablas (Markdown)",
-                    data=st.session_state.ultimas_tablas,
-                    file_name=f"tablas_{nombre_archivo}.md",
-                    mime="text/markdown",
-                    use_container_width=True,
-                    key="download_tablas"
-                )
-            else:
-                st.info("⏳ Las tablas se generan automáticamente después del resumen")
+        mostrar_resultado(
+            st.session_state.nombre_pdfs,
+            st.session_state.ultimo_resumen,
+            st.session_state.ultimas_tablas,
+            st.session_state.metricas,
+            consumo=st.session_state.consumo
+        )
+    elif st.session_state.resultados_lote:
+        st.markdown("---")
+        pestanas = st.tabs([resultado["nombre"] for resultado in st.session_state.resultados_lote])
+        for i, (pestana, resultado) in enumerate(zip(pestanas, st.session_state.resultados_lote)):
+            with pestana:
+                mostrar_resultado(resultado["nombre"], resultado["resumen"], resultado["tablas"], clave=f"_{i}")
 
     # Footer
     st.markdown("---")
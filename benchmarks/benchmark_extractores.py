@@ -0,0 +1,138 @@
+"""
+benchmark_extractores.py - Comparación de los backends de extracción de texto
+
+Para cada backend instalado (ver extractores.py) mide sobre una carpeta de
+PDFs de muestra: páginas por segundo, caracteres extraídos, páginas casi
+vacías (que irían a OCR) y memoria pico. Cada backend corre en un proceso
+nuevo para que la memoria pico de una librería no contamine a las demás.
+
+Uso:
+    python benchmarks/benchmark_extractores.py <carpeta> [--extractores pypdf pymupdf]
+        [--repeticiones 3] [--json resultados.json]
+"""
+
+import sys
+import json
+import time
+import argparse
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from extractores import EXTRACTORES, extractores_disponibles, extraer_textos  # noqa: E402
+from utils import UMBRAL_CHARS_OCR  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    # Windows: sin getrusage no se informa la memoria pico
+    resource = None
+
+
+def _pico_rss_mb(hijos=False):
+    """
+    Memoria residente máxima del proceso hasta ahora, en MB. Con hijos=True,
+    la del mayor de sus procesos hijos ya terminados (p. ej. workers de OCR).
+    """
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_CHILDREN if hijos else resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB y macOS bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def medir_extractor(extractor, rutas, repeticiones):
+    """
+    Extrae todos los PDFs con un backend y devuelve sus métricas.
+    Pensado para ejecutarse en un proceso recién creado.
+    """
+    importlib.import_module(EXTRACTORES[extractor][1])
+    rss_base = _pico_rss_mb()
+
+    paginas = caracteres = vacias = paginas_procesadas = 0
+    segundos = 0.0
+    errores = []
+    for ruta in rutas:
+        pdf_bytes = Path(ruta).read_bytes()
+        for repeticion in range(repeticiones):
+            inicio = time.perf_counter()
+            try:
+                textos = extraer_textos(pdf_bytes, extractor)
+            except Exception as e:
+                errores.append(f"{Path(ruta).name}: {e}")
+                break
+            segundos += time.perf_counter() - inicio
+            paginas_procesadas += len(textos)
+            if repeticion == 0:
+                paginas += len(textos)
+                caracteres += sum(len(texto.strip()) for texto in textos)
+                vacias += sum(1 for texto in textos if len(texto.strip()) < UMBRAL_CHARS_OCR)
+
+    rss_pico = _pico_rss_mb()
+    return {
+        "extractor": extractor,
+        "archivos": len(rutas),
+        "paginas": paginas,
+        "segundos": round(segundos, 3),
+        "paginas_por_segundo": round(paginas_procesadas / segundos, 1) if segundos else None,
+        "caracteres": caracteres,
+        "paginas_vacias": vacias,
+        "memoria_pico_mb": round(rss_pico - rss_base, 1) if rss_pico is not None else None,
+        "errores": errores,
+    }
+
+
+def _en_proceso_nuevo(extractor, rutas, repeticiones):
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+        return pool.submit(medir_extractor, extractor, rutas, repeticiones).result()
+
+
+def imprimir_tabla(resultados):
+    """Tabla comparativa; el % de texto es relativo al backend que más extrajo"""
+    max_caracteres = max((r["caracteres"] for r in resultados), default=0) or 1
+    print(f"\n{'Extractor':<11}{'Pág/s':>9}{'Páginas':>9}{'Caracteres':>12}{'% texto':>9}{'Vacías':>8}{'Pico MB':>9}")
+    for r in sorted(resultados, key=lambda r: r["paginas_por_segundo"] or 0, reverse=True):
+        pico = f"{r['memoria_pico_mb']:.1f}" if r["memoria_pico_mb"] is not None else "-"
+        print(f"{r['extractor']:<11}{r['paginas_por_segundo'] or 0:>9.1f}{r['paginas']:>9}{r['caracteres']:>12}"
+              f"{100 * r['caracteres'] / max_caracteres:>8.1f}%{r['paginas_vacias']:>8}{pico:>9}")
+        for error in r["errores"]:
+            print(f"   ❌ {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara los backends de extracción de texto de PDFs")
+    parser.add_argument("carpeta", help="Carpeta con PDFs de muestra")
+    parser.add_argument("--extractores", nargs="+", choices=list(EXTRACTORES),
+                        help="Backends a comparar (por defecto, todos los instalados)")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Extracciones por archivo")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    rutas = sorted(str(ruta) for ruta in Path(args.carpeta).glob("*.pdf"))
+    if not rutas:
+        parser.error(f"No hay PDFs en '{args.carpeta}'")
+
+    disponibles = extractores_disponibles()
+    extractores = args.extractores or disponibles
+    for extractor in extractores:
+        if extractor not in disponibles:
+            print(f"⚠️ {extractor} no está instalado, se omite")
+    extractores = [extractor for extractor in extractores if extractor in disponibles]
+
+    resultados = []
+    for extractor in extractores:
+        print(f"⏱️ {extractor}: {len(rutas)} archivos × {args.repeticiones} repeticiones...")
+        resultados.append(_en_proceso_nuevo(extractor, rutas, args.repeticiones))
+
+    imprimir_tabla(resultados)
+    if args.json:
+        Path(args.json).write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
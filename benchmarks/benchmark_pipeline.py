@@ -0,0 +1,243 @@
+"""
+benchmark_pipeline.py - Benchmark de punta a punta sobre el corpus sintético
+
+Para cada PDF del corpus (ver corpus_sintetico.py) ejecuta el pipeline
+completo con el LLM simulado (llm_simulado.py, sin red) y mide por etapa:
+
+    extraccion   extract_text_from_pdf_bytes (incluye el OCR)
+    ocr          solo el OCR de las páginas escaneadas
+    resumen_llm  resumen_documento
+    tablas_llm   generar_tablas_desde_resumen
+    tablas_excel extraer_tabla_individual + convertir_markdown_a_texto_excel
+    total        todo lo anterior
+
+con latencia p50/p95, páginas por segundo y memoria pico (del proceso y del
+mayor worker de OCR). Cada PDF corre en un proceso nuevo. La caché OCR va a
+una carpeta temporal y no retiene entradas: se mide el OCR real y la caché
+de la app no se toca.
+
+Uso:
+    python benchmarks/benchmark_pipeline.py [--corpus benchmarks/corpus] [--generar]
+        [--tipos digital mixto] [--tamanos 10 100] [--repeticiones 3]
+        [--latencia 0.05] [--tokens-por-segundo 2000] [--extractor pypdf] [--json resultados.json]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import platform
+import subprocess
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from corpus_sintetico import TIPOS, TAMANOS, generar_corpus  # noqa: E402
+from benchmark_extractores import _pico_rss_mb  # noqa: E402
+from llm_simulado import LLMSimulado  # noqa: E402
+from metricas import acumular_etapas  # noqa: E402
+from promots import get_prompt_summary_str  # noqa: E402
+from table_generator import (  # noqa: E402
+    generar_tablas_desde_resumen,
+    extraer_tabla_individual,
+    convertir_markdown_a_texto_excel
+)
+from extractores import EXTRACTORES, EXTRACTOR_POR_DEFECTO  # noqa: E402
+from utils import (  # noqa: E402
+    extract_text_from_pdf_bytes,
+    resumen_documento,
+    cerrar_pool_ocr,
+    MODO_COMPLETO,
+    NIVEL_ERROR
+)
+
+CORPUS_POR_DEFECTO = Path(__file__).resolve().with_name("corpus")
+ETAPAS = ("extraccion", "ocr", "resumen_llm", "tablas_llm", "tablas_excel", "total")
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) con interpolación lineal"""
+    valores = sorted(valores)
+    if not valores:
+        return None
+    posicion = (len(valores) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicion - inferior)
+
+
+def medir_documento(ruta, repeticiones, latencia, tokens_por_segundo, extractor=EXTRACTOR_POR_DEFECTO):
+    """
+    Ejecuta el pipeline completo sobre un PDF y devuelve sus mediciones.
+    Pensado para ejecutarse en un proceso recién creado.
+    """
+    errores = []
+
+    def solo_errores(nivel, mensaje, avance=None):
+        if nivel == NIVEL_ERROR and mensaje not in errores:
+            errores.append(mensaje)
+
+    llm = LLMSimulado(distribucion="fija", latencia_media_s=latencia, tokens_por_segundo=tokens_por_segundo)
+    pdf_bytes = Path(ruta).read_bytes()
+    rss_base = _pico_rss_mb()
+
+    tiempos = {etapa: [] for etapa in ETAPAS}
+    memoria = {}
+    paginas = 0
+    for _ in range(repeticiones):
+        duraciones = {}
+        inicio = time.perf_counter()
+        try:
+            with acumular_etapas(duraciones):
+                docs = extract_text_from_pdf_bytes(pdf_bytes, Path(ruta).name, progreso=solo_errores,
+                                                   extractor=extractor)
+                memoria.setdefault("extraccion", _pico_rss_mb())
+                resumen = resumen_documento(docs, llm, get_prompt_summary_str(), progreso=solo_errores,
+                                            modo=MODO_COMPLETO)
+                memoria.setdefault("resumen_llm", _pico_rss_mb())
+                tablas = generar_tablas_desde_resumen(resumen, llm)
+
+            inicio_excel = time.perf_counter()
+            for numero in (1, 2):
+                convertir_markdown_a_texto_excel(extraer_tabla_individual(tablas, numero))
+            duraciones["tablas_excel"] = time.perf_counter() - inicio_excel
+        except Exception as e:
+            errores.append(str(e))
+            break
+        duraciones["total"] = time.perf_counter() - inicio
+        paginas = len(docs)
+        for etapa in ETAPAS:
+            if etapa in duraciones:
+                tiempos[etapa].append(duraciones[etapa])
+
+    memoria.setdefault("total", _pico_rss_mb())
+    # Los workers de OCR son procesos aparte: al terminarlos, su pico queda
+    # en RUSAGE_CHILDREN
+    cerrar_pool_ocr()
+    pico_workers_ocr = _pico_rss_mb(hijos=True)
+    etapas = {}
+    for etapa, valores in tiempos.items():
+        if not valores:
+            continue
+        p50 = percentil(valores, 50)
+        etapas[etapa] = {
+            "p50_s": round(p50, 4),
+            "p95_s": round(percentil(valores, 95), 4),
+            "max_s": round(max(valores), 4),
+            "paginas_por_segundo": round(paginas / p50, 1) if p50 and paginas else None,
+        }
+    return {
+        "archivo": Path(ruta).name,
+        "paginas": paginas,
+        "repeticiones": len(tiempos["total"]),
+        "etapas": etapas,
+        # Memoria residente máxima acumulada al terminar cada etapa (sobre la base del proceso)
+        "memoria_pico_mb": {
+            etapa: round(valor - rss_base, 1) for etapa, valor in memoria.items()
+            if valor is not None and rss_base is not None
+        },
+        # Memoria residente máxima de un worker de OCR (0 si no hubo OCR)
+        "memoria_pico_worker_ocr_mb": round(pico_workers_ocr, 1) if pico_workers_ocr is not None else None,
+        "errores": errores,
+    }
+
+
+def _en_proceso_nuevo(*args):
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+        return pool.submit(medir_documento, *args).result()
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir_tabla(resultados):
+    """p50/p95 por etapa y memoria pico de cada documento"""
+    print(f"\n{'Archivo':<30}{'Etapa':<14}{'p50 s':>9}{'p95 s':>9}{'Pág/s':>9}{'Pico MB':>9}")
+    for r in resultados:
+        for etapa, valores in r["etapas"].items():
+            pico = r["memoria_pico_mb"].get(etapa)
+            print(f"{r['archivo']:<30}{etapa:<14}{valores['p50_s']:>9.3f}{valores['p95_s']:>9.3f}"
+                  f"{valores['paginas_por_segundo'] or 0:>9.1f}{pico if pico is not None else '-':>9}")
+        if r.get("memoria_pico_worker_ocr_mb"):
+            print(f"{r['archivo']:<30}{'worker ocr':<14}{'':>27}{r['memoria_pico_worker_ocr_mb']:>9}")
+        for error in r["errores"]:
+            print(f"   ❌ {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta con el LLM simulado")
+    parser.add_argument("--corpus", default=str(CORPUS_POR_DEFECTO), help="Carpeta del corpus sintético")
+    parser.add_argument("--generar", action="store_true", help="Generar (o regenerar) el corpus antes de medir")
+    parser.add_argument("--tipos", nargs="+", choices=TIPOS, default=list(TIPOS))
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS), help="Páginas por PDF")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Ejecuciones del pipeline por PDF")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latencia del LLM simulado, en segundos")
+    parser.add_argument("--tokens-por-segundo", type=float, default=2000, help="Ritmo del LLM simulado")
+    parser.add_argument("--extractor", choices=list(EXTRACTORES), default=EXTRACTOR_POR_DEFECTO,
+                        help="Backend de extracción de texto")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    corpus = Path(args.corpus)
+    if args.generar or not (corpus / "corpus.json").exists():
+        generar_corpus(corpus, args.tamanos, args.tipos)
+    manifiesto = json.loads((corpus / "corpus.json").read_text(encoding="utf-8"))["archivos"]
+    seleccion = [
+        entrada for entrada in manifiesto
+        if entrada["tipo"] in args.tipos and entrada["paginas"] in args.tamanos
+    ]
+    if not seleccion:
+        parser.error("El corpus no tiene PDFs con esos tipos y tamaños (use --generar)")
+
+    # Los procesos de medición heredan el entorno y lo leen al importar:
+    # sin log JSON por span y con la caché OCR en una carpeta temporal, con
+    # máximo 0 para que cada entrada se desaloje al guardarse (la caché real
+    # de la app, .cache_ocr, no se abre)
+    os.environ["METRICAS_LOG"] = os.devnull
+    os.environ["CACHE_OCR_MAX_MB"] = "0"
+
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="benchmark_cache_ocr_") as cache_ocr:
+        os.environ["CACHE_OCR_DIR"] = cache_ocr
+        for entrada in seleccion:
+            print(f"⏱️ {entrada['archivo']}: {args.repeticiones} repeticiones...")
+            resultado = _en_proceso_nuevo(str(corpus / entrada["archivo"]), args.repeticiones,
+                                          args.latencia, args.tokens_por_segundo, args.extractor)
+            resultado.update(tipo=entrada["tipo"], paginas_escaneadas=entrada["paginas_escaneadas"])
+            resultados.append(resultado)
+
+    imprimir_tabla(resultados)
+    if args.json:
+        informe = {
+            "fecha_hora": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_actual(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "parametros": {
+                "repeticiones": args.repeticiones,
+                "latencia_llm_s": args.latencia,
+                "tokens_por_segundo": args.tokens_por_segundo,
+                "extractor": args.extractor,
+            },
+            "resultados": resultados,
+        }
+        Path(args.json).write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
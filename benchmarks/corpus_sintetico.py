@@ -0,0 +1,269 @@
+"""
+corpus_sintetico.py - Corpus reproducible de pliegos técnicos sintéticos
+
+Genera PDFs con contenido técnico en español (tensiones, BIL, kVA, pérdidas,
+normas, accesorios) en tres variantes:
+
+    digital    todas las páginas con capa de texto
+    escaneado  todas las páginas como imagen (van a OCR)
+    mixto      páginas digitales con ~25 % de páginas escaneadas intercaladas
+
+Con la misma semilla los archivos son idénticos byte a byte, así que los
+resultados de benchmark_pipeline.py son comparables entre ejecuciones. El
+PDF se escribe a mano (sin reportlab); las páginas escaneadas se dibujan con
+Pillow y se incrustan como JPEG en escala de grises.
+
+Uso:
+    python benchmarks/corpus_sintetico.py <carpeta> [--tamanos 10 100 500]
+        [--tipos digital escaneado mixto] [--semilla 0] [--dpi 150]
+"""
+
+import io
+import json
+import random
+import hashlib
+import argparse
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+TIPOS = ("digital", "escaneado", "mixto")
+TAMANOS = (10, 100, 500)
+FRACCION_ESCANEADAS_MIXTO = 0.25
+DPI_ESCANEO = 150
+
+# Página carta en puntos PDF
+ANCHO_PT, ALTO_PT = 612, 792
+MARGEN_PT = 54
+TAMANO_LETRA_PT = 10
+INTERLINEADO_PT = 13
+
+CODIGO_PLIEGO = "ET-TD-{:03d}"
+
+_POTENCIAS_KVA = ("30", "45", "75", "112,5", "150", "225", "300", "500", "630", "1000")
+_TENSIONES_KV = (("13,2", "95"), ("11,4", "95"), ("34,5", "200"), ("7,62", "95"), ("33", "170"))
+_SECUNDARIOS_V = ("214/123", "220/127", "240/120", "440/254", "480/277")
+_GRUPOS = ("Dyn1", "Dyn5", "Dyn11", "YNyn0", "Yzn11")
+_NORMAS = (
+    "NTC 818 Transformadores monofásicos autorrefrigerados y sumergidos en líquido",
+    "NTC 819 Transformadores trifásicos autorrefrigerados y sumergidos en líquido",
+    "NTC 3997 Transformadores trifásicos tipo pedestal",
+    "NTC 1005 Transformadores. Ensayos de rutina",
+    "IEC 60076-1 Power transformers - General",
+    "IEC 60076-3 Insulation levels, dielectric tests and external clearances",
+    "IEEE C57.12.00 Standard for liquid-immersed distribution transformers",
+    "RETIE Reglamento Técnico de Instalaciones Eléctricas",
+)
+_ACCESORIOS = (
+    "pararrayos de óxido metálico de {kv} kV",
+    "conmutador de derivaciones de 5 posiciones, ±2 × 2,5 %",
+    "termómetro de dial con contactos de alarma",
+    "indicador magnético de nivel de aceite",
+    "válvula de alivio de presión de 10 psi",
+    "aisladores de alta tensión tipo codo de 200 A",
+    "terminales de baja tensión tipo espada de {n} perforaciones",
+    "fusibles tipo bayoneta en serie con fusible limitador",
+)
+_SECCIONES = (
+    "CONDICIONES DE SERVICIO", "CARACTERÍSTICAS ELÉCTRICAS", "NÚCLEO Y DEVANADOS",
+    "TANQUE Y SISTEMA DE PINTURA", "ACCESORIOS", "NORMAS Y PRUEBAS",
+    "PLACA DE CARACTERÍSTICAS", "EMBALAJE Y TRANSPORTE", "DOCUMENTOS DE LA OFERTA",
+)
+
+
+def _parrafo(rng):
+    """Una o varias líneas de especificación con valores al azar"""
+    kva = rng.choice(_POTENCIAS_KVA)
+    kv, bil = rng.choice(_TENSIONES_KV)
+    opciones = (
+        lambda: [f"Potencia nominal: {kva} kVA, refrigeración ONAN, servicio continuo."],
+        lambda: [f"Tensión primaria {kv} kV, BIL {bil} kV; tensión secundaria {rng.choice(_SECUNDARIOS_V)} V.",
+                 f"Grupo de conexión {rng.choice(_GRUPOS)}, frecuencia 60 Hz."],
+        lambda: [f"Impedancia de cortocircuito {rng.choice(('3,5', '4,0', '4,5', '5,0', '5,75'))} % a 85 °C,",
+                 "con tolerancia de ±7,5 % sobre el valor garantizado."],
+        lambda: [f"Pérdidas sin carga máximas: {rng.randint(150, 1800)} W; pérdidas con carga: "
+                 f"{rng.randint(900, 12000)} W a la tensión nominal."],
+        lambda: [f"Altitud de instalación {rng.choice((1000, 1500, 2600, 3000))} msnm, temperatura ambiente "
+                 f"máxima {rng.choice((30, 35, 40))} °C y humedad relativa del {rng.choice((80, 90, 95))} %."],
+        lambda: [f"Accesorio requerido: {rng.choice(_ACCESORIOS).format(kv=rng.choice((10, 12, 30)), n=rng.choice((2, 4, 6)))}."],
+        lambda: [f"Norma aplicable: {rng.choice(_NORMAS)}."],
+        lambda: [f"Pintura: imprimante epóxico y acabado poliuretano, {rng.choice((90, 120, 150))} µm de película",
+                 f"seca, color RAL {rng.choice((7035, 7032, 6011))}."],
+        lambda: ["Potencia (kVA)    Pérdidas vacío (W)    Pérdidas carga (W)    Corriente exc. (%)"] + [
+            f"{p:<18}{rng.randint(100, 1500):<22}{rng.randint(800, 11000):<22}{rng.uniform(0.8, 2.5):.1f}"
+            for p in rng.sample(_POTENCIAS_KVA, 4)
+        ],
+    )
+    return rng.choice(opciones)()
+
+
+def lineas_pagina(rng, numero, total, codigo):
+    """Líneas de una página: encabezado y pie repetidos y cuerpo técnico"""
+    lineas = [f"MAGNETRON S.A.S. - Pliego de condiciones técnicas {codigo}", ""]
+    capacidad = (ALTO_PT - 2 * MARGEN_PT) // INTERLINEADO_PT - 4
+    seccion = 1
+    while len(lineas) < capacidad:
+        if rng.random() < 0.15:
+            lineas += ["", f"{seccion}. {rng.choice(_SECCIONES)}"]
+            seccion += 1
+        lineas += _parrafo(rng)
+    lineas = lineas[:capacidad]
+    lineas += ["", f"Página {numero} de {total}"]
+    return lineas
+
+
+def _fuente(tamano_px):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", tamano_px)
+    except OSError:
+        return ImageFont.load_default(size=tamano_px)
+
+
+def imagen_escaneada(rng, lineas, dpi=DPI_ESCANEO):
+    """
+    Dibuja la página como la entregaría un escáner: escala de grises, leve
+    inclinación y compresión JPEG.
+
+    Returns:
+        tuple: (bytes JPEG, ancho_px, alto_px)
+    """
+    escala = dpi / 72
+    ancho, alto = int(ANCHO_PT * escala), int(ALTO_PT * escala)
+    imagen = Image.new("L", (ancho, alto), 255)
+    dibujo = ImageDraw.Draw(imagen)
+    fuente = _fuente(int(TAMANO_LETRA_PT * escala))
+    for i, linea in enumerate(lineas):
+        dibujo.text((MARGEN_PT * escala, (MARGEN_PT + i * INTERLINEADO_PT) * escala), linea, fill=20, font=fuente)
+    imagen = imagen.rotate(rng.uniform(-0.8, 0.8), resample=Image.BICUBIC, fillcolor=255)
+    salida = io.BytesIO()
+    imagen.save(salida, format="JPEG", quality=75)
+    return salida.getvalue(), ancho, alto
+
+
+def _texto_pdf(linea):
+    texto = linea.encode("cp1252", errors="replace")
+    return texto.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def escribir_pdf(ruta, paginas):
+    """
+    Escribe un PDF mínimo. Cada página es ("texto", lineas) o
+    ("imagen", (jpeg, ancho_px, alto_px)).
+    """
+    objetos = []
+
+    def agregar(contenido):
+        objetos.append(contenido)
+        return len(objetos)
+
+    catalogo = agregar(None)
+    arbol = agregar(None)
+    fuente = agregar(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    hojas = []
+    for tipo, datos in paginas:
+        if tipo == "texto":
+            y = ALTO_PT - MARGEN_PT
+            flujo = b"BT /F1 %d Tf %d TL %d %d Td\n" % (TAMANO_LETRA_PT, INTERLINEADO_PT, MARGEN_PT, y)
+            flujo += b"".join(b"(" + _texto_pdf(linea) + b") Tj T*\n" for linea in datos) + b"ET"
+            recursos = b"<< /Font << /F1 %d 0 R >> >>" % fuente
+        else:
+            jpeg, ancho, alto = datos
+            imagen = agregar(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n" % (ancho, alto, len(jpeg))
+                + jpeg + b"\nendstream"
+            )
+            flujo = b"q %d 0 0 %d 0 0 cm /Im1 Do Q" % (ANCHO_PT, ALTO_PT)
+            recursos = b"<< /XObject << /Im1 %d 0 R >> >>" % imagen
+        contenido = agregar(b"<< /Length %d >>\nstream\n" % len(flujo) + flujo + b"\nendstream")
+        hojas.append(agregar(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>"
+            % (arbol, ANCHO_PT, ALTO_PT, recursos, contenido)
+        ))
+
+    objetos[catalogo - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % arbol
+    objetos[arbol - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % hoja for hoja in hojas), len(hojas)
+    )
+
+    salida = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    posiciones = []
+    for numero, contenido in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += b"%d 0 obj\n" % numero + contenido + b"\nendobj\n"
+    inicio_xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    salida += b"".join(b"%010d 00000 n \n" % posicion for posicion in posiciones)
+    salida += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objetos) + 1, catalogo, inicio_xref
+    )
+    Path(ruta).write_bytes(bytes(salida))
+
+
+def generar_pliego(ruta, tipo, paginas, semilla=0, dpi=DPI_ESCANEO):
+    """
+    Genera un pliego sintético.
+
+    Returns:
+        dict: Entrada del manifiesto {archivo, tipo, paginas, paginas_escaneadas, sha256}
+    """
+    rng = random.Random(f"{semilla}|{tipo}|{paginas}")
+    codigo = CODIGO_PLIEGO.format(rng.randint(1, 999))
+    contenido = []
+    escaneadas = 0
+    for numero in range(1, paginas + 1):
+        lineas = lineas_pagina(rng, numero, paginas, codigo)
+        escanear = tipo == "escaneado" or (tipo == "mixto" and rng.random() < FRACCION_ESCANEADAS_MIXTO)
+        if escanear:
+            contenido.append(("imagen", imagen_escaneada(rng, lineas, dpi)))
+            escaneadas += 1
+        else:
+            contenido.append(("texto", lineas))
+    escribir_pdf(ruta, contenido)
+    return {
+        "archivo": Path(ruta).name,
+        "tipo": tipo,
+        "paginas": paginas,
+        "paginas_escaneadas": escaneadas,
+        "sha256": hashlib.sha256(Path(ruta).read_bytes()).hexdigest(),
+    }
+
+
+def generar_corpus(carpeta, tamanos=TAMANOS, tipos=TIPOS, semilla=0, dpi=DPI_ESCANEO):
+    """
+    Genera el corpus y su manifiesto corpus.json en la carpeta.
+
+    Returns:
+        list: Entradas del manifiesto, una por PDF
+    """
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    manifiesto = []
+    for tipo in tipos:
+        for paginas in tamanos:
+            ruta = carpeta / f"pliego_{tipo}_{paginas}p.pdf"
+            print(f"📝 {ruta.name}...")
+            manifiesto.append(generar_pliego(ruta, tipo, paginas, semilla, dpi))
+    (carpeta / "corpus.json").write_text(
+        json.dumps({"semilla": semilla, "dpi": dpi, "archivos": manifiesto}, indent=2, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    return manifiesto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un corpus reproducible de pliegos sintéticos")
+    parser.add_argument("carpeta", help="Carpeta de salida")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS), help="Páginas por PDF")
+    parser.add_argument("--tipos", nargs="+", choices=TIPOS, default=list(TIPOS))
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--dpi", type=int, default=DPI_ESCANEO, help="Resolución de las páginas escaneadas")
+    args = parser.parse_args(argv)
+
+    manifiesto = generar_corpus(args.carpeta, args.tamanos, args.tipos, args.semilla, args.dpi)
+    print(f"✅ {len(manifiesto)} PDFs en {args.carpeta}")
+
+
+if __name__ == "__main__":
+    main()
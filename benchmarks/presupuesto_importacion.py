@@ -0,0 +1,110 @@
+"""
+presupuesto_importacion.py - Tiempo de importación de la app (arranque en frío)
+
+Importa en un intérprete nuevo, con `python -X importtime`, los módulos que
+app.py carga antes de mostrar la bienvenida y falla (código de salida 1) si:
+
+    - el tiempo acumulado de esas importaciones supera el presupuesto, o
+    - se cargó alguno de los módulos pesados que deben importarse solo al
+      usarse (paquetes de los proveedores de LLM, OCR, langchain.prompts).
+
+Se toma la mejor de varias ejecuciones para no fallar por ruido de la máquina.
+Muestra además los módulos con más tiempo propio, para saber qué mover.
+
+Uso:
+    python benchmarks/presupuesto_importacion.py [--presupuesto-ms 1000]
+        [--repeticiones 3] [--modulos database_supabase trabajos metricas] [--top 15]
+"""
+
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Lo que app.py importa además de streamlit
+MODULOS_APP = ("database_supabase", "trabajos", "metricas")
+PRESUPUESTO_MS = 1000
+
+# Se importan recién al crear el cliente LLM, al hacer OCR o al armar un prompt
+MODULOS_DIFERIDOS = (
+    "langchain_openai",
+    "langchain_google_genai",
+    "langchain_community",
+    "langchain.prompts",
+    "pytesseract",
+    "pdf2image",
+)
+
+
+def perfil_importacion(modulos):
+    """
+    Importa los módulos en un proceso nuevo con -X importtime.
+
+    Returns:
+        list: Tuplas (módulo, µs propios, µs acumulados, profundidad), en el
+        orden del informe de Python
+    """
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modulos)}"],
+        capture_output=True, text=True, cwd=RAIZ
+    )
+    if proceso.returncode != 0:
+        error = proceso.stderr.strip().splitlines()
+        raise RuntimeError(error[-1] if error else f"código de salida {proceso.returncode}")
+
+    filas = []
+    for linea in proceso.stderr.splitlines():
+        # import time:   self [us] | cumulative | imported package
+        if not linea.startswith("import time:") or "imported package" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|", 2)
+        profundidad = (len(nombre) - len(nombre.lstrip())) // 2
+        filas.append((nombre.strip(), int(propio), int(acumulado), profundidad))
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comprueba el presupuesto de tiempo de importación de la app")
+    parser.add_argument("--presupuesto-ms", type=float, default=PRESUPUESTO_MS, help="Máximo permitido, en ms")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Ejecuciones; se toma la más rápida")
+    parser.add_argument("--modulos", nargs="+", default=list(MODULOS_APP), help="Módulos a importar")
+    parser.add_argument("--top", type=int, default=15, help="Módulos más lentos a mostrar")
+    args = parser.parse_args(argv)
+
+    mejor_total, mejor_filas = None, None
+    for _ in range(args.repeticiones):
+        try:
+            filas = perfil_importacion(args.modulos)
+        except RuntimeError as e:
+            print(f"❌ No se pudieron importar {', '.join(args.modulos)}: {e}")
+            return 1
+        # Cada módulo pedido aparece en el primer nivel salvo que otro ya lo
+        # haya importado, en cuyo caso su tiempo está dentro del de aquel
+        total_ms = sum(acumulado for nombre, _, acumulado, profundidad in filas
+                       if profundidad == 0 and nombre in args.modulos) / 1000
+        if mejor_total is None or total_ms < mejor_total:
+            mejor_total, mejor_filas = total_ms, filas
+
+    print(f"\n{'Módulo':<50}{'Propio ms':>12}{'Acumulado ms':>14}")
+    for nombre, propio, acumulado, _ in sorted(mejor_filas, key=lambda fila: -fila[1])[:args.top]:
+        print(f"{nombre:<50}{propio / 1000:>12.1f}{acumulado / 1000:>14.1f}")
+
+    fallo = False
+    cargados = {nombre for nombre, *_ in mejor_filas}
+    diferidos = [modulo for modulo in MODULOS_DIFERIDOS if modulo in cargados]
+    if diferidos:
+        print(f"\n❌ Módulos que deberían importarse al usarse: {', '.join(diferidos)}")
+        fallo = True
+
+    if mejor_total > args.presupuesto_ms:
+        print(f"\n❌ Importación: {mejor_total:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+        fallo = True
+    else:
+        print(f"\n✅ Importación: {mejor_total:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+    return 1 if fallo else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+cache_ocr.py - Caché persistente del texto OCR por página
+
+Guarda en un SQLite local el texto (y la confianza media) que Tesseract
+obtuvo para cada página rasterizada, con la clave formada por el hash de
+los píxeles de la página, el idioma, la configuración de Tesseract y el
+DPI. Así una página escaneada que no cambió (al regenerar un análisis o
+al subir una revisión del pliego) no vuelve a pasar por Tesseract. El
+tamaño total está acotado y se desalojan primero las entradas usadas hace
+más tiempo (LRU).
+
+Lo usan los procesos del pool de OCR, por eso cada operación abre su propia
+conexión corta y los contadores de aciertos/fallos viven en la base, junto
+con el total de bytes guardados (así guardar no suma la tabla entera).
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+DIRECTORIO_CACHE_OCR = Path(os.getenv("CACHE_OCR_DIR", Path(__file__).resolve().with_name(".cache_ocr")))
+CACHE_OCR_MAX_MB = float(os.getenv("CACHE_OCR_MAX_MB", "200"))
+# Al superar el máximo se desaloja hasta quedar en esta fracción
+CACHE_OCR_FRACCION_TRAS_DESALOJO = 0.9
+
+
+def clave_ocr(image, lang, config="", dpi=None):
+    """
+    Clave de caché de una página rasterizada: hash de sus píxeles más los
+    parámetros que cambian el resultado de Tesseract.
+
+    Args:
+        image: Imagen PIL de la página
+        lang (str): Idioma(s) de Tesseract (ej. "spa+eng")
+        config (str): Opciones adicionales de Tesseract
+        dpi (int, optional): Resolución de rasterizado
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    """
+    h = hashlib.sha256()
+    h.update(f"{image.mode}|{image.size}|{lang}|{config}|{dpi}|".encode("utf-8"))
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+class CacheOCR:
+    """
+    Caché LRU en disco de textos OCR con tamaño máximo.
+
+    Args:
+        directorio (Path): Carpeta donde vive ocr.db
+        max_mb (float): Tamaño máximo del texto almacenado, en MB
+    """
+
+    def __init__(self, directorio=DIRECTORIO_CACHE_OCR, max_mb=CACHE_OCR_MAX_MB):
+        self._directorio = Path(directorio)
+        self._directorio.mkdir(parents=True, exist_ok=True)
+        self._ruta_db = self._directorio / "ocr.db"
+        self._max_bytes = int(max_mb * 1024 * 1024)
+        self._crear_tablas()
+
+    @contextmanager
+    def _conectar(self):
+        conn = sqlite3.connect(self._ruta_db, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _crear_tablas(self):
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr (
+                    clave TEXT PRIMARY KEY,
+                    texto TEXT NOT NULL,
+                    confianza REAL,
+                    tamano INTEGER NOT NULL,
+                    ultimo_uso REAL NOT NULL
+                )
+            """)
+            # Cachés creadas antes de guardar la confianza
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(ocr)")}
+            if "confianza" not in columnas:
+                conn.execute("ALTER TABLE ocr ADD COLUMN confianza REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_ultimo_uso ON ocr (ultimo_uso)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS contadores (
+                    nombre TEXT PRIMARY KEY,
+                    valor INTEGER NOT NULL
+                )
+            """)
+            conn.executemany(
+                "INSERT OR IGNORE INTO contadores (nombre, valor) VALUES (?, 0)",
+                [("aciertos",), ("fallos",), ("desalojos",)],
+            )
+            # Total de bytes de texto; las cachés anteriores lo calculan una vez
+            conn.execute(
+                "INSERT OR IGNORE INTO contadores (nombre, valor) "
+                "SELECT 'bytes', COALESCE(SUM(tamano), 0) FROM ocr"
+            )
+
+    def obtener(self, clave):
+        """
+        Devuelve (texto, confianza) guardados para la clave, o None, y cuenta
+        el acierto/fallo.
+        """
+        with self._conectar() as conn:
+            fila = conn.execute("SELECT texto, confianza FROM ocr WHERE clave = ?", (clave,)).fetchone()
+            if fila:
+                conn.execute("UPDATE ocr SET ultimo_uso = ? WHERE clave = ?", (time.time(), clave))
+            conn.execute(
+                "UPDATE contadores SET valor = valor + 1 WHERE nombre = ?",
+                ("aciertos" if fila else "fallos",),
+            )
+        return tuple(fila) if fila else None
+
+    def guardar(self, clave, texto, confianza=None):
+        """Guarda el texto de una página y desaloja las entradas más antiguas si hace falta"""
+        tamano = len(texto.encode("utf-8"))
+        with self._conectar() as conn:
+            # Primero el total (descontando la entrada que se reemplaza): la
+            # escritura toma el lock de la base antes de leer nada más
+            conn.execute(
+                "UPDATE contadores SET valor = valor + ? - COALESCE((SELECT tamano FROM ocr WHERE clave = ?), 0) "
+                "WHERE nombre = 'bytes'",
+                (tamano, clave),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr (clave, texto, confianza, tamano, ultimo_uso) VALUES (?, ?, ?, ?, ?)",
+                (clave, texto, confianza, tamano, time.time()),
+            )
+            total = conn.execute("SELECT valor FROM contadores WHERE nombre = 'bytes'").fetchone()[0]
+            if total > self._max_bytes:
+                self._desalojar(conn, total - int(self._max_bytes * CACHE_OCR_FRACCION_TRAS_DESALOJO))
+
+    @staticmethod
+    def _desalojar(conn, bytes_a_liberar):
+        """Elimina las entradas usadas hace más tiempo hasta liberar `bytes_a_liberar`"""
+        claves = []
+        liberados = 0
+        for clave, tamano in conn.execute("SELECT clave, tamano FROM ocr ORDER BY ultimo_uso"):
+            if liberados >= bytes_a_liberar:
+                break
+            claves.append((clave,))
+            liberados += tamano
+        conn.executemany("DELETE FROM ocr WHERE clave = ?", claves)
+        conn.execute("UPDATE contadores SET valor = valor + ? WHERE nombre = 'desalojos'", (len(claves),))
+        conn.execute("UPDATE contadores SET valor = valor - ? WHERE nombre = 'bytes'", (liberados,))
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: aciertos, fallos, desalojos, entradas, tamano_mb y tasa_aciertos
+        """
+        with self._conectar() as conn:
+            contadores = dict(conn.execute("SELECT nombre, valor FROM contadores").fetchall())
+            entradas = conn.execute("SELECT COUNT(*) FROM ocr").fetchone()[0]
+        tamano = contadores.pop("bytes")
+        consultas = contadores["aciertos"] + contadores["fallos"]
+        return {
+            **contadores,
+            "entradas": entradas,
+            "tamano_mb": round(tamano / (1024 * 1024), 2),
+            "tasa_aciertos": round(contadores["aciertos"] / consultas, 3) if consultas else None,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_ocr():
+    """Devuelve la caché OCR del proceso, creándola la primera vez"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheOCR()
+    return _cache
@@ -0,0 +1,98 @@
+"""
+consumo_llm.py - Tokens y costo de las llamadas al LLM de cada análisis
+
+Un ConsumoLLM es un callback de LangChain que suma el `usage_metadata` de
+cada respuesta (invoke, batch y stream, en cualquier hilo). Se engancha al
+modelo con `con_consumo(llm, consumo)` para un análisis concreto, de modo que
+el resumen (completo, map-reduce o por secciones) y las tablas quedan
+contados en el mismo lugar, y el total se guarda con la fila del historial.
+
+El costo se calcula con "precios_llm" de config.json, en USD por millón de
+tokens: {"gpt-4.1-mini": {"entrada": 0.40, "salida": 1.60}}.
+"""
+
+import re
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class ConsumoLLM(BaseCallbackHandler):
+    """Acumula llamadas y tokens de entrada/salida por modelo"""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        # modelo -> {"llamadas", "tokens_entrada", "tokens_salida"}
+        self.por_modelo = {}
+
+    def on_llm_end(self, response, **kwargs):
+        modelo_respuesta = (response.llm_output or {}).get("model_name")
+        for generaciones in response.generations:
+            for generacion in generaciones:
+                mensaje = getattr(generacion, "message", None)
+                uso = getattr(mensaje, "usage_metadata", None)
+                if not uso:
+                    continue
+                modelo = mensaje.response_metadata.get("model_name") or modelo_respuesta or "desconocido"
+                with self._lock:
+                    acumulado = self.por_modelo.setdefault(
+                        modelo, {"llamadas": 0, "tokens_entrada": 0, "tokens_salida": 0}
+                    )
+                    acumulado["llamadas"] += 1
+                    acumulado["tokens_entrada"] += uso.get("input_tokens", 0)
+                    acumulado["tokens_salida"] += uso.get("output_tokens", 0)
+
+    def totales(self):
+        """
+        Returns:
+            dict: llamadas, tokens_entrada, tokens_salida, costo_usd (None si
+            algún modelo no tiene precio configurado) y el detalle por modelo
+        """
+        with self._lock:
+            por_modelo = {modelo: dict(valores) for modelo, valores in self.por_modelo.items()}
+
+        costo = 0.0
+        for modelo, valores in por_modelo.items():
+            precio = _precio_modelo(modelo)
+            if precio is None:
+                costo = None
+                break
+            costo += (valores["tokens_entrada"] * precio["entrada"]
+                      + valores["tokens_salida"] * precio["salida"]) / 1_000_000
+
+        return {
+            "llamadas": sum(v["llamadas"] for v in por_modelo.values()),
+            "tokens_entrada": sum(v["tokens_entrada"] for v in por_modelo.values()),
+            "tokens_salida": sum(v["tokens_salida"] for v in por_modelo.values()),
+            "costo_usd": round(costo, 6) if costo is not None else None,
+            "modelos": por_modelo,
+        }
+
+
+# Sufijo de versión que agrega la API al nombre del modelo: -2025-04-14, -0613, -001
+_SUFIJO_VERSION = re.compile(r"(-\d+)+")
+
+
+def _precio_modelo(modelo):
+    """
+    Precio configurado para el modelo. Acepta que la API informe el nombre
+    con la fecha o el número de la versión (gpt-4.1-mini-2025-04-14 usa el
+    precio de gpt-4.1-mini). Cualquier otro sufijo es otro modelo: gpt-4.1 no
+    toma el precio de gpt-4.1-mini ni gpt-4o-mini el de gpt-4o. Sin precio
+    devuelve None (el costo queda desconocido, nunca subestimado).
+    """
+    from corelogic import get_config
+
+    precios = get_config("precios_llm", {})
+    if modelo in precios:
+        return precios[modelo]
+    for nombre in sorted(precios, key=len, reverse=True):
+        if modelo.startswith(nombre) and _SUFIJO_VERSION.fullmatch(modelo[len(nombre):]):
+            return precios[nombre]
+    return None
+
+
+def con_consumo(llm_instance, consumo):
+    """Devuelve el mismo modelo con `consumo` como callback de todas sus llamadas"""
+    return llm_instance.with_config(callbacks=[consumo])
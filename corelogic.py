@@ -1,52 +1,155 @@
 """corelogic.py - Gestión de selección e inicialización de modelos de lenguaje.
 Permite escoger proveedor y modelo vía config.json y variables de entorno.
-Extensible a más LLMs.
+Mantiene un registro de clientes LLM por proceso, reutilizable también
+fuera de Streamlit. Extensible a más LLMs.
+Los paquetes de cada proveedor se importan al crear su primer cliente: solo
+se carga el del proveedor configurado.
 """
 import os
 import json
+import threading
+from pathlib import Path
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 # Cargar variables de entorno (.env)
 load_dotenv()
 
-# Leer configuración desde config.json
-with open("config.json", "r", encoding="utf-8") as f:
-    config = json.load(f)
+# config.json junto a este módulo, sin depender del directorio de trabajo
+CONFIG_PATH = Path(__file__).resolve().with_name("config.json")
 
-LLM_PROVIDER = config.get("llm_provider").lower()
-MODEL_NAME_LLM = config.get("llm_model")
-TEMPERATURE = config.get("temperature")
+# Límites del pool HTTP keep-alive compartido por los clientes de OpenAI
+HTTP_MAX_CONEXIONES = 20
+HTTP_KEEPALIVE_S = 60
 
-def get_llm():
+_config = {}
+_config_mtime = None
+_config_lock = threading.Lock()
+
+# Registro de clientes: (proveedor, modelo, temperatura) -> instancia
+_registro_llm = {}
+_registro_lock = threading.Lock()
+_http_clients = {}
+
+
+def cargar_config():
+    """
+    Devuelve la configuración de config.json, releyéndola si el archivo
+    cambió en disco. Si cambia, se invalidan los clientes LLM registrados.
+    """
+    global _config, _config_mtime
+    mtime = CONFIG_PATH.stat().st_mtime_ns
+    if mtime != _config_mtime:
+        with _config_lock:
+            if mtime != _config_mtime:
+                with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                    nueva_config = json.load(f)
+                if _config_mtime is not None:
+                    print("🔄 config.json cambió: se recrearán los clientes LLM")
+                    invalidar_llms()
+                _config = nueva_config
+                _config_mtime = mtime
+    return _config
+
+
+def get_config(clave, por_defecto=None):
+    """Lee una clave de config.json (siempre actualizada)"""
+    return cargar_config().get(clave, por_defecto)
+
+
+def invalidar_llms():
+    """Descarta los clientes LLM registrados; se recrean en el próximo uso"""
+    with _registro_lock:
+        _registro_llm.clear()
+
+
+def _http_client_compartido(asincrono=False):
+    """Cliente httpx con pool keep-alive compartido entre instancias de OpenAI"""
+    import httpx
     
-    if LLM_PROVIDER == "openai":
+    with _registro_lock:
+        cliente = _http_clients.get(asincrono)
+        if cliente is None:
+            limites = httpx.Limits(
+                max_connections=HTTP_MAX_CONEXIONES,
+                max_keepalive_connections=HTTP_MAX_CONEXIONES,
+                keepalive_expiry=HTTP_KEEPALIVE_S,
+            )
+            clase = httpx.AsyncClient if asincrono else httpx.Client
+            cliente = clase(limits=limites, timeout=httpx.Timeout(600.0, connect=10.0))
+            _http_clients[asincrono] = cliente
+        return cliente
+
+
+def _crear_llm(provider, model, temperature):
+    """Construye un cliente LLM nuevo para el proveedor indicado"""
+    if provider == "openai":
         """Carga y devuelve el modelo LLM de OpenAI."""
         if 'OPENAI_API_KEY' not in os.environ:
             raise ValueError("La variable de entorno OPENAI_API_KEY no está configurada.")
-        print(f"Inicializando LLM de OpenAI: {MODEL_NAME_LLM}...")
+        print(f"Inicializando LLM de OpenAI: {model}...")
+        from langchain_openai import ChatOpenAI
         try:
+            # Sin temperature: OpenAI usa la de la API por defecto, como
+            # siempre; "temperature" de config.json aplica solo a Gemini
             llm = ChatOpenAI(
-                            model=MODEL_NAME_LLM,
-                            api_key=os.getenv("OPENAI_API_KEY")
+                            model=model,
+                            api_key=os.getenv("OPENAI_API_KEY"),
+                            # Uso de tokens también en .stream() (ver consumo_llm.py)
+                            stream_usage=True,
+                            http_client=_http_client_compartido(),
+                            http_async_client=_http_client_compartido(asincrono=True)
                             )
             return llm
         except Exception as e:
             print(f"Error al inicializar LLM de OpenAI: {e}")
             raise
-    elif LLM_PROVIDER == "gemini":
+    elif provider == "gemini":
         """Carga y devuelve el modelo LLM de Gemini."""
         if 'GOOGLE_API_KEY' not in os.environ:
             raise ValueError("La variable de entorno GOOGLE_API_KEY no está configurada.")
-        print(f"Inicializando LLM de Gemini: {MODEL_NAME_LLM}...")
+        print(f"Inicializando LLM de Gemini: {model}...")
+        from langchain_google_genai import ChatGoogleGenerativeAI
         try:
-            llm = ChatGoogleGenerativeAI(model=MODEL_NAME_LLM, 
-                                         temperature=TEMPERATURE,
+            llm = ChatGoogleGenerativeAI(model=model, 
+                                         temperature=temperature,
                                          google_api_key=os.getenv("GOOGLE_API_KEY"))
             return llm
         except Exception as e:
             print(f"Error al inicializar LLM de Gemini: {e}")
             raise
+    elif provider == "fake":
+        # Modelo simulado sin red para pruebas de carga y benchmarks (ver llm_simulado.py)
+        from llm_simulado import LLMSimulado
+        print("Inicializando LLM simulado (sin red)...")
+        return LLMSimulado.desde_config(get_config("llm_simulado", {}))
     else:
-        raise ValueError(f"Proveedor de LLM no soportado: {LLM_PROVIDER}")
+        raise ValueError(f"Proveedor de LLM no soportado: {provider}")
+
 
+def get_llm(provider=None, model=None, temperature=None):
+    """
+    Devuelve el cliente LLM para (proveedor, modelo, temperatura), creándolo
+    solo la primera vez. Los parámetros omitidos se toman de config.json.
+    
+    Args:
+        provider (str, optional): "openai", "gemini" o "fake" (simulado, sin red)
+        model (str, optional): Nombre del modelo
+        temperature (float, optional): Temperatura de muestreo (solo Gemini)
+    
+    Returns:
+        Instancia de chat model de LangChain, compartida dentro del proceso
+    """
+    config = cargar_config()
+    provider = (provider or config.get("llm_provider")).lower()
+    model = model or config.get("llm_model")
+    temperature = config.get("temperature") if temperature is None else temperature
+    clave = (provider, model, temperature)
+    
+    llm = _registro_llm.get(clave)
+    if llm is None:
+        with _registro_lock:
+            llm = _registro_llm.get(clave)
+        if llm is None:
+            llm = _crear_llm(provider, model, temperature)
+            with _registro_lock:
+                llm = _registro_llm.setdefault(clave, llm)
+    return llm
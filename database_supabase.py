@@ -6,103 +6,494 @@ Trabaja con la tabla HISTORIAL existente.
 """
 
 import os
+import re
+import time
+import atexit
+import threading
 import psycopg2
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json
 from dotenv import load_dotenv
 
+from metricas import span
+
 # Cargar variables de entorno desde .env
 load_dotenv()
 
 # Detectar el entorno
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 
+# Caché LRU en memoria de análisis por hash de contenido (evita ir a la BD)
+CACHE_HASH_MAX = int(os.getenv("CACHE_HASH_MAX", "128"))
+_cache_por_hash = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Pool de conexiones compartido por todo el proceso
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "5"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_ESPERA_MAX = float(os.getenv("DB_POOL_ESPERA_MAX", "30"))
+DB_POOL_VERIFICAR_TRAS = float(os.getenv("DB_POOL_VERIFICAR_TRAS", "30"))
+
+# Caché con vencimiento de las consultas de estadísticas
+ESTADISTICAS_TTL_S = float(os.getenv("ESTADISTICAS_TTL_S", "60"))
+_cache_estadisticas = {}
+_estadisticas_lock = threading.Lock()
+
+# Unidades de date_trunc para las estadísticas por periodo
+PERIODOS = {"dia": "day", "semana": "week", "mes": "month"}
+
 def is_production():
     """Verifica si la aplicación está corriendo en producción"""
     return ENVIRONMENT.lower() == "production"
 
+def _cache_obtener(hash_contenido):
+    """Devuelve el análisis en caché para un hash y lo marca como reciente"""
+    with _cache_lock:
+        analisis = _cache_por_hash.get(hash_contenido)
+        if analisis is not None:
+            _cache_por_hash.move_to_end(hash_contenido)
+        return analisis
+
+def _cache_guardar(hash_contenido, analisis):
+    """Guarda un análisis en la caché LRU, expulsando el más antiguo si se llena"""
+    with _cache_lock:
+        _cache_por_hash[hash_contenido] = analisis
+        _cache_por_hash.move_to_end(hash_contenido)
+        while len(_cache_por_hash) > CACHE_HASH_MAX:
+            _cache_por_hash.popitem(last=False)
+
+def _estadisticas_en_cache(clave, consultar):
+    """
+    Devuelve el resultado de consultar(), reutilizándolo durante
+    ESTADISTICAS_TTL_S segundos. Si la consulta falla no se guarda.
+    """
+    with _estadisticas_lock:
+        entrada = _cache_estadisticas.get(clave)
+        if entrada and time.monotonic() - entrada[0] < ESTADISTICAS_TTL_S:
+            return entrada[1]
+    resultado = consultar()
+    with _estadisticas_lock:
+        _cache_estadisticas[clave] = (time.monotonic(), resultado)
+    return resultado
+
+def _invalidar_estadisticas():
+    """Descarta las estadísticas en caché (tras guardar un análisis)"""
+    with _estadisticas_lock:
+        _cache_estadisticas.clear()
+
+_database_url = None
+_pool = None
+_pool_lock = threading.Lock()
+
+def _obtener_database_url():
+    """Resuelve DATABASE_URL una sola vez por proceso"""
+    global _database_url
+    if _database_url is None:
+        try:
+            # Intenta obtener desde st.secrets (Streamlit Cloud)
+            import streamlit as st
+            conn_string = st.secrets["DATABASE_URL"]
+        except:
+            # Si no está en Streamlit, usa variable de entorno
+            conn_string = os.getenv("DATABASE_URL")
+        
+        if not conn_string:
+            raise ValueError("No se encontró DATABASE_URL en secrets o variables de entorno")
+        _database_url = conn_string
+    return _database_url
+
 def get_db_connection():
-    """Crea y retorna una conexión a la base de datos"""
+    """Crea y retorna una conexión nueva a la base de datos (sin pool)"""
+    return psycopg2.connect(_obtener_database_url())
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones thread-safe con tamaño máximo, cierre de conexiones
+    inactivas y verificación de salud antes de reutilizarlas.
+    
+    Args:
+        conectar (callable): Función que abre una conexión nueva
+        max_conexiones (int): Conexiones abiertas como máximo (en uso + libres)
+        idle_timeout (float): Segundos tras los que se cierra una conexión libre
+        espera_max (float): Segundos máximos esperando una conexión libre
+        verificar_tras (float): Inactividad (s) a partir de la cual se hace
+            un SELECT 1 antes de entregar la conexión
+    """
+
+    def __init__(self, conectar, max_conexiones=DB_POOL_MAX, idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                 espera_max=DB_POOL_ESPERA_MAX, verificar_tras=DB_POOL_VERIFICAR_TRAS):
+        self._conectar = conectar
+        self._max = max_conexiones
+        self._idle_timeout = idle_timeout
+        self._espera_max = espera_max
+        self._verificar_tras = verificar_tras
+        self._libres = []  # Pila de (conexión, instante en que se devolvió)
+        self._en_uso = 0
+        self._cond = threading.Condition()
+        self.creadas = 0
+        self.reutilizadas = 0
+
+    def obtener(self):
+        """Entrega una conexión sana del pool o abre una nueva si hay cupo"""
+        limite = time.monotonic() + self._espera_max
+        with self._cond:
+            while True:
+                self._cerrar_inactivas()
+                if self._libres:
+                    conn, devuelta = self._libres.pop()
+                    break
+                if self._en_uso < self._max:
+                    conn, devuelta = None, None
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise TimeoutError(f"No hay conexiones libres en el pool (máximo {self._max})")
+                self._cond.wait(restante)
+            self._en_uso += 1
+        
+        try:
+            if conn is not None:
+                if self._es_saludable(conn, devuelta):
+                    with self._cond:
+                        self.reutilizadas += 1
+                    return conn
+                self._cerrar(conn)
+            
+            conn = self._conectar()
+            with self._cond:
+                self.creadas += 1
+            return conn
+        except Exception:
+            with self._cond:
+                self._en_uso -= 1
+                self._cond.notify()
+            raise
+
+    def devolver(self, conn, descartar=False):
+        """Devuelve una conexión al pool; si está rota o se pide, se cierra"""
+        if not descartar and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                descartar = True
+        
+        with self._cond:
+            self._en_uso -= 1
+            if descartar or conn.closed:
+                self._cerrar(conn)
+            else:
+                self._libres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def cerrar_todas(self):
+        """Cierra todas las conexiones libres del pool"""
+        with self._cond:
+            for conn, _ in self._libres:
+                self._cerrar(conn)
+            self._libres = []
+
+    def _es_saludable(self, conn, devuelta):
+        if conn.closed:
+            return False
+        if time.monotonic() - devuelta < self._verificar_tras:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _cerrar_inactivas(self):
+        ahora = time.monotonic()
+        vigentes = []
+        for conn, devuelta in self._libres:
+            if ahora - devuelta > self._idle_timeout:
+                self._cerrar(conn)
+            else:
+                vigentes.append((conn, devuelta))
+        self._libres = vigentes
+
+    @staticmethod
+    def _cerrar(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+def obtener_pool():
+    """Devuelve el pool de conexiones del proceso, creándolo la primera vez"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexiones(get_db_connection)
+    return _pool
+
+def cerrar_pool():
+    """Cierra las conexiones libres del pool del proceso"""
+    if _pool is not None:
+        _pool.cerrar_todas()
+
+atexit.register(cerrar_pool)
+
+@contextmanager
+def conexion_db():
+    """
+    Presta una conexión del pool durante el bloque `with`.
+    Hace commit al salir sin errores y rollback si hay una excepción;
+    las conexiones que fallan a nivel de red se descartan del pool.
+    """
+    pool = obtener_pool()
+    conn = pool.obtener()
+    descartar = False
     try:
-        # Intenta obtener desde st.secrets (Streamlit Cloud)
-        import streamlit as st
-        conn_string = st.secrets["DATABASE_URL"]
-    except:
-        # Si no está en Streamlit, usa variable de entorno
-        conn_string = os.getenv("DATABASE_URL")
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        descartar = True
+        raise
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            descartar = True
+        raise
+    finally:
+        pool.devolver(conn, descartar)
+
+# Migraciones del esquema, en orden: (versión, descripción, sentencias).
+# Cada una se aplica una sola vez y queda registrada en schema_migraciones;
+# las primeras son idempotentes porque las bases existentes ya las tenían
+# aplicadas por la versión anterior de init_database.
+MIGRACIONES = [
+    (1, "Columna tablas_tecnicas", [
+        "ALTER TABLE historial ADD COLUMN IF NOT EXISTS tablas_tecnicas TEXT",
+    ]),
+    (2, "Hash del contenido del PDF para la caché de análisis", [
+        "ALTER TABLE historial ADD COLUMN IF NOT EXISTS hash_contenido TEXT",
+        """
+        CREATE INDEX IF NOT EXISTS idx_historial_hash_contenido
+        ON historial (hash_contenido, fecha_hora DESC)
+        """,
+    ]),
+    (3, "Índice del listado paginado del historial (listar_historial)", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_historial_fecha_id
+        ON historial (fecha_hora DESC, id DESC)
+        """,
+    ]),
+    (4, "Segundos de cada etapa del análisis", [
+        "ALTER TABLE historial ADD COLUMN IF NOT EXISTS duraciones_etapas JSONB",
+    ]),
+    (5, "Consumo del LLM por análisis (ver consumo_llm.py)", [
+        """
+        ALTER TABLE historial
+            ADD COLUMN IF NOT EXISTS llamadas_llm INTEGER,
+            ADD COLUMN IF NOT EXISTS tokens_entrada INTEGER,
+            ADD COLUMN IF NOT EXISTS tokens_salida INTEGER,
+            ADD COLUMN IF NOT EXISTS costo_usd NUMERIC(12, 6)
+        """,
+    ]),
+    # Mantenida en cada guardar_analisis: las estadísticas no recorren
+    # historial (filas con textos largos). Las filas antiguas sin usuario se
+    # cuentan con usuario '' (la columna no admite NULL)
+    (6, "Totales por día y usuario", [
+        """
+        CREATE TABLE IF NOT EXISTS historial_resumen_diario (
+            dia DATE NOT NULL,
+            usuario TEXT NOT NULL,
+            analisis INTEGER NOT NULL DEFAULT 0,
+            llamadas_llm BIGINT NOT NULL DEFAULT 0,
+            tokens_entrada BIGINT NOT NULL DEFAULT 0,
+            tokens_salida BIGINT NOT NULL DEFAULT 0,
+            costo_usd NUMERIC(14, 6) NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, usuario)
+        )
+        """,
+        """
+        INSERT INTO historial_resumen_diario
+            (dia, usuario, analisis, llamadas_llm, tokens_entrada, tokens_salida, costo_usd)
+        SELECT fecha_hora::date, COALESCE(usuario, ''), COUNT(*),
+               COALESCE(SUM(llamadas_llm), 0), COALESCE(SUM(tokens_entrada), 0),
+               COALESCE(SUM(tokens_salida), 0), COALESCE(SUM(costo_usd), 0)
+        FROM historial
+        WHERE NOT EXISTS (SELECT 1 FROM historial_resumen_diario)
+        GROUP BY 1, 2
+        """,
+    ]),
+    # text_pattern_ops sirve tanto a nombre_pdf = %s (buscar_por_nombre_pdf)
+    # como a nombre_pdf LIKE 'prefijo%' (listar_historial)
+    (7, "Índices por nombre de PDF y por usuario", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_historial_nombre_fecha
+        ON historial (nombre_pdf text_pattern_ops, fecha_hora DESC)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_historial_usuario_fecha
+        ON historial (usuario, fecha_hora DESC)
+        """,
+    ]),
+]
+
+# Clave del advisory lock que serializa las migraciones entre procesos
+# (app de Streamlit, specbot, workers)
+_LOCK_MIGRACIONES = 7342001
+_esquema_al_dia = False
+_migraciones_lock = threading.Lock()
+
+def _versiones_aplicadas(cur):
+    cur.execute("SELECT to_regclass('schema_migraciones') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return set()
+    cur.execute("SELECT version FROM schema_migraciones")
+    return {fila[0] for fila in cur.fetchall()}
+
+def aplicar_migraciones():
+    """
+    Aplica las migraciones pendientes de MIGRACIONES, cada una en su propia
+    transacción junto con su registro en schema_migraciones. Si el esquema
+    está al día solo hace una consulta.
     
-    if not conn_string:
-        raise ValueError("No se encontró DATABASE_URL en secrets o variables de entorno")
+    Returns:
+        list: Versiones aplicadas en esta llamada
+    """
+    with conexion_db() as conn:
+        with conn.cursor() as cur:
+            aplicadas = _versiones_aplicadas(cur)
+    pendientes = [m for m in MIGRACIONES if m[0] not in aplicadas]
+    if not pendientes:
+        return []
     
-    conn = psycopg2.connect(conn_string)
-    return conn
+    nuevas = []
+    for version, descripcion, sentencias in pendientes:
+        with conexion_db() as conn:
+            with conn.cursor() as cur:
+                # Otro proceso pudo aplicarla mientras esperábamos el lock
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_MIGRACIONES,))
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migraciones (
+                        version INTEGER PRIMARY KEY,
+                        descripcion TEXT NOT NULL,
+                        aplicada TIMESTAMP NOT NULL DEFAULT now()
+                    )
+                """)
+                if version in _versiones_aplicadas(cur):
+                    continue
+                for sentencia in sentencias:
+                    cur.execute(sentencia)
+                cur.execute(
+                    "INSERT INTO schema_migraciones (version, descripcion) VALUES (%s, %s)",
+                    (version, descripcion)
+                )
+        print(f"✅ Migración {version} aplicada: {descripcion}")
+        nuevas.append(version)
+    return nuevas
 
 def init_database():
     """
-    Verifica y actualiza la tabla historial existente.
-    Solo agrega la columna tablas_tecnicas si no existe.
-    NO crea una nueva tabla.
+    Pone al día el esquema de la tabla historial existente (historial no se
+    recrea) aplicando las migraciones pendientes. Se ejecuta una vez por
+    proceso: en las siguientes llamadas (cada rerun de Streamlit) no consulta
+    la base de datos.
     """
+    global _esquema_al_dia
     if not is_production():
         print("⚠️ MODO DESARROLLO - Base de datos no se modificará")
         return
+    if _esquema_al_dia:
+        return
     
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Solo agregar columna tablas_tecnicas si no existe
-        cur.execute("""
-            DO $$ 
-            BEGIN 
-                BEGIN
-                    ALTER TABLE historial ADD COLUMN tablas_tecnicas TEXT;
-                    RAISE NOTICE 'Columna tablas_tecnicas agregada';
-                EXCEPTION
-                    WHEN duplicate_column THEN 
-                        RAISE NOTICE 'Columna tablas_tecnicas ya existe';
-                END;
-            END $$;
-        """)
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        print("✅ Tabla historial verificada y actualizada (PRODUCCIÓN)")
-    except Exception as e:
-        print(f"❌ Error al verificar tabla historial: {e}")
+    with _migraciones_lock:
+        if _esquema_al_dia:
+            return
+        try:
+            if aplicar_migraciones():
+                print("✅ Tabla historial verificada y actualizada (PRODUCCIÓN)")
+            _esquema_al_dia = True
+        except Exception as e:
+            print(f"❌ Error al verificar tabla historial: {e}")
 
-def guardar_analisis(usuario, nombre_pdf, resumen, tablas=None):
+def guardar_analisis(usuario, nombre_pdf, resumen, tablas=None, hash_contenido=None, duraciones_etapas=None,
+                     consumo_llm=None):
     """
     Guarda el análisis en la tabla historial existente (solo en producción).
+    Si se indica el hash del contenido, el análisis queda también en la caché
+    en memoria del proceso (en cualquier entorno).
     
     Args:
         usuario (str): Nombre del usuario que realizó el análisis
         nombre_pdf (str): Nombre del archivo PDF analizado
         resumen (str): Texto completo del resumen generado
         tablas (str, optional): Tablas técnicas generadas
+        hash_contenido (str, optional): SHA-256 del contenido del PDF
+        duraciones_etapas (dict, optional): Segundos de cada etapa del
+            análisis (ver metricas.acumular_etapas)
+        consumo_llm (dict, optional): Llamadas, tokens y costo del análisis
+            (ver consumo_llm.ConsumoLLM.totales)
     
     Returns:
         int o bool: ID del registro insertado en producción, True en desarrollo
     """
+    fecha_hora = datetime.now()
+    analisis = {
+        "id": None,
+        "usuario": usuario,
+        "nombre_pdf": nombre_pdf,
+        "resumen": resumen,
+        "tablas_tecnicas": tablas,
+        "hash_contenido": hash_contenido,
+        "fecha_hora": fecha_hora,
+    }
+    
     if not is_production():
         print(f"⚠️ MODO DESARROLLO - No se guardará en base de datos: {nombre_pdf}")
+        if hash_contenido:
+            _cache_guardar(hash_contenido, analisis)
         return True
     
+    consumo_llm = consumo_llm or {}
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with span("guardado_db", archivo=nombre_pdf), conexion_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO historial (usuario, nombre_pdf, resumen, tablas_tecnicas, hash_contenido,
+                                           duraciones_etapas, llamadas_llm, tokens_entrada, tokens_salida,
+                                           costo_usd, fecha_hora)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                """, (usuario, nombre_pdf, resumen, tablas, hash_contenido,
+                      Json(duraciones_etapas) if duraciones_etapas else None,
+                      consumo_llm.get("llamadas"), consumo_llm.get("tokens_entrada"),
+                      consumo_llm.get("tokens_salida"), consumo_llm.get("costo_usd"), fecha_hora))
         
-        cur.execute("""
-            INSERT INTO historial (usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id
-        """, (usuario, nombre_pdf, resumen, tablas, datetime.now()))
+                registro_id = cur.fetchone()[0]
         
-        registro_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
+                # Mismo commit que el INSERT: los totales no se desfasan
+                cur.execute("""
+                    INSERT INTO historial_resumen_diario
+                        (dia, usuario, analisis, llamadas_llm, tokens_entrada, tokens_salida, costo_usd)
+                    VALUES (%s, %s, 1, %s, %s, %s, %s)
+                    ON CONFLICT (dia, usuario) DO UPDATE SET
+                        analisis = historial_resumen_diario.analisis + 1,
+                        llamadas_llm = historial_resumen_diario.llamadas_llm + EXCLUDED.llamadas_llm,
+                        tokens_entrada = historial_resumen_diario.tokens_entrada + EXCLUDED.tokens_entrada,
+                        tokens_salida = historial_resumen_diario.tokens_salida + EXCLUDED.tokens_salida,
+                        costo_usd = historial_resumen_diario.costo_usd + EXCLUDED.costo_usd
+                """, (fecha_hora.date(), usuario or "", consumo_llm.get("llamadas") or 0,
+                      consumo_llm.get("tokens_entrada") or 0, consumo_llm.get("tokens_salida") or 0,
+                      consumo_llm.get("costo_usd") or 0))
+        
+        _invalidar_estadisticas()
+        if hash_contenido:
+            analisis["id"] = registro_id
+            _cache_guardar(hash_contenido, analisis)
         
         print(f"✅ Análisis guardado en historial (PRODUCCIÓN): {nombre_pdf} - ID: {registro_id}")
         return registro_id
@@ -125,20 +516,17 @@ def buscar_por_nombre_pdf(nombre_pdf):
         return None
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute("""
-            SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora
-            FROM historial
-            WHERE nombre_pdf = %s
-            ORDER BY fecha_hora DESC
-            LIMIT 1
-        """, (nombre_pdf,))
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora
+                    FROM historial
+                    WHERE nombre_pdf = %s
+                    ORDER BY fecha_hora DESC
+                    LIMIT 1
+                """, (nombre_pdf,))
         
-        resultado = cur.fetchone()
-        cur.close()
-        conn.close()
+                resultado = cur.fetchone()
         
         if resultado:
             print(f"✅ Análisis previo encontrado en historial (PRODUCCIÓN): {nombre_pdf}")
@@ -148,6 +536,50 @@ def buscar_por_nombre_pdf(nombre_pdf):
         print(f"❌ Error al buscar en base de datos: {e}")
         return None
 
+def buscar_por_hash(hash_contenido):
+    """
+    Busca un análisis previo por el hash SHA-256 del contenido del PDF.
+    Consulta primero la caché LRU en memoria y solo después la base de datos
+    (solo en producción), de modo que el mismo pliego se reconoce aunque
+    llegue con otro nombre de archivo.
+    
+    Args:
+        hash_contenido (str): SHA-256 hexadecimal del contenido del PDF
+    
+    Returns:
+        dict: Análisis encontrado o None si no existe
+    """
+    analisis = _cache_obtener(hash_contenido)
+    if analisis is not None:
+        print(f"✅ Análisis previo encontrado en caché local: {analisis['nombre_pdf']}")
+        return analisis
+    
+    if not is_production():
+        return None
+    
+    try:
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, hash_contenido, fecha_hora
+                    FROM historial
+                    WHERE hash_contenido = %s
+                    ORDER BY fecha_hora DESC
+                    LIMIT 1
+                """, (hash_contenido,))
+        
+                resultado = cur.fetchone()
+        
+        if resultado:
+            resultado = dict(resultado)
+            _cache_guardar(hash_contenido, resultado)
+            print(f"✅ Análisis previo encontrado en historial (PRODUCCIÓN): {resultado['nombre_pdf']}")
+        
+        return resultado
+    except Exception as e:
+        print(f"❌ Error al buscar por hash en base de datos: {e}")
+        return None
+
 def obtener_historial(usuario=None, limite=50):
     """
     Obtiene el historial de análisis (solo en producción).
@@ -164,34 +596,98 @@ def obtener_historial(usuario=None, limite=50):
         return []
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if usuario:
+                    cur.execute("""
+                        SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora
+                        FROM historial
+                        WHERE usuario = %s
+                        ORDER BY fecha_hora DESC
+                        LIMIT %s
+                    """, (usuario, limite))
+                else:
+                    cur.execute("""
+                        SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora
+                        FROM historial
+                        ORDER BY fecha_hora DESC
+                        LIMIT %s
+                    """, (limite,))
         
-        if usuario:
-            cur.execute("""
-                SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora
-                FROM historial
-                WHERE usuario = %s
-                ORDER BY fecha_hora DESC
-                LIMIT %s
-            """, (usuario, limite))
-        else:
-            cur.execute("""
-                SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora
-                FROM historial
-                ORDER BY fecha_hora DESC
-                LIMIT %s
-            """, (limite,))
-        
-        resultados = cur.fetchall()
-        cur.close()
-        conn.close()
+                resultados = cur.fetchall()
         
         return resultados
     except Exception as e:
         print(f"❌ Error al obtener historial: {e}")
         return []
 
+def listar_historial(usuario=None, desde=None, hasta=None, prefijo_nombre=None, despues_de=None, limite=20):
+    """
+    Lista el historial por páginas, del más reciente al más antiguo, solo con
+    los metadatos de cada análisis (sin resumen ni tablas, que se piden con
+    obtener_analisis_por_id al abrir uno). Pagina por clave (fecha_hora, id):
+    cada página cuesta lo mismo sin importar cuántas haya antes.
+    
+    Args:
+        usuario (str, optional): Si se especifica, filtra por usuario
+        desde (date, optional): Primer día incluido
+        hasta (date, optional): Último día incluido
+        prefijo_nombre (str, optional): Inicio del nombre del PDF
+        despues_de (tuple, optional): Cursor (fecha_hora, id) devuelto por la
+            página anterior
+        limite (int): Registros por página
+    
+    Returns:
+        tuple: (registros, cursor de la página siguiente o None si no hay más)
+    """
+    if not is_production():
+        print("⚠️ MODO DESARROLLO - No hay historial disponible")
+        return [], None
+    
+    condiciones, parametros = [], []
+    if usuario:
+        condiciones.append("usuario = %s")
+        parametros.append(usuario)
+    if desde:
+        condiciones.append("fecha_hora >= %s")
+        parametros.append(desde)
+    if hasta:
+        condiciones.append("fecha_hora < %s::date + 1")
+        parametros.append(hasta)
+    if prefijo_nombre:
+        # El prefijo es literal: escapar los comodines de LIKE
+        prefijo = re.sub(r"([\\%_])", r"\\\1", prefijo_nombre)
+        condiciones.append("nombre_pdf LIKE %s")
+        parametros.append(prefijo + "%")
+    if despues_de:
+        condiciones.append("(fecha_hora, id) < (%s, %s)")
+        parametros.extend(despues_de)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    
+    try:
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Una fila de más indica si existe la página siguiente
+                cur.execute(f"""
+                    SELECT id, usuario, nombre_pdf, fecha_hora, hash_contenido,
+                           llamadas_llm, tokens_entrada, tokens_salida, costo_usd
+                    FROM historial
+                    {where}
+                    ORDER BY fecha_hora DESC, id DESC
+                    LIMIT %s
+                """, (*parametros, limite + 1))
+        
+                registros = cur.fetchall()
+        
+        siguiente = None
+        if len(registros) > limite:
+            registros = registros[:limite]
+            siguiente = (registros[-1]["fecha_hora"], registros[-1]["id"])
+        return registros, siguiente
+    except Exception as e:
+        print(f"❌ Error al listar historial: {e}")
+        return [], None
+
 def obtener_analisis_por_id(analisis_id):
     """
     Obtiene un análisis específico por su ID de la tabla historial (solo en producción).
@@ -207,18 +703,15 @@ def obtener_analisis_por_id(analisis_id):
         return None
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        cur.execute("""
-            SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora
-            FROM historial
-            WHERE id = %s
-        """, (analisis_id,))
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT id, usuario, nombre_pdf, resumen, tablas_tecnicas, fecha_hora
+                    FROM historial
+                    WHERE id = %s
+                """, (analisis_id,))
         
-        resultado = cur.fetchone()
-        cur.close()
-        conn.close()
+                resultado = cur.fetchone()
         
         return resultado
     except Exception as e:
@@ -227,53 +720,205 @@ def obtener_analisis_por_id(analisis_id):
 
 def obtener_estadisticas():
     """
-    Obtiene estadísticas generales de la tabla historial (solo en producción).
+    Obtiene estadísticas generales del historial (solo en producción), en una
+    sola consulta sobre los totales por día y usuario. El resultado se
+    reutiliza durante ESTADISTICAS_TTL_S segundos.
     
     Returns:
         dict: Diccionario con estadísticas
     """
+    vacias = {
+        "total_analisis": 0,
+        "total_usuarios": 0,
+        "top_usuarios": []
+    }
     if not is_production():
         print("⚠️ MODO DESARROLLO - No hay estadísticas disponibles")
-        return {
-            "total_analisis": 0,
-            "total_usuarios": 0,
-            "top_usuarios": []
-        }
+        return vacias
     
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Total de análisis
-        cur.execute("SELECT COUNT(*) FROM historial")
-        total_analisis = cur.fetchone()[0]
-        
-        # Total de usuarios únicos
-        cur.execute("SELECT COUNT(DISTINCT usuario) FROM historial")
-        total_usuarios = cur.fetchone()[0]
-        
-        # Análisis por usuario (top 5)
-        cur.execute("""
-            SELECT usuario, COUNT(*) as total
-            FROM historial
-            GROUP BY usuario
-            ORDER BY total DESC
-            LIMIT 5
-        """)
-        top_usuarios = cur.fetchall()
-        
-        cur.close()
-        conn.close()
+    def consultar():
+        with conexion_db() as conn:
+            with conn.cursor() as cur:
+                # usuario '' agrupa las filas sin usuario: cuenta en el total de
+                # análisis pero no es un usuario (como COUNT(DISTINCT usuario))
+                cur.execute("""
+                    WITH por_usuario AS (
+                        SELECT usuario, SUM(analisis) AS total
+                        FROM historial_resumen_diario
+                        GROUP BY usuario
+                    )
+                    SELECT COALESCE(SUM(total), 0),
+                           COUNT(*) FILTER (WHERE usuario <> ''),
+                           (SELECT COALESCE(json_agg(json_build_array(usuario, total) ORDER BY total DESC), '[]')
+                            FROM (SELECT usuario, total FROM por_usuario
+                                  WHERE usuario <> '' ORDER BY total DESC LIMIT 5) top)
+                    FROM por_usuario
+                """)
+                total_analisis, total_usuarios, top_usuarios = cur.fetchone()
         
         return {
-            "total_analisis": total_analisis,
+            "total_analisis": int(total_analisis),
             "total_usuarios": total_usuarios,
-            "top_usuarios": top_usuarios
+            # Análisis por usuario (top 5), como tuplas (usuario, total)
+            "top_usuarios": [(usuario, int(total)) for usuario, total in top_usuarios]
         }
+    
+    try:
+        return _estadisticas_en_cache(("generales",), consultar)
     except Exception as e:
         print(f"❌ Error al obtener estadísticas: {e}")
-        return {
-            "total_analisis": 0,
-            "total_usuarios": 0,
-            "top_usuarios": []
-        }
+        return vacias
+
+def obtener_estadisticas_por_periodo(periodo="dia", dias=90, por_usuario=False):
+    """
+    Análisis, tokens y costo agrupados por día, semana o mes (y opcionalmente
+    por usuario), desde los totales por día y usuario (solo en producción).
+    El resultado se reutiliza durante ESTADISTICAS_TTL_S segundos.
+    
+    Args:
+        periodo (str): "dia", "semana" o "mes"
+        dias (int): Días hacia atrás a considerar
+        por_usuario (bool): Separar cada periodo por usuario
+    
+    Returns:
+        list: Diccionarios {periodo, [usuario], analisis, llamadas_llm,
+        tokens_entrada, tokens_salida, costo_usd}, del periodo más reciente al
+        más antiguo
+    """
+    if periodo not in PERIODOS:
+        raise ValueError(f"Periodo no soportado: {periodo} (use {', '.join(PERIODOS)})")
+    if not is_production():
+        print("⚠️ MODO DESARROLLO - No hay estadísticas disponibles")
+        return []
+    
+    def consultar():
+        columnas = "periodo, usuario" if por_usuario else "periodo"
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(f"""
+                    SELECT date_trunc(%s, dia)::date AS periodo,
+                           {"usuario," if por_usuario else ""}
+                           SUM(analisis) AS analisis,
+                           SUM(llamadas_llm) AS llamadas_llm,
+                           SUM(tokens_entrada) AS tokens_entrada,
+                           SUM(tokens_salida) AS tokens_salida,
+                           SUM(costo_usd) AS costo_usd
+                    FROM historial_resumen_diario
+                    WHERE dia >= CURRENT_DATE - %s
+                    GROUP BY {columnas}
+                    ORDER BY periodo DESC{", analisis DESC" if por_usuario else ""}
+                """, (PERIODOS[periodo], dias))
+                return cur.fetchall()
+    
+    try:
+        return _estadisticas_en_cache(("por_periodo", periodo, dias, por_usuario), consultar)
+    except Exception as e:
+        print(f"❌ Error al obtener estadísticas por periodo: {e}")
+        return []
+
+def obtener_consumo_tokens(dias=30, usuario=None):
+    """
+    Tokens y costo del LLM por usuario y por día (solo en producción), desde
+    los totales por día y usuario.
+    
+    Args:
+        dias (int): Días hacia atrás a considerar
+        usuario (str, optional): Si se especifica, filtra por usuario
+    
+    Returns:
+        list: Diccionarios {dia, usuario, analisis, llamadas_llm,
+        tokens_entrada, tokens_salida, costo_usd}, del día más reciente al
+        más antiguo
+    """
+    if not is_production():
+        print("⚠️ MODO DESARROLLO - No hay consumo de tokens disponible")
+        return []
+    
+    def consultar():
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT dia, usuario, analisis, llamadas_llm, tokens_entrada, tokens_salida, costo_usd
+                    FROM historial_resumen_diario
+                    WHERE dia >= CURRENT_DATE - %s
+                      AND (%s::text IS NULL OR usuario = %s)
+                    ORDER BY dia DESC, tokens_entrada DESC
+                """, (dias, usuario, usuario))
+                return cur.fetchall()
+    
+    try:
+        return _estadisticas_en_cache(("consumo", dias, usuario), consultar)
+    except Exception as e:
+        print(f"❌ Error al obtener consumo de tokens: {e}")
+        return []
+
+def obtener_analisis_mas_costosos(limite=10, dias=30):
+    """
+    Análisis con más tokens consumidos (solo en producción), para detectar
+    los pliegos que disparan el presupuesto.
+    
+    Args:
+        limite (int): Número máximo de registros a devolver
+        dias (int): Días hacia atrás a considerar
+    
+    Returns:
+        list: Diccionarios {id, usuario, nombre_pdf, fecha_hora, llamadas_llm,
+        tokens_entrada, tokens_salida, costo_usd}
+    """
+    if not is_production():
+        print("⚠️ MODO DESARROLLO - No hay consumo de tokens disponible")
+        return []
+    
+    try:
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT id, usuario, nombre_pdf, fecha_hora, llamadas_llm,
+                           tokens_entrada, tokens_salida, costo_usd
+                    FROM historial
+                    WHERE tokens_entrada IS NOT NULL
+                      AND fecha_hora >= NOW() - make_interval(days => %s)
+                    ORDER BY tokens_entrada + tokens_salida DESC
+                    LIMIT %s
+                """, (dias, limite))
+        
+                return cur.fetchall()
+    except Exception as e:
+        print(f"❌ Error al obtener los análisis más costosos: {e}")
+        return []
+
+def obtener_percentiles_etapas(dias=30):
+    """
+    Percentiles p50 y p95 de la duración de cada etapa por día, a partir de
+    las duraciones guardadas en historial (solo en producción).
+    
+    Args:
+        dias (int): Días hacia atrás a considerar
+    
+    Returns:
+        list: Diccionarios {dia, etapa, p50, p95, analisis}, ordenados por día y etapa
+    """
+    if not is_production():
+        print("⚠️ MODO DESARROLLO - No hay duraciones por etapa disponibles")
+        return []
+    
+    try:
+        with conexion_db() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT date_trunc('day', h.fecha_hora) AS dia,
+                           e.key AS etapa,
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY e.value::float) AS p50,
+                           percentile_cont(0.95) WITHIN GROUP (ORDER BY e.value::float) AS p95,
+                           COUNT(*) AS analisis
+                    FROM historial h, jsonb_each_text(h.duraciones_etapas) e
+                    WHERE h.duraciones_etapas IS NOT NULL
+                      AND h.fecha_hora >= NOW() - make_interval(days => %s)
+                    GROUP BY 1, 2
+                    ORDER BY 1, 2
+                """, (dias,))
+        
+                return cur.fetchall()
+    except Exception as e:
+        print(f"❌ Error al obtener duraciones por etapa: {e}")
+        return []
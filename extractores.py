@@ -0,0 +1,140 @@
+"""
+extractores.py - Backends de extracción de texto de PDFs
+
+Cada backend recibe el contenido del PDF en memoria (bytes, bytearray o
+memoryview) y devuelve el texto de cada página. Las librerías se importan
+solo al usarse, así que basta con instalar las que se quieran probar:
+
+    pypdf      (por defecto, ya incluido en requirements.txt)
+    pypdfium2  pip install pypdfium2
+    pymupdf    pip install pymupdf
+    pdfminer   pip install pdfminer.six
+
+El backend se elige con "extractor_pdf" en config.json. Para compararlos
+sobre un corpus propio: python benchmarks/benchmark_extractores.py <carpeta>
+"""
+
+import io
+from importlib.util import find_spec
+
+EXTRACTOR_POR_DEFECTO = "pypdf"
+
+
+class _FlujoMemoria(io.RawIOBase):
+    """
+    Flujo de solo lectura sobre un buffer (bytes, bytearray o memoryview)
+    sin copiarlo: el backend lee del mismo bloque de memoria que subió el usuario.
+    """
+
+    def __init__(self, buffer):
+        self._datos = memoryview(buffer).cast("B")
+        self._posicion = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, destino):
+        n = min(len(destino), len(self._datos) - self._posicion)
+        destino[:n] = self._datos[self._posicion:self._posicion + n]
+        self._posicion += n
+        return n
+
+    def seek(self, desplazamiento, desde=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._posicion, io.SEEK_END: len(self._datos)}[desde]
+        self._posicion = max(0, base + desplazamiento)
+        return self._posicion
+
+    def tell(self):
+        return self._posicion
+
+
+def flujo_memoria(pdf_bytes):
+    """Archivo binario de solo lectura sobre el buffer, sin copiarlo"""
+    return io.BufferedReader(_FlujoMemoria(pdf_bytes))
+
+
+def _extraer_pypdf(pdf_bytes):
+    from pypdf import PdfReader
+
+    reader = PdfReader(flujo_memoria(pdf_bytes))
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def _extraer_pypdfium2(pdf_bytes):
+    import pypdfium2 as pdfium
+
+    documento = pdfium.PdfDocument(flujo_memoria(pdf_bytes), autoclose=True)
+    textos = []
+    try:
+        for page in documento:
+            textpage = page.get_textpage()
+            textos.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+    finally:
+        documento.close()
+    return textos
+
+
+def _extraer_pymupdf(pdf_bytes):
+    import fitz
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as documento:
+        # sort=True ordena los bloques por posición: filas de tablas legibles
+        return [page.get_text("text", sort=True) for page in documento]
+
+
+def _extraer_pdfminer(pdf_bytes):
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+
+    return [
+        "".join(elemento.get_text() for elemento in pagina if isinstance(elemento, LTTextContainer))
+        for pagina in extract_pages(flujo_memoria(pdf_bytes))
+    ]
+
+
+# nombre -> (función, módulo que debe estar instalado)
+EXTRACTORES = {
+    "pypdf": (_extraer_pypdf, "pypdf"),
+    "pypdfium2": (_extraer_pypdfium2, "pypdfium2"),
+    "pymupdf": (_extraer_pymupdf, "fitz"),
+    "pdfminer": (_extraer_pdfminer, "pdfminer"),
+}
+
+
+def extractores_disponibles():
+    """Nombres de los backends cuya librería está instalada"""
+    return [nombre for nombre, (_, modulo) in EXTRACTORES.items() if find_spec(modulo) is not None]
+
+
+def extractor_configurado():
+    """Backend elegido en config.json (o el por defecto si no está instalado)"""
+    from corelogic import get_config
+
+    nombre = get_config("extractor_pdf", EXTRACTOR_POR_DEFECTO)
+    if nombre not in EXTRACTORES:
+        print(f"⚠️ Extractor '{nombre}' desconocido, se usa {EXTRACTOR_POR_DEFECTO}")
+        return EXTRACTOR_POR_DEFECTO
+    if nombre not in extractores_disponibles():
+        print(f"⚠️ Extractor '{nombre}' no instalado, se usa {EXTRACTOR_POR_DEFECTO}")
+        return EXTRACTOR_POR_DEFECTO
+    return nombre
+
+
+def extraer_textos(pdf_bytes, extractor=None):
+    """
+    Extrae el texto de cada página con el backend indicado.
+
+    Args:
+        pdf_bytes: Contenido del PDF (bytes, bytearray o memoryview)
+        extractor (str, optional): Nombre del backend; por defecto el de config.json
+
+    Returns:
+        list: Texto de cada página, en orden
+    """
+    funcion, _ = EXTRACTORES[extractor or extractor_configurado()]
+    return funcion(pdf_bytes)
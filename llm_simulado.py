@@ -0,0 +1,236 @@
+"""
+llm_simulado.py - Modelo de chat simulado, sin red ni claves
+
+Se activa con "llm_provider": "fake" en config.json y sirve para medir y
+probar con carga el pipeline completo (extracción, resumen, tablas y su
+conversión a Excel) en máquinas sin acceso a los proveedores. Responde con
+textos fijos que siguen los formatos reales: el resumen de 9 secciones
+(promots.SECCIONES_RESUMEN), una sola sección en el modo por secciones, o
+las tablas #1 y #2 con las filas de promots.
+
+Los tiempos imitan a un modelo real: una latencia hasta el primer token
+tomada de una distribución configurable y luego un ritmo fijo de tokens por
+segundo. Con la misma semilla y el mismo prompt, la respuesta y los tiempos
+son siempre los mismos. Configuración en config.json:
+
+    "llm_simulado": {
+        "latencia": {"distribucion": "lognormal", "media_s": 1.5, "desviacion_s": 0.5},
+        "tokens_por_segundo": 80,
+        "semilla": 0
+    }
+
+distribucion puede ser "fija", "normal" o "lognormal".
+"""
+
+import re
+import math
+import time
+import random
+import hashlib
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from promots import SECCIONES_RESUMEN, TITULOS_TABLAS, _CUERPOS_TABLAS
+
+DISTRIBUCIONES = ("fija", "normal", "lognormal")
+
+# Contenido fijo de cada sección del resumen
+_CONTENIDO_SECCIONES = {
+    1: """- Transformadores de distribución trifásicos tipo pedestal, sumergidos en aceite.
+- Potencias nominales: 75 kVA, 150 kVA y 300 kVA.
+- Instalación exterior a 2600 msnm, temperatura ambiente máxima de 40 °C.
+- Servicio continuo en redes de media tensión del operador de red.""",
+    2: """- Tensión primaria 13,2 kV; tensión secundaria 214/123 V.
+- Frecuencia 60 Hz, grupo de conexión Dyn5.
+- Impedancia de cortocircuito 4,5 % ± 7,5 %.
+- Regulación con conmutador de 5 posiciones, ±2 × 2,5 % en el lado de alta tensión.
+- BIL primario 95 kV; BIL secundario 30 kV.
+- Pérdidas máximas según NTC 819 y NTC 818 a la tensión primaria.""",
+    3: """- Refrigeración ONAN con aceite mineral inhibido.
+- Devanados de alta tensión en cobre y de baja tensión en aluminio.
+- Núcleo de acero al silicio de grano orientado, tipo enrollado.
+- Tanque hermético soldado con radiadores de lámina ondulada.""",
+    4: """- Preparación superficial por granallado a metal blanco.
+- Imprimante epóxico y acabado en poliuretano, espesor total mínimo 120 µm de película seca.
+- Color RAL 7035.""",
+    5: """- Pararrayos de óxido metálico de 12 kV y fusibles tipo bayoneta.
+- Aisladores de alta tensión tipo codo de 200 A; terminales de baja tensión de 4 perforaciones.
+- Termómetro de dial, indicador de nivel de aceite y válvula de alivio de presión.""",
+    6: """- NTC 3997 (transformadores tipo pedestal), NTC 818 y NTC 819 (pérdidas), IEC 60076-1.
+- Pruebas de rutina según NTC 1005; ensayos tipo con protocolo del laboratorio.
+- Certificado de conformidad RETIE.""",
+    7: """- Placa de características en acero inoxidable, en español, según NTC 618.
+- Planos de dimensiones generales y manual de operación y mantenimiento.""",
+    8: """- Embalaje en guacal de madera tratada apto para izaje con montacargas.
+- Transporte en posición vertical con el tanque lleno de aceite.""",
+    9: """- Planos de dimensiones generales con la oferta.
+- Declaración de pérdidas garantizadas con carga y sin carga.
+- Cronograma de fabricación y pruebas.""",
+}
+
+# Valor fijo de cada fila de las tablas (las demás quedan en N/A)
+_VALORES_TABLAS = {
+    "Especificaciones del cliente": "Pliego de condiciones técnicas ET-TD-001",
+    "Normas": "NTC 3997, NTC 818, NTC 819, IEC 60076-1",
+    "Tipos de transformador": "Trifásico tipo pedestal",
+    "Potencias (kVA/MVA)": "75 / 150 / 300 kVA",
+    "Fases": "3",
+    "Tipo de refrigeración": "ONAN",
+    "Polaridad / Grupo de conexión": "Dyn5",
+    "Voltaje primario (kV)": "13,2",
+    "BIL primario (kV)": "95",
+    "Voltaje secundario (kV)": "0,214 / 0,123",
+    "BIL secundario (kV)": "30",
+    "Frecuencia (Hz)": "60",
+    "Pérdidas con carga (W)": "Según NTC 818",
+    "Pérdidas sin carga (W)": "Según NTC 819",
+    "Impedancia (%)": "4,5",
+    "Terminal de baja tensión": "Espada de 4 perforaciones",
+    "Terminal de alta tensión": "Tipo codo 200 A",
+    "Conmutador": "5 posiciones, ±2 × 2,5 %",
+    "Pararrayos": "Óxido metálico 12 kV",
+    "Fusibles": "Tipo bayoneta",
+    "Termómetro": "De dial",
+    "Nivel de aceite": "Indicador magnético",
+    "Válvulas": "Alivio de presión y drenaje",
+}
+
+_PATRON_FILA = re.compile(r"^\| (?P<campo>[^|]+?) \| \[[^\]]*\] \|$", re.MULTILINE)
+_PATRON_PALABRA = re.compile(r"\s*\S+")
+
+
+def _seccion(numero):
+    return f"{SECCIONES_RESUMEN[numero]['titulo']}\n{_CONTENIDO_SECCIONES[numero]}"
+
+
+def _tabla(numero):
+    cuerpo = _PATRON_FILA.sub(
+        lambda m: f"| {m['campo']} | {_VALORES_TABLAS.get(m['campo'], 'N/A')} |",
+        _CUERPOS_TABLAS[numero],
+    )
+    return f"{TITULOS_TABLAS[numero]}\n\n{cuerpo.strip()}"
+
+
+def respuesta_simulada(prompt):
+    """
+    Texto que devolvería el modelo para el prompt, según el formato que pide:
+    tablas (una o las dos), una sección del resumen o el resumen completo.
+    """
+    if "RESUMEN EJECUTIVO:" in prompt:
+        # Prompt de tablas: solo cuentan los títulos antes del resumen
+        instrucciones = prompt.split("RESUMEN EJECUTIVO:", 1)[0]
+        numeros = [numero for numero, titulo in TITULOS_TABLAS.items() if titulo in instrucciones]
+        if numeros:
+            return "\n\n---\n\n".join(_tabla(numero) for numero in numeros)
+
+    for numero, seccion in SECCIONES_RESUMEN.items():
+        if f'título exacto "{seccion["titulo"]}"' in prompt:
+            return _seccion(numero)
+
+    return "\n\n".join(_seccion(numero) for numero in SECCIONES_RESUMEN)
+
+
+class LLMSimulado(BaseChatModel):
+    """
+    Chat model de LangChain determinista con tiempos realistas.
+
+    Args:
+        model_name (str): Nombre informado en la metadata de las respuestas
+        distribucion (str): "fija", "normal" o "lognormal"
+        latencia_media_s (float): Latencia media hasta el primer token
+        latencia_desviacion_s (float): Desviación estándar de la latencia
+        tokens_por_segundo (float): Ritmo de generación tras el primer token
+        semilla (int): Semilla; junto con el prompt fija latencia y respuesta
+    """
+
+    model_name: str = "simulado"
+    distribucion: str = "lognormal"
+    latencia_media_s: float = 1.5
+    latencia_desviacion_s: float = 0.5
+    tokens_por_segundo: float = 80.0
+    semilla: int = 0
+
+    @classmethod
+    def desde_config(cls, config):
+        """Crea el modelo a partir de la clave "llm_simulado" de config.json"""
+        latencia = config.get("latencia", {})
+        distribucion = latencia.get("distribucion", "lognormal")
+        if distribucion not in DISTRIBUCIONES:
+            raise ValueError(f"Distribución de latencia no soportada: {distribucion}")
+        return cls(
+            distribucion=distribucion,
+            latencia_media_s=latencia.get("media_s", 1.5),
+            latencia_desviacion_s=latencia.get("desviacion_s", 0.5),
+            tokens_por_segundo=config.get("tokens_por_segundo", 80.0),
+            semilla=config.get("semilla", 0),
+        )
+
+    @property
+    def _llm_type(self):
+        return "simulado"
+
+    @property
+    def _identifying_params(self):
+        return {
+            "model_name": self.model_name,
+            "distribucion": self.distribucion,
+            "latencia_media_s": self.latencia_media_s,
+            "tokens_por_segundo": self.tokens_por_segundo,
+        }
+
+    def _latencia(self, prompt):
+        """Latencia hasta el primer token, fija para (semilla, prompt)"""
+        h = hashlib.sha256(f"{self.semilla}|{prompt}".encode("utf-8")).digest()
+        rng = random.Random(int.from_bytes(h[:8], "big"))
+        media, desviacion = self.latencia_media_s, self.latencia_desviacion_s
+        if self.distribucion == "fija" or desviacion <= 0:
+            return media
+        if self.distribucion == "normal":
+            return max(0.0, rng.gauss(media, desviacion))
+        # Lognormal con la media y la desviación pedidas (colas largas, como una API real)
+        sigma2 = math.log(1 + (desviacion / media) ** 2)
+        return rng.lognormvariate(math.log(media) - sigma2 / 2, math.sqrt(sigma2))
+
+    @staticmethod
+    def _prompt(messages):
+        return "\n\n".join(str(message.content) for message in messages)
+
+    def _uso(self, prompt, tokens_salida):
+        tokens_entrada = len(prompt) // 4 + 1
+        return {
+            "input_tokens": tokens_entrada,
+            "output_tokens": tokens_salida,
+            "total_tokens": tokens_entrada + tokens_salida,
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        texto = respuesta_simulada(prompt)
+        tokens = _PATRON_PALABRA.findall(texto)
+        time.sleep(self._latencia(prompt) + len(tokens) / self.tokens_por_segundo)
+        mensaje = AIMessage(
+            content=texto,
+            usage_metadata=self._uso(prompt, len(tokens)),
+            response_metadata={"model_name": self.model_name},
+        )
+        return ChatResult(generations=[ChatGeneration(message=mensaje)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        tokens = _PATRON_PALABRA.findall(respuesta_simulada(prompt))
+        time.sleep(self._latencia(prompt))
+        intervalo = 1 / self.tokens_por_segundo
+        for token in tokens:
+            time.sleep(intervalo)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        # El uso va en el último fragmento, como en OpenAI con stream_usage
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            usage_metadata=self._uso(prompt, len(tokens)),
+            response_metadata={"model_name": self.model_name},
+        ))
@@ -0,0 +1,216 @@
+"""
+metricas.py - Medición de las etapas del análisis
+
+Cada etapa (extracción, OCR, resumen con el LLM, tablas con el LLM,
+guardado en la base) se mide con `span()`. Por cada span terminado:
+
+    - se escribe una línea JSON en el log "specbot.metricas" (stderr, o el
+      archivo de METRICAS_LOG),
+    - se acumula en un histograma en memoria que se expone en formato de
+      texto de Prometheus: en http://127.0.0.1:<METRICAS_PUERTO>/metrics si
+      se define METRICAS_PUERTO, y/o en el archivo METRICAS_ARCHIVO (para el
+      textfile collector de node_exporter),
+    - si el hilo está dentro de `acumular_etapas(duraciones)`, se suma a
+      duraciones[etapa]; así cada análisis guarda sus duraciones junto a su
+      fila del historial.
+
+Las etapas pueden anidarse (la extracción incluye el OCR); un span dentro de
+otro de la misma etapa no vuelve a sumarse.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+METRICAS_PUERTO = os.getenv("METRICAS_PUERTO")
+METRICAS_HOST = os.getenv("METRICAS_HOST", "127.0.0.1")
+METRICAS_ARCHIVO = os.getenv("METRICAS_ARCHIVO")
+METRICAS_LOG = os.getenv("METRICAS_LOG")
+
+# Límites superiores (segundos) de los buckets del histograma
+BUCKETS_SEGUNDOS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+ESTADO_OK = "ok"
+ESTADO_ERROR = "error"
+# Generador abandonado por quien lo consumía (p. ej. se cerró la pestaña)
+ESTADO_CANCELADO = "cancelado"
+
+logger = logging.getLogger("specbot.metricas")
+
+_lock = threading.Lock()
+# (etapa, estado) -> {"buckets": [conteo por límite], "suma": s, "conteo": n}
+_histogramas = {}
+_duraciones_actuales = ContextVar("duraciones_etapas", default=None)
+_etapas_activas = ContextVar("etapas_activas", default=())
+_servidor = None
+_iniciado = False
+
+
+def iniciar_metricas():
+    """
+    Configura el log JSON y, si METRICAS_PUERTO está definido, levanta el
+    endpoint /metrics en un hilo daemon. Es idempotente.
+    """
+    global _iniciado, _servidor
+    if _iniciado:
+        return
+    with _lock:
+        if _iniciado:
+            return
+        if not logger.handlers:
+            handler = logging.FileHandler(METRICAS_LOG, encoding="utf-8") if METRICAS_LOG else logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+        if METRICAS_PUERTO:
+            try:
+                _servidor = ThreadingHTTPServer((METRICAS_HOST, int(METRICAS_PUERTO)), _ManejadorMetricas)
+                threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+                print(f"📈 Métricas en http://{METRICAS_HOST}:{METRICAS_PUERTO}/metrics")
+            except OSError as e:
+                # Otro proceso (o un rerun de Streamlit) ya tiene el puerto
+                print(f"⚠️ No se pudo abrir el puerto de métricas {METRICAS_PUERTO}: {e}")
+        _iniciado = True
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = exposicion_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        # Sin una línea por cada scrape
+        pass
+
+
+@contextmanager
+def acumular_etapas(duraciones):
+    """
+    Suma en `duraciones` los segundos de cada etapa medida dentro del bloque
+    en este hilo (los hilos de un pool no heredan el bloque).
+
+    Args:
+        duraciones (dict): {etapa: segundos}; se modifica en el lugar
+    """
+    token = _duraciones_actuales.set(duraciones)
+    try:
+        yield duraciones
+    finally:
+        _restablecer(_duraciones_actuales, token)
+
+
+def _restablecer(variable, token):
+    try:
+        variable.reset(token)
+    except ValueError:
+        # Generador cerrado desde otro contexto: el valor muere con él
+        pass
+
+
+@contextmanager
+def span(etapa, **atributos):
+    """
+    Mide la duración de una etapa.
+
+    Args:
+        etapa (str): Nombre de la etapa (ej. "extraccion", "ocr", "resumen_llm")
+        **atributos: Datos extra para la línea de log (archivo, páginas...);
+            no se usan como etiquetas de Prometheus
+    """
+    iniciar_metricas()
+    anidado = etapa in _etapas_activas.get()
+    token = _etapas_activas.set(_etapas_activas.get() + (etapa,))
+    estado = ESTADO_OK
+    inicio = time.perf_counter()
+    try:
+        yield
+    except GeneratorExit:
+        estado = ESTADO_CANCELADO
+        raise
+    except BaseException:
+        estado = ESTADO_ERROR
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        _restablecer(_etapas_activas, token)
+        if not anidado:
+            _registrar(etapa, estado, segundos, atributos)
+
+
+def _registrar(etapa, estado, segundos, atributos):
+    with _lock:
+        histograma = _histogramas.setdefault(
+            (etapa, estado), {"buckets": [0] * len(BUCKETS_SEGUNDOS), "suma": 0.0, "conteo": 0}
+        )
+        for i, limite in enumerate(BUCKETS_SEGUNDOS):
+            if segundos <= limite:
+                histograma["buckets"][i] += 1
+        histograma["suma"] += segundos
+        histograma["conteo"] += 1
+
+        duraciones = _duraciones_actuales.get()
+        if duraciones is not None:
+            duraciones[etapa] = round(duraciones.get(etapa, 0.0) + segundos, 3)
+
+    logger.info(json.dumps({
+        "ts": time.time(),
+        "evento": "span",
+        "etapa": etapa,
+        "estado": estado,
+        "segundos": round(segundos, 4),
+        "hilo": threading.current_thread().name,
+        **atributos,
+    }, ensure_ascii=False, default=str))
+
+    if METRICAS_ARCHIVO:
+        escribir_metricas(METRICAS_ARCHIVO)
+
+
+def _etiquetas(etapa, estado, **extra):
+    pares = {"etapa": etapa, "estado": estado, **extra}
+    return "{" + ",".join(f'{clave}="{valor}"' for clave, valor in pares.items()) + "}"
+
+
+def exposicion_prometheus():
+    """
+    Returns:
+        str: Histogramas de duración por etapa en formato de texto de Prometheus
+    """
+    lineas = [
+        "# HELP specbot_etapa_segundos Duración de cada etapa del análisis de pliegos",
+        "# TYPE specbot_etapa_segundos histogram",
+    ]
+    with _lock:
+        for (etapa, estado), histograma in sorted(_histogramas.items()):
+            for limite, conteo in zip(BUCKETS_SEGUNDOS, histograma["buckets"]):
+                lineas.append(f"specbot_etapa_segundos_bucket{_etiquetas(etapa, estado, le=limite)} {conteo}")
+            lineas.append(f"specbot_etapa_segundos_bucket{_etiquetas(etapa, estado, le='+Inf')} {histograma['conteo']}")
+            lineas.append(f"specbot_etapa_segundos_sum{_etiquetas(etapa, estado)} {histograma['suma']:.6f}")
+            lineas.append(f"specbot_etapa_segundos_count{_etiquetas(etapa, estado)} {histograma['conteo']}")
+    return "\n".join(lineas) + "\n"
+
+
+def escribir_metricas(ruta):
+    """Escribe la exposición en `ruta` de forma atómica (nunca queda a medias)"""
+    ruta = Path(ruta)
+    temporal = ruta.with_name(f".{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        temporal.write_text(exposicion_prometheus(), encoding="utf-8")
+        os.replace(temporal, ruta)
+    except OSError as e:
+        print(f"⚠️ No se pudieron escribir las métricas en {ruta}: {e}")
@@ -0,0 +1,244 @@
+"""
+pipeline.py - Procesamiento por lotes de varios PDFs
+
+Encadena extracción → resumen → tablas → guardado con pools de hilos
+acotados: mientras un archivo espera al LLM, el siguiente ya se está
+extrayendo (o pasando por OCR). El avance se entrega como eventos por
+archivo para que la interfaz lo muestre.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils import extract_text_from_pdf_bytes, resumen_documento, calcular_hash_pdf, MODO_COMPLETO
+from table_generator import generar_tablas_desde_resumen
+from database_supabase import buscar_por_hash, guardar_analisis
+from metricas import acumular_etapas
+from consumo_llm import ConsumoLLM, con_consumo
+
+# Concurrencia del pipeline
+MAX_EXTRACCIONES_SIMULTANEAS = 2
+MAX_ANALISIS_SIMULTANEOS = 3
+
+# Etapas que reporta procesar_lote
+ETAPA_EN_COLA = "en_cola"
+ETAPA_EXTRAYENDO = "extrayendo"
+ETAPA_EXTRAIDO = "extraido"
+ETAPA_RESUMIENDO = "resumiendo"
+ETAPA_TABLAS = "tablas"
+ETAPA_LISTO = "listo"
+ETAPA_CACHE = "cache"
+ETAPA_ERROR = "error"
+
+ETAPAS_FINALES = (ETAPA_LISTO, ETAPA_CACHE, ETAPA_ERROR)
+
+
+def nombre_conjunto(nombres):
+    """Nombre con el que se guarda el análisis combinado de varios archivos"""
+    return "Conjunto: " + ", ".join(nombres)
+
+
+def hash_conjunto(hashes):
+    """Hash del conjunto de archivos, independiente del orden en que se suben"""
+    return calcular_hash_pdf("\n".join(sorted(hashes)).encode("utf-8"))
+
+
+def _leer_pdf(contenido):
+    """Devuelve los bytes del PDF; las rutas se leen recién cuando se necesitan"""
+    if isinstance(contenido, (str, os.PathLike)):
+        return Path(contenido).read_bytes()
+    return contenido
+
+
+def _resultado(nombre, resumen, tablas):
+    return {"nombre": nombre, "resumen": resumen, "tablas": tablas}
+
+
+def procesar_lote(archivos, llm_instance, resumen_prompt, usuario, max_tokens=None, combinado=False,
+                  forzar=False, max_extracciones=None, max_analisis=None, progreso=None,
+                  modo=MODO_COMPLETO):
+    """
+    Procesa varios PDFs con un pipeline concurrente acotado.
+
+    En modo individual cada archivo se busca en la caché por su hash y, si no
+    está, se extrae, se resume, se generan sus tablas y se guarda. En modo
+    combinado se extraen todos los archivos y se genera un único resumen (y
+    un único par de tablas) para el conjunto, con su propia entrada de caché.
+    Si algún archivo del conjunto falla, el conjunto entero termina en error
+    y no se guarda.
+
+    Args:
+        archivos (list): Lista de tuplas (nombre, pdf_bytes) o (nombre, ruta);
+            las rutas se leen al extraer, así un lote grande no se carga entero
+            en memoria
+        llm_instance: Instancia del modelo LLM
+        resumen_prompt: Prompt del resumen ejecutivo
+        usuario (str): Usuario que solicita el análisis
+        max_tokens (int, optional): Presupuesto de tokens por documento
+        combinado (bool): Generar un solo resumen para todo el conjunto
+        forzar (bool): Ignorar la caché y regenerar los análisis
+        max_extracciones (int, optional): Extracciones/OCR simultáneos
+        max_analisis (int, optional): Análisis con el LLM simultáneos
+        progreso: Callback progreso(nivel, mensaje, avance) para los avisos
+            de extracción y resumen (ver utils); por defecto se imprimen
+        modo (str): Modo del resumen (utils.MODO_COMPLETO o MODO_SECCIONES)
+
+    Yields:
+        dict: Eventos {"indice", "nombre", "etapa", "resultado", "error"};
+        "indice" es la posición del archivo en `archivos` (None para el
+        conjunto en modo combinado). El lote termina cuando cada archivo (o
+        el conjunto) llega a una etapa de ETAPAS_FINALES. Los archivos con el
+        mismo contenido se analizan una sola vez y reciben el mismo resultado
+    """
+    eventos = queue.Queue()
+    conjunto = nombre_conjunto([nombre for nombre, _ in archivos]) if combinado else None
+
+    def avisar(indices, etapa, resultado=None, error=None):
+        # Un evento por archivo con ese contenido (None = el conjunto)
+        for indice in indices:
+            nombre = conjunto if indice is None else archivos[indice][0]
+            eventos.put({
+                "indice": indice,
+                "nombre": nombre,
+                "etapa": etapa,
+                "resultado": dict(resultado, nombre=nombre) if resultado else None,
+                "error": error,
+            })
+
+    def con_errores(indices, funcion, *args):
+        try:
+            funcion(*args)
+        except Exception as e:
+            nombre = conjunto if indices[0] is None else archivos[indices[0]][0]
+            print(f"❌ Error procesando '{nombre}': {e}")
+            avisar(indices, ETAPA_ERROR, error=str(e))
+
+    def analizar(indices, nombre, hash_pdf, docs, duraciones):
+        consumo = ConsumoLLM()
+        llm = con_consumo(llm_instance, consumo)
+        with acumular_etapas(duraciones):
+            avisar(indices, ETAPA_RESUMIENDO)
+            # Un error del LLM corta el análisis: no se guarda ni se cachea
+            resumen = resumen_documento(docs, llm, resumen_prompt, max_tokens, progreso=progreso, modo=modo,
+                                        lanzar_errores=True)
+            avisar(indices, ETAPA_TABLAS)
+            tablas = generar_tablas_desde_resumen(resumen, llm, lanzar_errores=True)
+        guardar_analisis(usuario, nombre, resumen, tablas, hash_contenido=hash_pdf,
+                         duraciones_etapas=duraciones, consumo_llm=consumo.totales())
+        avisar(indices, ETAPA_LISTO, resultado=_resultado(nombre, resumen, tablas))
+
+    max_extracciones = max_extracciones or MAX_EXTRACCIONES_SIMULTANEAS
+    max_analisis = max_analisis or MAX_ANALISIS_SIMULTANEOS
+
+    # Limita los documentos extraídos que esperan al LLM (memoria acotada)
+    cupos = threading.Semaphore(max_analisis + max_extracciones)
+    pool_extraccion = ThreadPoolExecutor(max_extracciones, thread_name_prefix="extraccion")
+    pool_llm = ThreadPoolExecutor(max_analisis, thread_name_prefix="llm")
+
+    def extraer_y_encolar(indices, hash_pdf):
+        nombre, pdf = archivos[indices[0]]
+        cupos.acquire()
+        duraciones = {}
+        try:
+            avisar(indices, ETAPA_EXTRAYENDO)
+            with acumular_etapas(duraciones):
+                docs = extract_text_from_pdf_bytes(_leer_pdf(pdf), nombre, progreso=progreso)
+            if not docs:
+                cupos.release()
+                avisar(indices, ETAPA_ERROR, error="No se pudo extraer texto del PDF")
+                return
+        except Exception:
+            cupos.release()
+            raise
+
+        def analizar_y_liberar():
+            try:
+                analizar(indices, nombre, hash_pdf, docs, duraciones)
+            finally:
+                cupos.release()
+
+        avisar(indices, ETAPA_EXTRAIDO)
+        pool_llm.submit(con_errores, indices, analizar_y_liberar)
+
+    def extraer(indices, duraciones):
+        nombre, pdf = archivos[indices[0]]
+        avisar(indices, ETAPA_EXTRAYENDO)
+        with acumular_etapas(duraciones):
+            docs = extract_text_from_pdf_bytes(_leer_pdf(pdf), nombre, progreso=progreso)
+        avisar(indices, ETAPA_EXTRAIDO if docs else ETAPA_ERROR,
+               error=None if docs else "No se pudo extraer texto del PDF")
+        return docs
+
+    try:
+        # Índices de los archivos agrupados por contenido, en orden de llegada
+        grupos = {}
+        for indice, (_, pdf) in enumerate(archivos):
+            grupos.setdefault(calcular_hash_pdf(_leer_pdf(pdf)), []).append(indice)
+        for indices in grupos.values():
+            if len(indices) > 1:
+                print(f"♻️ Contenido repetido en el lote: {', '.join(archivos[i][0] for i in indices)}")
+
+        if combinado:
+            hash_lote = hash_conjunto(grupos.keys())
+
+            existente = None if forzar else buscar_por_hash(hash_lote)
+            if existente:
+                yield {"indice": None, "nombre": conjunto, "etapa": ETAPA_CACHE, "error": None,
+                       "resultado": _resultado(conjunto, existente["resumen"], existente.get("tablas_tecnicas"))}
+                return
+
+            for indices in grupos.values():
+                avisar(indices, ETAPA_EN_COLA)
+            # Las extracciones del conjunto suman sus segundos en la misma entrada
+            duraciones_conjunto = {}
+            futuros = [
+                (indices, pool_extraccion.submit(extraer, indices, duraciones_conjunto))
+                for indices in grupos.values()
+            ]
+
+            def analizar_conjunto():
+                docs_conjunto = []
+                fallidos = []
+                for indices, futuro in futuros:
+                    nombre = archivos[indices[0]][0]
+                    try:
+                        docs = futuro.result()
+                    except Exception as e:
+                        avisar(indices, ETAPA_ERROR, error=str(e))
+                        docs = None
+                    if not docs:
+                        fallidos.append(nombre)
+                        continue
+                    # Marcar el inicio de cada archivo dentro del conjunto
+                    docs[0].page_content = f"===== ARCHIVO: {nombre} =====\n{docs[0].page_content}"
+                    docs_conjunto.extend(docs)
+                # hash_lote incluye todos los archivos: un resumen parcial no
+                # puede guardarse con él, o la caché lo devolvería como completo
+                if fallidos:
+                    raise ValueError(f"No se pudo extraer texto de: {', '.join(fallidos)}")
+                analizar([None], conjunto, hash_lote, docs_conjunto, duraciones_conjunto)
+
+            pool_llm.submit(con_errores, [None], analizar_conjunto)
+            pendientes = {None}
+        else:
+            pendientes = set(range(len(archivos)))
+            for hash_pdf, indices in grupos.items():
+                existente = None if forzar else buscar_por_hash(hash_pdf)
+                if existente:
+                    avisar(indices, ETAPA_CACHE,
+                           resultado=_resultado(None, existente["resumen"], existente.get("tablas_tecnicas")))
+                    continue
+                avisar(indices, ETAPA_EN_COLA)
+                pool_extraccion.submit(con_errores, indices, extraer_y_encolar, indices, hash_pdf)
+
+        while pendientes:
+            evento = eventos.get()
+            if evento["etapa"] in ETAPAS_FINALES:
+                pendientes.discard(evento["indice"])
+            yield evento
+    finally:
+        pool_extraccion.shutdown(wait=False, cancel_futures=True)
+        pool_llm.shutdown(wait=False)
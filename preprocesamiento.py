@@ -0,0 +1,189 @@
+"""
+preprocesamiento.py - Limpieza del texto extraído antes de enviarlo al LLM
+
+Los pliegos repiten en cada página el mismo encabezado, pie, numeración y
+avisos legales. Esta etapa detecta esas líneas comparando los bordes de las
+páginas de cada archivo, las elimina y compacta espacios e índices con
+puntos guía, midiendo los tokens antes y después con el tokenizador del
+modelo. El cuerpo técnico de las páginas no se toca.
+
+Uso para medir un conjunto de PDFs:
+    python preprocesamiento.py pliego1.pdf pliego2.pdf
+"""
+
+import re
+from collections import Counter, defaultdict
+
+from langchain_core.documents import Document
+
+from utils import contar_tokens
+
+# Líneas (como máximo) al inicio y al final de cada página donde se buscan encabezados y pies
+LINEAS_BORDE = 4
+# Fracción mínima de páginas en las que debe repetirse una línea de borde
+FRACCION_REPETICION = 0.5
+# Con menos páginas no se puede distinguir un encabezado de un dato
+MIN_PAGINAS_REPETICION = 3
+
+# "Página 3 de 40", "Pág. 7", "12/40"
+_PATRON_NUMERO_PAGINA = re.compile(
+    r"^\W*(p[áa]g(ina)?\.?\s*\d+(\s*(de|/|of)\s*\d+)?|\d+\s*(de|/|of)\s*\d+)\W*$", re.IGNORECASE
+)
+# "12", "- 12 -": solo se quita si coincide con el número de la página
+_PATRON_NUMERO_SUELTO = re.compile(r"^\W*(\d+)\W*$")
+# Puntos guía de índices: "3.2 Pintura ........ 14"
+_PATRON_PUNTOS_GUIA = re.compile(r"(?:\s*\.){4,}\s*|(?:\s*…){2,}\s*")
+_PATRON_ESPACIOS = re.compile(r"[ \t\u00a0]+")
+_PATRON_LINEAS_VACIAS = re.compile(r"\n{3,}")
+_PATRON_DIGITOS = re.compile(r"\d+")
+_PATRON_LETRAS = re.compile(r"[^\W\d_]")
+
+
+def _numero_pagina(doc):
+    """Número de página (1-indexado) según la metadata del loader"""
+    return doc.metadata.get("page", -1) + 1
+
+
+def _claves_linea(linea, numero_pagina):
+    """
+    Claves de comparación de una línea: sin mayúsculas ni espacios repetidos
+    y con cada aparición del número de la propia página reemplazada por "#"
+    ("Pliego X - Hoja 7" ≡ "Pliego X - Hoja 8"). El resto de los números se
+    conserva para no confundir filas de tablas con encabezados.
+    """
+    linea = _PATRON_ESPACIOS.sub(" ", linea).strip().lower()
+    claves = {linea}
+    for m in _PATRON_DIGITOS.finditer(linea):
+        if int(m.group()) == numero_pagina:
+            claves.add(linea[:m.start()] + "#" + linea[m.end():])
+    return claves
+
+
+def _lineas_borde(lineas):
+    """Índices de las líneas no vacías que forman el encabezado y el pie de una página"""
+    no_vacias = [i for i, linea in enumerate(lineas) if linea.strip()]
+    # En páginas cortas el borde se reduce para no alcanzar al cuerpo
+    n = min(LINEAS_BORDE, max(1, len(no_vacias) // 4))
+    return set(no_vacias[:n] + no_vacias[-n:])
+
+
+def detectar_lineas_repetidas(docs):
+    """
+    Detecta encabezados y pies: líneas de borde que se repiten (salvo el
+    número de página) en al menos FRACCION_REPETICION de las páginas de un archivo.
+
+    Args:
+        docs: Lista de objetos Document (una página cada uno)
+
+    Returns:
+        dict: source -> set de claves de línea (ver _claves_linea) a eliminar
+    """
+    por_archivo = defaultdict(list)
+    for doc in docs:
+        por_archivo[doc.metadata.get("source")].append(doc)
+
+    repetidas = {}
+    for fuente, paginas in por_archivo.items():
+        if len(paginas) < MIN_PAGINAS_REPETICION:
+            repetidas[fuente] = set()
+            continue
+        apariciones = Counter()
+        for doc in paginas:
+            lineas = doc.page_content.splitlines()
+            numero_pagina = _numero_pagina(doc)
+            apariciones.update(set().union(*(_claves_linea(lineas[i], numero_pagina) for i in _lineas_borde(lineas))))
+        minimo = max(MIN_PAGINAS_REPETICION, FRACCION_REPETICION * len(paginas))
+        # Las líneas solo numéricas quedan a cargo de _es_numero_pagina
+        repetidas[fuente] = {
+            linea for linea, n in apariciones.items()
+            if n >= minimo and _PATRON_LETRAS.search(linea)
+        }
+    return repetidas
+
+
+def limpiar_texto(texto):
+    """Compacta puntos guía, espacios repetidos y saltos de línea sobrantes"""
+    lineas = []
+    for linea in texto.splitlines():
+        linea = _PATRON_PUNTOS_GUIA.sub(" ", linea)
+        lineas.append(_PATRON_ESPACIOS.sub(" ", linea).strip())
+    return _PATRON_LINEAS_VACIAS.sub("\n\n", "\n".join(lineas)).strip()
+
+
+def _es_numero_pagina(linea, numero_pagina):
+    """Reconoce la numeración de página sin confundirla con un valor técnico suelto"""
+    if _PATRON_NUMERO_PAGINA.match(linea):
+        return True
+    suelto = _PATRON_NUMERO_SUELTO.match(linea)
+    return bool(suelto) and int(suelto.group(1)) == numero_pagina
+
+
+def _limpiar_pagina(doc, repetidas):
+    """Quita de los bordes de la página los encabezados, pies y números de página"""
+    lineas = doc.page_content.splitlines()
+    borde = _lineas_borde(lineas)
+    numero_pagina = _numero_pagina(doc)
+    conservadas = [
+        linea for i, linea in enumerate(lineas)
+        if i not in borde or not (
+            not _claves_linea(linea, numero_pagina).isdisjoint(repetidas) or _es_numero_pagina(linea.strip(), numero_pagina)
+        )
+    ]
+    return limpiar_texto("\n".join(conservadas))
+
+
+def preprocesar_documento(docs, modelo=None):
+    """
+    Elimina encabezados, pies y numeración repetidos y compacta el texto
+    de cada página antes del resumen.
+
+    Args:
+        docs: Lista de objetos Document
+        modelo (str, optional): Modelo cuyo tokenizador se usa para medir
+
+    Returns:
+        tuple: (lista de Document limpios, dict con tokens_antes,
+        tokens_despues y lineas_repetidas)
+    """
+    repetidas = detectar_lineas_repetidas(docs)
+    limpios = [
+        Document(
+            page_content=_limpiar_pagina(doc, repetidas[doc.metadata.get("source")]),
+            metadata=dict(doc.metadata),
+        )
+        for doc in docs
+    ]
+
+    # Se mide página a página para no armar copias del texto completo
+    estadisticas = {
+        "tokens_antes": sum(contar_tokens(doc.page_content, modelo) for doc in docs),
+        "tokens_despues": sum(contar_tokens(doc.page_content, modelo) for doc in limpios),
+        "lineas_repetidas": sum(len(lineas) for lineas in repetidas.values()),
+    }
+    return limpios, estadisticas
+
+
+def porcentaje_reduccion(estadisticas):
+    """Reducción de tokens lograda, en porcentaje"""
+    if not estadisticas["tokens_antes"]:
+        return 0.0
+    return 100 * (1 - estadisticas["tokens_despues"] / estadisticas["tokens_antes"])
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    from utils import extract_text_from_pdf_bytes
+
+    total_antes = total_despues = 0
+    for ruta in sys.argv[1:]:
+        docs = extract_text_from_pdf_bytes(Path(ruta).read_bytes(), Path(ruta).name)
+        _, estadisticas = preprocesar_documento(docs)
+        total_antes += estadisticas["tokens_antes"]
+        total_despues += estadisticas["tokens_despues"]
+        print(f"🧹 {ruta}: {estadisticas['tokens_antes']} → {estadisticas['tokens_despues']} tokens "
+              f"(-{porcentaje_reduccion(estadisticas):.1f}%, {estadisticas['lineas_repetidas']} líneas repetidas)")
+    if total_antes:
+        print(f"📊 Total: {total_antes} → {total_despues} tokens "
+              f"(-{100 * (1 - total_despues / total_antes):.1f}%)")
@@ -1,48 +1,43 @@
-from langchain.prompts import PromptTemplate
+_ROL = "Eres un ingeniero electricista y mecánico especializado en el diseño y fabricación de transformadores para la empresa Magnetron S.A.S."
 
-def get_prompt_summary_str():
-    """
-    Prompt principal para generar el resumen ejecutivo SIN tablas.
-    Las tablas se generarán automáticamente en paralelo con otro prompt.
-    """
-    return PromptTemplate(
-        input_variables=["context", "question"],
-        template="""
-Eres un ingeniero electricista y mecánico especializado en el diseño y fabricación de transformadores para la empresa Magnetron S.A.S.
-
-Tu misión es analizar el siguiente Pliego de Condiciones Técnicas y elaborar un Resumen Ejecutivo exhaustivo en ESPAÑOL que sirva como base de arranque para ingeniería y producción.
-
-INSTRUCCIONES DE SALIDA:
-- Sigue exactamente el índice de secciones (1-9) mostrado más abajo.
-- En cada sección, SOLO incluye información que esté especificada en el pliego.
+# Reglas comunes al resumen completo y al resumen por secciones
+_REGLAS_RESUMEN = """- En cada sección, SOLO incluye información que esté especificada en el pliego.
 - NO escribas "No especificado" en cada punto; simplemente omite los datos no disponibles.
 - Incluye valores numéricos concretos con sus unidades.
 - Si existen varios clientes o variantes, diferéncialos claramente.
 - Mantén un tono técnico, preciso y conciso; no inventes datos.
 - Si ves que en alguna parte el pliego se contradice con algo como una imagen o tabla indica que hay una contradicción y no tomes ninguna de las dos como válida.
 - Si el pliego tiene imagenes o planos nombralas para que el diseñador las revise, descubrelas e indica que hay en ellas.
-- NO generes tablas en este resumen. Las tablas se crearán automáticamente por separado.
+- NO generes tablas en este resumen. Las tablas se crearán automáticamente por separado."""
 
-1. ESPECIFICACIONES GENERALES
-(Solo incluir los datos disponibles sobre):
+# Índice del Resumen Ejecutivo. Los términos de cada sección son las
+# consultas de la recuperación por secciones (ver recuperacion.py).
+SECCIONES_RESUMEN = {
+    1: {
+        "titulo": "1. ESPECIFICACIONES GENERALES",
+        "criterios": """(Solo incluir los datos disponibles sobre):
    - Tipo de transformador(es) requerido(s)
    - Capacidad(es) nominal(es) en kVA o MVA
    - Aplicación y entorno de instalación
    - Altitud, temperatura ambiente y condiciones especiales
-   - Condiciones de servicio
-
-2. PARÁMETROS ELÉCTRICOS
-(Solo incluir los datos disponibles sobre):
+   - Condiciones de servicio""",
+        "terminos": "tipo transformador potencia nominal kva mva aplicación instalación altitud msnm temperatura ambiente humedad servicio exterior interior subestación poste pedestal",
+    },
+    2: {
+        "titulo": "2. PARÁMETROS ELÉCTRICOS",
+        "criterios": """(Solo incluir los datos disponibles sobre):
    - Voltajes nominales (primario/secundario) y configuración
    - Frecuencia de operación
    - Grupo de conexión
    - Impedancia de cortocircuito (%)
    - Regulación de tensión (taps)
    - Nivel de pérdidas máximas permitidas. (si es doble voltaje cual de los voltages debe de cumplir estas)
-   - BIL (Nivel Básico de Aislamiento)
-
-3. CARACTERÍSTICAS CONSTRUCTIVAS Y MECÁNICAS
-(Discriminar por cliente si aplica; solo incluir datos disponibles):
+   - BIL (Nivel Básico de Aislamiento)""",
+        "terminos": "tensión voltaje kv primario secundario frecuencia hz grupo conexión vectorial impedancia cortocircuito taps derivaciones regulación pérdidas carga vacío bil aislamiento nivel básico impulso",
+    },
+    3: {
+        "titulo": "3. CARACTERÍSTICAS CONSTRUCTIVAS Y MECÁNICAS",
+        "criterios": """(Discriminar por cliente si aplica; solo incluir datos disponibles):
    - Tipo de refrigeración (si es con aceite vegetal colocar KNAN)
    - Materiales de bobinados
    - Forma constructiva de la parte activa
@@ -53,19 +48,23 @@ INSTRUCCIONES DE SALIDA:
    - Sistemas de sellado
    - Requisitos sísmicos
    - Dimensiones y peso límites
-   - Radiadores y sistemas de enfriamiento
-
-4. SISTEMA DE PINTURA Y TRATAMIENTO SUPERFICIAL
-(Solo incluir datos disponibles):
+   - Radiadores y sistemas de enfriamiento""",
+        "terminos": "refrigeración onan knan bobinado devanado cobre aluminio núcleo acero silicio aislamiento aceite fluido dieléctrico vegetal mineral tanque sellado hermético sísmico dimensiones peso radiadores",
+    },
+    4: {
+        "titulo": "4. SISTEMA DE PINTURA Y TRATAMIENTO SUPERFICIAL",
+        "criterios": """(Solo incluir datos disponibles):
    - Preparación superficial requerida
    - Tipo de pintura base y acabado
    - Espesor mínimo de película seca
    - Color RAL especificado
    - Requisitos de resistencia a corrosión
-   - Tratamientos especiales
-
-5. ACCESORIOS Y COMPONENTES
-(Mencionar marcas específicas o restricciones; solo incluir datos disponibles):
+   - Tratamientos especiales""",
+        "terminos": "pintura recubrimiento preparación superficie granallado limpieza imprimante anticorrosivo epóxico poliuretano acabado espesor micras película seca ral color corrosión galvanizado",
+    },
+    5: {
+        "titulo": "5. ACCESORIOS Y COMPONENTES",
+        "criterios": """(Mencionar marcas específicas o restricciones; solo incluir datos disponibles):
    - Equipamiento de protección
    - Cambiadores de tensión o conmutadores
    - Aisladores de alta tensión (Dependiendiendo del amperaje)
@@ -74,73 +73,137 @@ INSTRUCCIONES DE SALIDA:
    - Gabinetes/cajas de conexión
    - Accesorios especiales
    - Válvulas y dispositivos de alivio
-   - Sistemas de puesta a tierra
-
-6. NORMATIVA Y CERTIFICACIONES
-(Listar SOLO las normas mencionadas explícitamente):
+   - Sistemas de puesta a tierra""",
+        "terminos": "accesorios protección relé buchholz conmutador cambiador aisladores bujes boquillas terminales monitoreo termómetro indicador nivel válvula alivio presión gabinete caja conexión puesta tierra pararrayos",
+    },
+    6: {
+        "titulo": "6. NORMATIVA Y CERTIFICACIONES",
+        "criterios": """(Listar SOLO las normas mencionadas explícitamente):
    - Estándares aplicables con número y título completo
    - Tipo de norma (diseño, fabricación, ensayo, producto)
    - Pruebas y ensayos requeridos
    - Certificaciones exigidas
    - Requisitos sísmicos específicos
-   - Normativa para materiales específicos
-
-7. IDENTIFICACIÓN, ROTULADO Y DOCUMENTACIÓN
-(Solo incluir datos disponibles):
+   - Normativa para materiales específicos""",
+        "terminos": "norma normas ntc iec ieee ansi astm iso icontec retie certificación certificado ensayos pruebas rutina tipo especiales protocolo laboratorio",
+    },
+    7: {
+        "titulo": "7. IDENTIFICACIÓN, ROTULADO Y DOCUMENTACIÓN",
+        "criterios": """(Solo incluir datos disponibles):
    - Requisitos de placas de características. (cantidad y cuando estas son abligatorias)
    - Etiquetado y marcación especial
    - Documentación técnica requerida
    - Planos y manuales solicitados
-   - Idioma para documentación
-
-8. EMBALAJE Y TRANSPORTE
-(Solo incluir datos disponibles):
+   - Idioma para documentación""",
+        "terminos": "placa características rotulado marcación etiqueta identificación documentación planos manuales catálogos idioma español",
+    },
+    8: {
+        "titulo": "8. EMBALAJE Y TRANSPORTE",
+        "criterios": """(Solo incluir datos disponibles):
    - Tipo de embalaje requerido
    - Materiales específicos
    - Requisitos de preservación
    - Condiciones de transporte
    - Documentación para exportación
-   - Preparación para manejo
-
-9. ENTREGABLES DE LA OFERTA
-(Solo incluir datos disponibles):
+   - Preparación para manejo""",
+        "terminos": "embalaje empaque transporte guacal estiba madera preservación exportación izaje manejo almacenamiento despacho",
+    },
+    9: {
+        "titulo": "9. ENTREGABLES DE LA OFERTA",
+        "criterios": """(Solo incluir datos disponibles):
    - Planos requeridos
    - Pruebas específicas
-   - Declaración de pérdidas
+   - Declaración de pérdidas""",
+        "terminos": "oferta propuesta entregables planos pruebas declaración pérdidas garantizadas garantía documentos presentar formulario cronograma",
+    },
+}
+
+
+def _prompt_template(**kwargs):
+    """
+    PromptTemplate de LangChain. El paquete se importa con el primer prompt
+    y no al importar este módulo (la app lo carga antes de la bienvenida).
+    """
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate(**kwargs)
+
+
+def _texto_seccion(numero):
+    """Título y criterios de una sección tal como aparecen en el prompt"""
+    seccion = SECCIONES_RESUMEN[numero]
+    return f"{seccion['titulo']}\n{seccion['criterios']}"
+
+
+def get_prompt_summary_str():
+    """
+    Prompt principal para generar el resumen ejecutivo SIN tablas.
+    Las tablas se generarán automáticamente en paralelo con otro prompt.
+    """
+    secciones = "\n\n".join(_texto_seccion(numero) for numero in SECCIONES_RESUMEN)
+    return _prompt_template(
+        input_variables=["context", "question"],
+        template=f"""
+{_ROL}
+
+Tu misión es analizar el siguiente Pliego de Condiciones Técnicas y elaborar un Resumen Ejecutivo exhaustivo en ESPAÑOL que sirva como base de arranque para ingeniería y producción.
+
+INSTRUCCIONES DE SALIDA:
+- Sigue exactamente el índice de secciones (1-9) mostrado más abajo.
+{_REGLAS_RESUMEN}
+
+{secciones}
 
 Documento del Cliente (Pliego): 
-{context}
+{{context}}
 
 Pregunta adicional (si aplica): 
-{question}
+{{question}}
 
 Resumen profesional (en ESPAÑOL):
 """
     )
 
 
-def get_prompt_table_generator():
+def get_prompt_seccion(numero):
     """
-    Prompt especializado para generar las dos tablas técnicas en formato vertical.
-    Se ejecuta automáticamente después del resumen.
+    Prompt para redactar una sola sección (1-9) del resumen ejecutivo a partir
+    de los fragmentos del pliego recuperados para ella. Las secciones se
+    piden en paralelo y se unen en orden (ver recuperacion.py).
     """
-    return PromptTemplate(
-        input_variables=["resumen"],
-        template="""
-Eres un ingeniero especializado en documentación técnica para transformadores de Magnetron S.A.S.
+    titulo = SECCIONES_RESUMEN[numero]["titulo"]
+    return _prompt_template(
+        input_variables=["context", "question"],
+        template=f"""
+{_ROL}
 
-Tu tarea es tomar el siguiente RESUMEN EJECUTIVO y generar EXACTAMENTE DOS TABLAS en formato vertical (Markdown) que puedan copiarse directamente a Excel.
+Tu misión es redactar UNA sección del Resumen Ejecutivo en ESPAÑOL de un Pliego de Condiciones Técnicas. Recibirás solo los fragmentos del pliego más relacionados con esa sección, cada uno con su número de página.
 
-IMPORTANTE: 
-- Genera SOLO las tablas, sin texto adicional antes o después.
-- Usa el formato Markdown estricto: | Campo | Valor |
-- Si algún dato no está disponible en el resumen, coloca "N/A"
-- NO inventes información que no esté en el resumen.
+INSTRUCCIONES DE SALIDA:
+- Comienza con el título exacto "{titulo}" y no escribas ninguna otra sección.
+{_REGLAS_RESUMEN}
+- Si los fragmentos no contienen datos para esta sección, escribe el título y debajo "Sin información en los fragmentos analizados."
+
+{_texto_seccion(numero)}
+
+Fragmentos del Pliego: 
+{{context}}
+
+Pregunta adicional (si aplica): 
+{{question}}
+
+Sección del resumen (en ESPAÑOL):
+"""
+    )
 
----
-**Tabla #1 – Parámetros Eléctricos (FORMATO VERTICAL)**
 
-| Campo | Valor |
+# Títulos de las tablas técnicas (también los usa table_generator)
+TITULOS_TABLAS = {
+    1: "**Tabla #1 – Parámetros Eléctricos (FORMATO VERTICAL)**",
+    2: "**Tabla #2 – Accesorios (FORMATO VERTICAL)**",
+}
+
+_CUERPOS_TABLAS = {
+    1: """| Campo | Valor |
 |-------|-------|
 | Compañía | Magnetron S.A.S. |
 | Especificaciones del cliente | [Nombre del pliego y código] |
@@ -160,11 +223,8 @@ IMPORTANTE:
 | Pérdidas sin carga (W) | [Según pliego o N/A] |
 | Impedancia (%) | [Según pliego] |
 | Corriente de excitación (%) | [Según pliego] |
-
----
-**Tabla #2 – Accesorios (FORMATO VERTICAL)**
-
-| Accesorio | Características |
+""",
+    2: """| Accesorio | Características |
 |-----------|-----------------|
 | Terminal de baja tensión | [Según pliego o N/A] |
 | Terminal de alta tensión | [Según pliego o N/A] |
@@ -177,12 +237,63 @@ IMPORTANTE:
 | Medidor de presión y/o vacío | [Según pliego o N/A] |
 | Válvulas | [Según pliego o N/A] |
 | Otros accesorios | [Listar o N/A] |
+""",
+}
+
+
+def _plantilla_tablas(numeros, cantidad, cierre):
+    """Arma el prompt de tablas con las tablas indicadas (en orden)"""
+    tablas = "\n---\n".join(
+        f"{TITULOS_TABLAS[numero]}\n\n{_CUERPOS_TABLAS[numero]}" for numero in numeros
+    )
+    return f"""
+Eres un ingeniero especializado en documentación técnica para transformadores de Magnetron S.A.S.
 
+Tu tarea es tomar el siguiente RESUMEN EJECUTIVO y generar {cantidad} en formato vertical (Markdown) que puedan copiarse directamente a Excel.
+
+IMPORTANTE: 
+- Genera SOLO las tablas, sin texto adicional antes o después.
+- Usa el formato Markdown estricto: | Campo | Valor |
+- Si algún dato no está disponible en el resumen, coloca "N/A"
+- NO inventes información que no esté en el resumen.
+
+---
+{tablas}
 ========================================
 RESUMEN EJECUTIVO:
-{resumen}
+{{resumen}}
 
 ========================================
-GENERA LAS DOS TABLAS COMPLETAS EN FORMATO MARKDOWN:
+{cierre}
 """
+
+
+def get_prompt_table_generator():
+    """
+    Prompt especializado para generar las dos tablas técnicas en formato vertical.
+    Se ejecuta automáticamente después del resumen.
+    """
+    return _prompt_template(
+        input_variables=["resumen"],
+        template=_plantilla_tablas(
+            (1, 2),
+            "EXACTAMENTE DOS TABLAS",
+            "GENERA LAS DOS TABLAS COMPLETAS EN FORMATO MARKDOWN:",
+        )
+    )
+
+
+def get_prompt_tabla_individual(numero_tabla):
+    """
+    Prompt para generar una sola de las tablas técnicas (1 = Parámetros
+    Eléctricos, 2 = Accesorios), derivado de get_prompt_table_generator.
+    Permite pedir ambas tablas al LLM de forma concurrente.
+    """
+    return _prompt_template(
+        input_variables=["resumen"],
+        template=_plantilla_tablas(
+            (numero_tabla,),
+            "EXACTAMENTE UNA TABLA",
+            "GENERA LA TABLA COMPLETA EN FORMATO MARKDOWN:",
+        )
     )
@@ -0,0 +1,180 @@
+"""
+recuperacion.py - Resumen por secciones con recuperación léxica local
+
+En lugar de enviar el pliego completo en una sola llamada, el texto se
+divide en trozos, se indexa con BM25 (sin red ni dependencias) y cada una
+de las 9 secciones del resumen se redacta en paralelo solo con los trozos
+más relacionados con sus términos de búsqueda (promots.SECCIONES_RESUMEN).
+Las secciones se unen en orden.
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from promots import SECCIONES_RESUMEN, get_prompt_seccion, get_prompt_summary_str
+from preprocesamiento import preprocesar_documento
+from utils import (
+    _avisar,
+    _formatear_prompt,
+    _nombre_modelo,
+    _texto_con_paginas,
+    _texto_respuesta,
+    contar_tokens,
+    resumen_documento_stream,
+    NIVEL_INFO
+)
+
+# Tamaño aproximado de cada trozo indexado (≈ 500 tokens)
+CARACTERES_POR_TROZO = 2000
+# Trozos que recibe cada sección
+TOP_K_SECCIONES = 8
+
+# Parámetros de BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_STOPWORDS = frozenset("""
+a al con de del el en es la las lo los o para por que se su sus un una y e u ni
+como este esta estos estas ese esa dicho dicha sera seran debe deberan debera
+""".split())
+_PATRON_TERMINO = re.compile(r"[a-z0-9]+")
+
+
+def terminos(texto):
+    """Términos indexables: minúsculas, sin tildes y sin palabras vacías"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in _PATRON_TERMINO.findall(texto) if t not in _STOPWORDS]
+
+
+class IndiceBM25:
+    """
+    Índice BM25 en memoria sobre una lista de textos.
+
+    Args:
+        textos (list): Textos a indexar; los resultados son sus posiciones
+    """
+
+    def __init__(self, textos, k1=BM25_K1, b=BM25_B):
+        self._k1 = k1
+        self._b = b
+        self._frecuencias = [Counter(terminos(texto)) for texto in textos]
+        self._longitudes = [sum(frecuencias.values()) for frecuencias in self._frecuencias]
+        self._longitud_media = (sum(self._longitudes) / len(self._longitudes)) if textos else 0
+
+        documentos_con_termino = Counter()
+        for frecuencias in self._frecuencias:
+            documentos_con_termino.update(frecuencias.keys())
+        total = len(textos)
+        self._idf = {
+            termino: math.log(1 + (total - n + 0.5) / (n + 0.5))
+            for termino, n in documentos_con_termino.items()
+        }
+
+    def puntuar(self, consulta):
+        """Puntaje BM25 de cada texto indexado para la consulta"""
+        consulta = set(terminos(consulta))
+        puntajes = []
+        for frecuencias, longitud in zip(self._frecuencias, self._longitudes):
+            normalizacion = self._k1 * (1 - self._b + self._b * longitud / (self._longitud_media or 1))
+            puntaje = 0.0
+            for termino in consulta:
+                tf = frecuencias.get(termino)
+                if tf:
+                    puntaje += self._idf[termino] * tf * (self._k1 + 1) / (tf + normalizacion)
+            puntajes.append(puntaje)
+        return puntajes
+
+    def buscar(self, consulta, k):
+        """
+        Posiciones de los k textos más relevantes (con puntaje mayor que cero),
+        de mayor a menor puntaje.
+        """
+        puntajes = self.puntuar(consulta)
+        mejores = sorted(range(len(puntajes)), key=lambda i: puntajes[i], reverse=True)[:k]
+        return [i for i in mejores if puntajes[i] > 0]
+
+
+def trocear_documento(docs, max_caracteres=CARACTERES_POR_TROZO):
+    """
+    Divide las páginas en trozos de líneas consecutivas de hasta
+    `max_caracteres`, conservando la metadata (y el número) de la página.
+
+    Returns:
+        list: Objetos Document, en orden de documento
+    """
+    trozos = []
+    for doc in docs:
+        actual = []
+        largo = 0
+        for linea in doc.page_content.splitlines():
+            if actual and largo + len(linea) > max_caracteres:
+                trozos.append(Document(page_content="\n".join(actual), metadata=dict(doc.metadata)))
+                actual = []
+                largo = 0
+            actual.append(linea)
+            largo += len(linea) + 1
+        if actual and "".join(actual).strip():
+            trozos.append(Document(page_content="\n".join(actual), metadata=dict(doc.metadata)))
+    return trozos
+
+
+def resumen_por_secciones(docs, llm_instance, top_k=None, pregunta="", progreso=None, lanzar_errores=False):
+    """
+    Genera el resumen ejecutivo redactando las 9 secciones en paralelo, cada
+    una con los `top_k` trozos del pliego que mejor responden a sus términos.
+    La primera sección se transmite token a token mientras las demás se
+    generan; el resto se entrega en orden a medida que están listas.
+    Si el documento entero cabe en `top_k` trozos se usa una sola llamada.
+
+    Args:
+        docs: Lista de objetos Document
+        llm_instance: Instancia del modelo LLM
+        top_k (int, optional): Trozos por sección
+        pregunta (str): Pregunta adicional para el prompt
+        progreso: Callback progreso(nivel, mensaje, avance) (opcional)
+        lanzar_errores (bool): Ver utils.resumen_documento_stream
+
+    Yields:
+        str: Fragmentos de texto del resumen, sección por sección
+    """
+    top_k = top_k or TOP_K_SECCIONES
+    modelo = _nombre_modelo(llm_instance)
+
+    limpios, _ = preprocesar_documento(docs, modelo)
+    trozos = trocear_documento(limpios)
+    if len(trozos) <= top_k:
+        yield from resumen_documento_stream(docs, llm_instance, get_prompt_summary_str(), progreso=progreso,
+                                            lanzar_errores=lanzar_errores)
+        return
+
+    indice = IndiceBM25([trozo.page_content for trozo in trozos])
+    prompts = []
+    for numero, seccion in SECCIONES_RESUMEN.items():
+        # Los trozos elegidos se presentan en el orden del documento
+        elegidos = sorted(indice.buscar(seccion["terminos"], top_k))
+        contexto = _texto_con_paginas([trozos[i] for i in elegidos]) if elegidos else ""
+        prompts.append(_formatear_prompt(get_prompt_seccion(numero), contexto, pregunta))
+
+    tokens_secciones = [contar_tokens(prompt, modelo) for prompt in prompts]
+    _avisar(
+        progreso, NIVEL_INFO,
+        f"🎯 Resumen por secciones: {len(trozos)} trozos indexados, {len(prompts)} llamadas en paralelo "
+        f"de ~{max(tokens_secciones)} tokens como máximo"
+    )
+
+    with ThreadPoolExecutor(max_workers=len(prompts) - 1, thread_name_prefix="seccion") as pool:
+        futuros = [pool.submit(llm_instance.invoke, prompt) for prompt in prompts[1:]]
+
+        for chunk in llm_instance.stream(prompts[0]):
+            texto = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if texto:
+                yield texto
+
+        for futuro in futuros:
+            yield "\n\n" + _texto_respuesta(futuro.result())
@@ -0,0 +1,194 @@
+"""
+specbot.py - Procesamiento por lotes sin interfaz
+
+Analiza todos los PDFs de una carpeta con el mismo pipeline que la interfaz
+(caché por contenido, guardado en el historial) y escribe un registro JSONL
+por archivo. Si se interrumpe, al volver a ejecutarlo con la misma salida
+retoma desde los archivos que faltan.
+
+Uso:
+    python -m specbot batch <carpeta> [--salida analisis.jsonl] [--analisis 3]
+"""
+
+import sys
+import json
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from corelogic import get_llm, get_config
+from promots import get_prompt_summary_str
+from database_supabase import init_database
+from pipeline import (
+    procesar_lote,
+    MAX_EXTRACCIONES_SIMULTANEAS,
+    MAX_ANALISIS_SIMULTANEOS,
+    ETAPAS_FINALES,
+    ETAPA_LISTO,
+    ETAPA_CACHE,
+    ETAPA_ERROR
+)
+from utils import NIVEL_AVANCE, MODO_COMPLETO
+
+SALIDA_POR_DEFECTO = "analisis.jsonl"
+
+
+def buscar_pdfs(carpeta, recursivo=False):
+    """
+    Lista los PDFs de una carpeta en orden estable.
+
+    Returns:
+        list: Tuplas (nombre relativo a la carpeta, ruta)
+    """
+    carpeta = Path(carpeta)
+    patron = "**/*" if recursivo else "*"
+    rutas = sorted(
+        ruta for ruta in carpeta.glob(patron)
+        if ruta.is_file() and ruta.suffix.lower() == ".pdf"
+    )
+    return [(ruta.relative_to(carpeta).as_posix(), ruta) for ruta in rutas]
+
+
+def leer_completados(salida):
+    """
+    Archivos que ya tienen un análisis terminado en el JSONL de salida.
+    Los registros con error no cuentan, así se reintentan al reanudar.
+    """
+    completados = set()
+    if not salida.exists():
+        return completados
+    with salida.open(encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                # Línea cortada por una interrupción a mitad de escritura
+                continue
+            if registro.get("estado") in (ETAPA_LISTO, ETAPA_CACHE):
+                completados.add(registro["archivo"])
+    return completados
+
+
+def _imprimir_aviso(detalle):
+    """Callback de progreso para consola; el avance del OCR solo con --detalle"""
+    def progreso(nivel, mensaje, avance=None):
+        if nivel != NIVEL_AVANCE or detalle:
+            print(f"   {mensaje}")
+    return progreso
+
+
+def procesar_carpeta(carpeta, salida, usuario="batch", recursivo=False, forzar=False,
+                     max_extracciones=None, max_analisis=None, max_tokens=None, detalle=False):
+    """
+    Analiza los PDFs pendientes de una carpeta y agrega sus resultados al JSONL.
+
+    Args:
+        carpeta (str): Carpeta con los PDFs
+        salida (str): Archivo JSONL de resultados (se agrega, no se sobrescribe)
+        usuario (str): Usuario con el que se guardan los análisis
+        recursivo (bool): Incluir subcarpetas
+        forzar (bool): Ignorar la caché y regenerar los análisis
+        max_extracciones (int, optional): Extracciones/OCR simultáneos
+        max_analisis (int, optional): Análisis con el LLM simultáneos
+        max_tokens (int, optional): Presupuesto de tokens por documento
+        detalle (bool): Mostrar el avance página a página del OCR
+
+    Returns:
+        dict: Conteo de archivos por estado final ("listo", "cache", "error")
+        y "omitidos" (ya presentes en la salida)
+    """
+    salida = Path(salida)
+    archivos = buscar_pdfs(carpeta, recursivo)
+    completados = leer_completados(salida)
+    pendientes = [(nombre, ruta) for nombre, ruta in archivos if nombre not in completados]
+
+    conteo = {ETAPA_LISTO: 0, ETAPA_CACHE: 0, ETAPA_ERROR: 0, "omitidos": len(archivos) - len(pendientes)}
+    print(f"📂 {len(archivos)} PDFs en '{carpeta}': {conteo['omitidos']} ya analizados, {len(pendientes)} pendientes")
+    if not pendientes:
+        return conteo
+
+    init_database()
+    terminados = 0
+    with salida.open("a", encoding="utf-8") as f:
+        for evento in procesar_lote(
+            pendientes,
+            get_llm(),
+            get_prompt_summary_str(),
+            usuario,
+            max_tokens=max_tokens or get_config("max_tokens_documento"),
+            forzar=forzar,
+            max_extracciones=max_extracciones,
+            max_analisis=max_analisis,
+            progreso=_imprimir_aviso(detalle),
+            modo=get_config("modo_resumen", MODO_COMPLETO),
+        ):
+            if evento["etapa"] not in ETAPAS_FINALES:
+                continue
+
+            terminados += 1
+            conteo[evento["etapa"]] += 1
+            resultado = evento["resultado"] or {}
+            registro = {
+                "archivo": evento["nombre"],
+                "estado": evento["etapa"],
+                "resumen": resultado.get("resumen"),
+                "tablas": resultado.get("tablas"),
+                "error": evento["error"],
+                "fecha_hora": datetime.now().isoformat(timespec="seconds"),
+            }
+            # Una línea completa por archivo: lo escrito sobrevive a una interrupción
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+
+            icono = "❌" if evento["etapa"] == ETAPA_ERROR else "✅"
+            print(f"{icono} [{terminados}/{len(pendientes)}] {evento['nombre']} — {evento['etapa']}"
+                  + (f": {evento['error']}" if evento["error"] else ""))
+    return conteo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="specbot", description="Análisis de pliegos técnicos sin interfaz")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    batch = comandos.add_parser("batch", help="Analizar todos los PDFs de una carpeta")
+    batch.add_argument("carpeta", help="Carpeta con los PDFs")
+    batch.add_argument("--salida", default=SALIDA_POR_DEFECTO,
+                       help=f"Archivo JSONL de resultados (por defecto {SALIDA_POR_DEFECTO})")
+    batch.add_argument("--usuario", default="batch", help="Usuario con el que se guardan los análisis")
+    batch.add_argument("--recursivo", action="store_true", help="Incluir subcarpetas")
+    batch.add_argument("--forzar", action="store_true", help="Ignorar la caché y regenerar los análisis")
+    batch.add_argument("--extracciones", type=int, default=MAX_EXTRACCIONES_SIMULTANEAS,
+                       help="Extracciones/OCR simultáneos")
+    batch.add_argument("--analisis", type=int, default=MAX_ANALISIS_SIMULTANEOS,
+                       help="Análisis con el LLM simultáneos")
+    batch.add_argument("--max-tokens", type=int, help="Presupuesto de tokens por documento")
+    batch.add_argument("--detalle", action="store_true", help="Mostrar el avance del OCR página a página")
+
+    args = parser.parse_args(argv)
+
+    if not Path(args.carpeta).is_dir():
+        parser.error(f"'{args.carpeta}' no es una carpeta")
+
+    try:
+        conteo = procesar_carpeta(
+            args.carpeta,
+            args.salida,
+            usuario=args.usuario,
+            recursivo=args.recursivo,
+            forzar=args.forzar,
+            max_extracciones=args.extracciones,
+            max_analisis=args.analisis,
+            max_tokens=args.max_tokens,
+            detalle=args.detalle,
+        )
+    except KeyboardInterrupt:
+        print(f"\n⏹️ Interrumpido. Vuelve a ejecutar con --salida {args.salida} para continuar.")
+        return 130
+
+    print(f"📊 Nuevos: {conteo[ETAPA_LISTO]}, desde caché: {conteo[ETAPA_CACHE]}, "
+          f"con error: {conteo[ETAPA_ERROR]}, omitidos: {conteo['omitidos']}")
+    return 1 if conteo[ETAPA_ERROR] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,49 +1,172 @@
 """
 table_generator.py - Módulo para generación automática de tablas técnicas
 
-Genera las dos tablas (Parámetros Eléctricos y Accesorios) en paralelo
-basándose en el resumen ejecutivo generado.
+Genera las dos tablas (Parámetros Eléctricos y Accesorios) en paralelo,
+con una solicitud al LLM por tabla, basándose en el resumen ejecutivo generado.
 """
 
-from promots import get_prompt_table_generator
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from promots import get_prompt_tabla_individual, TITULOS_TABLAS
+from metricas import span
 
-def generar_tablas_desde_resumen(resumen_texto, llm_instance):
+
+def _completar_tabla(numero_tabla, tabla):
+    """Asegura que la tabla empiece con su título (extraer_tabla_individual lo usa)"""
+    tabla = tabla.strip()
+    if f"Tabla #{numero_tabla}" not in tabla:
+        tabla = f"{TITULOS_TABLAS[numero_tabla]}\n\n{tabla}"
+    return tabla
+
+
+def unir_tablas(tablas):
+    """
+    Une las tablas individuales en el formato de salida conjunto.
+    
+    Args:
+        tablas (dict): {numero_tabla: texto de la tabla}
+    
+    Returns:
+        str: Tabla #1, separador, Tabla #2
+    """
+    return "\n\n---\n\n".join(
+        _completar_tabla(numero, tablas[numero]) for numero in sorted(tablas)
+    )
+
+
+def _generar_tabla(numero_tabla, resumen_texto, llm_instance):
+    """
+    Genera una sola tabla técnica con su propio prompt.
+    
+    Args:
+        numero_tabla (int): 1 (Parámetros Eléctricos) o 2 (Accesorios)
+        resumen_texto (str): El texto completo del resumen ejecutivo
+        llm_instance: Instancia del modelo LLM
+    
+    Returns:
+        str: La tabla en formato Markdown, encabezada por "Tabla #N"
+    """
+    prompt_formateado = get_prompt_tabla_individual(numero_tabla).format(resumen=resumen_texto)
+    with span("tabla_llm", tabla=numero_tabla):
+        respuesta = llm_instance.invoke(prompt_formateado)
+    
+    # Extraer el contenido de la respuesta
+    if hasattr(respuesta, 'content'):
+        tabla = respuesta.content
+    else:
+        tabla = str(respuesta)
+    
+    return _completar_tabla(numero_tabla, tabla)
+
+
+def generar_tablas_desde_resumen(resumen_texto, llm_instance, al_completar_tabla=None, lanzar_errores=False):
     """
     Genera las dos tablas técnicas a partir del resumen ejecutivo.
+    Cada tabla se pide al LLM en una solicitud independiente y ambas
+    se ejecutan de forma concurrente.
     
     Args:
         resumen_texto (str): El texto completo del resumen ejecutivo generado
         llm_instance: Instancia del modelo LLM (OpenAI o Gemini)
+        al_completar_tabla (callable, optional): Función (numero_tabla, tabla)
+            que se llama en el hilo del llamador en cuanto cada tabla termina
+        lanzar_errores (bool): Propagar el error en lugar de devolver un texto
+            de aviso, para que un análisis fallido no se guarde ni se cachee
     
     Returns:
         str: Las dos tablas en formato Markdown listas para mostrar/exportar
     """
     try:
-        # Obtener el prompt especializado para tablas
-        prompt_tablas = get_prompt_table_generator()
-        
-        # Formatear el prompt con el resumen
-        prompt_formateado = prompt_tablas.format(resumen=resumen_texto)
-        
-        # Invocar el LLM para generar las tablas
         print("🔧 Generando tablas técnicas en paralelo...")
-        respuesta = llm_instance.invoke(prompt_formateado)
+        tablas = {}
         
-        # Extraer el contenido de la respuesta
-        if hasattr(respuesta, 'content'):
-            tablas_generadas = respuesta.content
-        else:
-            tablas_generadas = str(respuesta)
+        with span("tablas_llm"), ThreadPoolExecutor(max_workers=len(TITULOS_TABLAS)) as pool:
+            futuros = {
+                pool.submit(_generar_tabla, numero_tabla, resumen_texto, llm_instance): numero_tabla
+                for numero_tabla in TITULOS_TABLAS
+            }
+            for futuro in as_completed(futuros):
+                numero_tabla = futuros[futuro]
+                tablas[numero_tabla] = futuro.result()
+                print(f"✅ Tabla #{numero_tabla} generada")
+                if al_completar_tabla:
+                    al_completar_tabla(numero_tabla, tablas[numero_tabla])
+        
+        # Mismo formato que la generación conjunta: Tabla #1, separador, Tabla #2
+        tablas_generadas = unir_tablas(tablas)
         
         print("✅ Tablas generadas exitosamente")
         return tablas_generadas
         
     except Exception as e:
         print(f"❌ Error al generar tablas: {e}")
+        if lanzar_errores:
+            raise
         return f"Error al generar las tablas: {str(e)}"
 
 
+def generar_tablas_stream(resumen_texto, llm_instance, metricas=None, lanzar_errores=False):
+    """
+    Versión en streaming de generar_tablas_desde_resumen: ambas tablas se
+    piden de forma concurrente con `.stream()` y sus fragmentos se entregan
+    intercalados a medida que llegan.
+    
+    Args:
+        resumen_texto (str): El texto completo del resumen ejecutivo generado
+        llm_instance: Instancia del modelo LLM (OpenAI o Gemini)
+        metricas (dict, optional): Si se indica, guarda en metricas["tabla_N"]
+            el tiempo hasta el primer token (ttft_s) y el total (total_s)
+        lanzar_errores (bool): Si una tabla falla, lanzar su error al terminar
+            en lugar de entregar un texto de aviso como fragmento
+    
+    Yields:
+        tuple: (numero_tabla, fragmento); al terminar cada tabla se entrega
+        (numero_tabla, None)
+    """
+    cola = queue.Queue()
+    errores = []
+    
+    def producir(numero_tabla):
+        inicio = time.perf_counter()
+        ttft = None
+        try:
+            prompt_formateado = get_prompt_tabla_individual(numero_tabla).format(resumen=resumen_texto)
+            with span("tabla_llm", tabla=numero_tabla):
+                for chunk in llm_instance.stream(prompt_formateado):
+                    texto = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if texto:
+                        if ttft is None:
+                            ttft = time.perf_counter() - inicio
+                        cola.put((numero_tabla, texto))
+        except Exception as e:
+            print(f"❌ Error al generar Tabla #{numero_tabla}: {e}")
+            if lanzar_errores:
+                errores.append(e)
+            else:
+                cola.put((numero_tabla, f"Error al generar la tabla: {str(e)}"))
+        finally:
+            if metricas is not None:
+                metricas[f"tabla_{numero_tabla}"] = {"ttft_s": ttft, "total_s": time.perf_counter() - inicio}
+            cola.put((numero_tabla, None))
+    
+    print("🔧 Generando tablas técnicas en paralelo (streaming)...")
+    with span("tablas_llm"), ThreadPoolExecutor(max_workers=len(TITULOS_TABLAS)) as pool:
+        for numero_tabla in TITULOS_TABLAS:
+            pool.submit(producir, numero_tabla)
+        
+        pendientes = len(TITULOS_TABLAS)
+        while pendientes:
+            numero_tabla, fragmento = cola.get()
+            if fragmento is None:
+                pendientes -= 1
+            yield numero_tabla, fragmento
+    
+    if errores:
+        raise errores[0]
+
+
 def extraer_tabla_individual(tablas_completas, numero_tabla):
     """
     Extrae una tabla específica del texto completo de tablas.
@@ -0,0 +1,109 @@
+"""
+Pruebas de cache_ocr.CacheOCR en una carpeta temporal: orden LRU,
+desalojo por tamaño, total de bytes y contadores de estadisticas().
+"""
+
+import sqlite3
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+import cache_ocr
+from cache_ocr import CacheOCR, CACHE_OCR_FRACCION_TRAS_DESALOJO
+
+MB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def reloj(monkeypatch):
+    """ultimo_uso estrictamente creciente: el orden LRU no depende de la resolución del reloj"""
+    instantes = itertools.count(1)
+    monkeypatch.setattr(cache_ocr, "time", SimpleNamespace(time=lambda: float(next(instantes))))
+
+
+def _bytes_guardados(directorio):
+    conn = sqlite3.connect(directorio / "ocr.db")
+    try:
+        suma = conn.execute("SELECT COALESCE(SUM(tamano), 0) FROM ocr").fetchone()[0]
+        contador = conn.execute("SELECT valor FROM contadores WHERE nombre = 'bytes'").fetchone()[0]
+    finally:
+        conn.close()
+    assert contador == suma
+    return suma
+
+
+def test_desaloja_la_entrada_usada_hace_mas_tiempo(tmp_path):
+    cache = CacheOCR(tmp_path, max_mb=400 / MB)
+    for clave in "abcd":
+        cache.guardar(clave, clave * 100, 90.0)
+    assert cache.obtener("a") == ("a" * 100, 90.0)  # a pasa a ser la más reciente
+
+    cache.guardar("e", "e" * 100)
+
+    # 500 > 400: se libera hasta 360 bytes, empezando por b y luego c
+    assert cache.obtener("b") is None
+    assert cache.obtener("c") is None
+    assert [cache.obtener(clave)[0][0] for clave in "ade"] == ["a", "d", "e"]
+    assert _bytes_guardados(tmp_path) == 300
+
+
+def test_desaloja_hasta_la_fraccion_del_maximo(tmp_path):
+    max_mb = 0.1
+    cache = CacheOCR(tmp_path, max_mb=max_mb)
+    limite = int(max_mb * MB)
+    tras_desalojo = int(limite * CACHE_OCR_FRACCION_TRAS_DESALOJO)
+
+    for i in range(40):
+        antes = _bytes_guardados(tmp_path)
+        cache.guardar(f"pagina-{i}", "x" * 10_000)
+        despues = _bytes_guardados(tmp_path)
+        assert despues <= limite
+        if despues < antes + 10_000:
+            assert despues <= tras_desalojo
+
+    estadisticas = cache.estadisticas()
+    assert estadisticas["desalojos"] > 0
+    assert estadisticas["desalojos"] + estadisticas["entradas"] == 40
+
+
+def test_reemplazar_una_entrada_no_duplica_su_tamano(tmp_path):
+    cache = CacheOCR(tmp_path)
+    cache.guardar("a", "x" * 1000)
+    cache.guardar("a", "y" * 400)
+    assert _bytes_guardados(tmp_path) == 400
+    assert cache.obtener("a") == ("y" * 400, None)
+
+
+def test_calcula_el_total_de_una_cache_anterior(tmp_path):
+    CacheOCR(tmp_path).guardar("a", "x" * 1000)
+    conn = sqlite3.connect(tmp_path / "ocr.db")
+    with conn:
+        conn.execute("DELETE FROM contadores WHERE nombre = 'bytes'")
+    conn.close()
+
+    cache = CacheOCR(tmp_path)
+    assert _bytes_guardados(tmp_path) == 1000
+    cache.guardar("b", "x" * 500)
+    assert _bytes_guardados(tmp_path) == 1500
+
+
+def test_estadisticas(tmp_path):
+    cache = CacheOCR(tmp_path, max_mb=250 / MB)
+    assert cache.estadisticas() == {
+        "aciertos": 0, "fallos": 0, "desalojos": 0, "entradas": 0, "tamano_mb": 0.0, "tasa_aciertos": None,
+    }
+
+    assert cache.obtener("a") is None
+    cache.guardar("a", "a" * 100)
+    cache.guardar("b", "b" * 100)
+    cache.obtener("a")
+    cache.obtener("a")
+    cache.guardar("c", "c" * 100)  # 300 > 250: sale b
+
+    estadisticas = cache.estadisticas()
+    assert estadisticas["aciertos"] == 2
+    assert estadisticas["fallos"] == 1
+    assert estadisticas["desalojos"] == 1
+    assert estadisticas["entradas"] == 2
+    assert estadisticas["tasa_aciertos"] == round(2 / 3, 3)
@@ -0,0 +1,67 @@
+"""
+Pruebas de consumo_llm: precio por nombre de modelo y tokens contados con
+el modelo simulado (llm_simulado.py), que informa el uso como OpenAI.
+"""
+
+import pytest
+
+import corelogic
+from consumo_llm import ConsumoLLM, con_consumo, _precio_modelo
+from llm_simulado import LLMSimulado
+
+PRECIOS = {
+    "gpt-4.1-mini": {"entrada": 0.40, "salida": 1.60},
+    "gpt-4o": {"entrada": 2.50, "salida": 10.00},
+}
+
+
+@pytest.fixture(autouse=True)
+def precios(monkeypatch):
+    config = {"precios_llm": PRECIOS}
+    monkeypatch.setattr(corelogic, "get_config", lambda clave, defecto=None: config.get(clave, defecto))
+
+
+def _llm(modelo):
+    return LLMSimulado(model_name=modelo, distribucion="fija", latencia_media_s=0.0, tokens_por_segundo=1e6)
+
+
+@pytest.mark.parametrize("modelo, precio", [
+    ("gpt-4.1-mini", PRECIOS["gpt-4.1-mini"]),
+    ("gpt-4.1-mini-2025-04-14", PRECIOS["gpt-4.1-mini"]),
+    ("gpt-4o-2024-08-06", PRECIOS["gpt-4o"]),
+    # Modelos hermanos: otro precio, nunca el del nombre más parecido
+    ("gpt-4.1", None),
+    ("gpt-4.1-nano", None),
+    ("gpt-4o-mini", None),
+    ("gpt-4o-mini-2024-07-18", None),
+])
+def test_precio_modelo(modelo, precio):
+    assert _precio_modelo(modelo) == precio
+
+
+def test_cuenta_tokens_de_un_stream():
+    consumo = ConsumoLLM()
+    llm = con_consumo(_llm("gpt-4.1-mini-2025-04-14"), consumo)
+    prompt = "Resume el pliego:\nTransformador de 75 kVA, 13,2 kV, BIL 95 kV"
+
+    texto = "".join(fragmento.content for fragmento in llm.stream(prompt))
+
+    totales = consumo.totales()
+    modelo = totales["modelos"]["gpt-4.1-mini-2025-04-14"]
+    assert texto
+    assert totales["llamadas"] == modelo["llamadas"] == 1
+    assert totales["tokens_entrada"] == modelo["tokens_entrada"] == len(prompt) // 4 + 1
+    assert totales["tokens_salida"] == modelo["tokens_salida"] > 0
+    esperado = (totales["tokens_entrada"] * 0.40 + totales["tokens_salida"] * 1.60) / 1_000_000
+    assert totales["costo_usd"] == pytest.approx(esperado, abs=1e-6)
+
+
+def test_costo_desconocido_si_algun_modelo_no_tiene_precio():
+    consumo = ConsumoLLM()
+    con_consumo(_llm("gpt-4.1-mini-2025-04-14"), consumo).invoke("Tabla #1")
+    con_consumo(_llm("gpt-4.1-2025-04-14"), consumo).invoke("Tabla #2")
+
+    totales = consumo.totales()
+    assert totales["llamadas"] == 2
+    assert set(totales["modelos"]) == {"gpt-4.1-mini-2025-04-14", "gpt-4.1-2025-04-14"}
+    assert totales["costo_usd"] is None
@@ -0,0 +1,54 @@
+"""
+Pruebas de la extracción en memoria (utils.extract_text_from_pdf_bytes): un
+PDF grande recibido como memoryview se lee sin copiarlo ni escribirlo a disco.
+"""
+
+import io
+import random
+import tracemalloc
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+import utils
+from benchmarks.corpus_sintetico import escribir_pdf, lineas_pagina
+
+PAGINAS = 20
+TAMANO_ANEXO = 32 * 2**20
+
+
+@pytest.fixture(scope="module")
+def pdf_grande(tmp_path_factory):
+    """Pliego digital con un anexo adjunto de 32 MB que la extracción no necesita leer"""
+    rng = random.Random(0)
+    ruta = tmp_path_factory.mktemp("pdf") / "pliego.pdf"
+    escribir_pdf(ruta, [("texto", lineas_pagina(rng, n, PAGINAS, "ET-TD-001")) for n in range(1, PAGINAS + 1)])
+    writer = PdfWriter(clone_from=PdfReader(ruta))
+    writer.add_attachment("anexo.bin", rng.randbytes(TAMANO_ANEXO))
+    salida = io.BytesIO()
+    writer.write(salida)
+    return salida.getvalue()
+
+
+def test_extrae_memoryview_sin_copias_ni_temporales(pdf_grande, monkeypatch):
+    def sin_temporales(*args, **kwargs):
+        raise AssertionError("la extracción de texto no debe escribir archivos temporales")
+
+    monkeypatch.setattr(utils.tempfile, "NamedTemporaryFile", sin_temporales)
+    contenido = memoryview(pdf_grande)
+
+    # Primera llamada fuera de la medición: importa pypdf y carga sus tablas
+    utils.extract_text_from_pdf_bytes(contenido, "calentamiento.pdf", extractor="pypdf")
+
+    tracemalloc.start()
+    try:
+        docs = utils.extract_text_from_pdf_bytes(contenido, "pliego.pdf", extractor="pypdf")
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(docs) == PAGINAS
+    assert all(doc.metadata["extraction_method"] == "texto" for doc in docs)
+    assert "ET-TD-001" in docs[0].page_content
+    # Una sola copia del contenido ya superaría len(pdf_grande)
+    assert pico < len(pdf_grande) / 10
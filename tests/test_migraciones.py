@@ -0,0 +1,189 @@
+"""
+Pruebas de database_supabase.aplicar_migraciones e init_database con una
+base simulada: cada conexión acumula sus sentencias en una transacción que
+solo se vuelve visible al hacer commit, como en PostgreSQL.
+"""
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+import database_supabase
+from database_supabase import PoolConexiones
+
+MIGRACIONES = [
+    (1, "Columna a", ["ALTER TABLE historial ADD COLUMN a TEXT"]),
+    (2, "Columna b", ["ALTER TABLE historial ADD COLUMN b TEXT"]),
+    (3, "Índice c", ["CREATE INDEX idx_c ON historial (c)", "ANALYZE historial"]),
+]
+
+
+class BaseFalsa:
+    """Estado confirmado de la base: versiones registradas y sentencias aplicadas"""
+
+    def __init__(self, versiones=()):
+        self.tabla_migraciones = bool(versiones)
+        self.versiones = set(versiones)
+        self.sentencias = []
+        self.transacciones = []  # Sentencias de cada transacción confirmada
+        self.conexiones = 0
+        self.al_bloquear = None  # Se llama al tomar el advisory lock (otro proceso)
+        self.fallar_en = None  # Sentencia que lanza un error de SQL
+
+    def conectar(self):
+        self.conexiones += 1
+        return ConexionFalsa(self)
+
+
+class ConexionFalsa:
+    def __init__(self, base):
+        self.base = base
+        self.closed = 0
+        self.pendiente = []
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def get_transaction_status(self):
+        if self.pendiente:
+            return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        base = self.base
+        for sql, params in self.pendiente:
+            if "CREATE TABLE IF NOT EXISTS schema_migraciones" in sql:
+                base.tabla_migraciones = True
+            elif sql.startswith("INSERT INTO schema_migraciones"):
+                base.versiones.add(params[0])
+            elif "pg_advisory_xact_lock" not in sql:
+                base.sentencias.append(sql)
+        if self.pendiente:
+            base.transacciones.append([sql for sql, _ in self.pendiente])
+        self.pendiente = []
+
+    def rollback(self):
+        self.pendiente = []
+
+    def close(self):
+        self.closed = 1
+
+
+class CursorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+        self.base = conn.base
+        self.filas = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        base = self.base
+        if sql == base.fallar_en:
+            raise psycopg2.ProgrammingError(f"error de sintaxis en «{sql}»")
+        if "to_regclass('schema_migraciones')" in sql:
+            self.filas = [(base.tabla_migraciones,)]
+            return
+        if sql == "SELECT version FROM schema_migraciones":
+            versiones = set(base.versiones)
+            versiones |= {p[0] for s, p in self.conn.pendiente if s.startswith("INSERT INTO schema_migraciones")}
+            self.filas = [(v,) for v in sorted(versiones)]
+            return
+        if "pg_advisory_xact_lock" in sql and base.al_bloquear:
+            base.al_bloquear(base)
+        self.conn.pendiente.append((sql, params))
+
+    def fetchone(self):
+        return self.filas[0]
+
+    def fetchall(self):
+        return self.filas
+
+
+@pytest.fixture
+def base(monkeypatch):
+    base = BaseFalsa()
+    monkeypatch.setattr(database_supabase, "_pool", PoolConexiones(base.conectar, max_conexiones=1))
+    monkeypatch.setattr(database_supabase, "MIGRACIONES", MIGRACIONES)
+    monkeypatch.setattr(database_supabase, "_esquema_al_dia", False)
+    monkeypatch.setattr(database_supabase, "ENVIRONMENT", "production")
+    return base
+
+
+def test_aplica_todas_en_orden_cada_una_con_su_registro(base):
+    assert database_supabase.aplicar_migraciones() == [1, 2, 3]
+    assert base.versiones == {1, 2, 3}
+    assert base.sentencias == [
+        "ALTER TABLE historial ADD COLUMN a TEXT",
+        "ALTER TABLE historial ADD COLUMN b TEXT",
+        "CREATE INDEX idx_c ON historial (c)",
+        "ANALYZE historial",
+    ]
+    # Una transacción por migración: lock, tabla de registro, sentencias, registro
+    assert len(base.transacciones) == 3
+    for transaccion in base.transacciones:
+        assert "pg_advisory_xact_lock" in transaccion[0]
+        assert transaccion[-1].startswith("INSERT INTO schema_migraciones")
+
+
+def test_omite_las_versiones_ya_aplicadas(base):
+    base.tabla_migraciones = True
+    base.versiones = {1, 2}
+    assert database_supabase.aplicar_migraciones() == [3]
+    assert base.sentencias == ["CREATE INDEX idx_c ON historial (c)", "ANALYZE historial"]
+
+    # Al día: solo se consultan las versiones, sin lock ni transacciones
+    transacciones = len(base.transacciones)
+    assert database_supabase.aplicar_migraciones() == []
+    assert len(base.transacciones) == transacciones
+
+
+def test_vuelve_a_comprobar_bajo_el_lock(base):
+    def otro_proceso_aplica_la_2(base):
+        # Mientras esperábamos el lock, otro proceso aplicó la versión 2
+        if 2 not in base.versiones:
+            base.tabla_migraciones = True
+            base.versiones.add(2)
+            base.sentencias.append("ALTER TABLE historial ADD COLUMN b TEXT")
+
+    base.al_bloquear = otro_proceso_aplica_la_2
+    assert database_supabase.aplicar_migraciones() == [1, 3]
+    assert base.sentencias.count("ALTER TABLE historial ADD COLUMN b TEXT") == 1
+    assert base.versiones == {1, 2, 3}
+
+
+def test_una_migracion_fallida_no_queda_registrada(base):
+    base.fallar_en = "ANALYZE historial"
+    with pytest.raises(psycopg2.ProgrammingError):
+        database_supabase.aplicar_migraciones()
+    # Las anteriores quedan confirmadas; la 3 se deshace entera
+    assert base.versiones == {1, 2}
+    assert "CREATE INDEX idx_c ON historial (c)" not in base.sentencias
+
+
+def test_init_database_no_consulta_la_base_una_vez_al_dia(base):
+    database_supabase.init_database()
+    assert base.versiones == {1, 2, 3}
+    assert database_supabase._esquema_al_dia
+
+    conexiones = base.conexiones
+    reutilizadas = database_supabase._pool.reutilizadas
+    database_supabase.init_database()
+    assert base.conexiones == conexiones
+    assert database_supabase._pool.reutilizadas == reutilizadas
+
+
+def test_init_database_reintenta_tras_un_error(base):
+    base.fallar_en = "ANALYZE historial"
+    database_supabase.init_database()
+    assert not database_supabase._esquema_al_dia
+
+    base.fallar_en = None
+    database_supabase.init_database()
+    assert database_supabase._esquema_al_dia
+    assert base.versiones == {1, 2, 3}
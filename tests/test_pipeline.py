@@ -0,0 +1,67 @@
+"""
+Pruebas de pipeline.procesar_lote en modo combinado con el modelo simulado
+(llm_simulado.py) y la base de datos reemplazada por un diccionario.
+"""
+
+import random
+
+import pytest
+
+import utils
+import pipeline
+from llm_simulado import LLMSimulado
+from benchmarks.corpus_sintetico import escribir_pdf, lineas_pagina
+
+
+def _pdf(tmp_path, nombre, codigo):
+    ruta = tmp_path / nombre
+    rng = random.Random(codigo)
+    escribir_pdf(ruta, [("texto", lineas_pagina(rng, n, 2, codigo)) for n in (1, 2)])
+    return ruta.read_bytes()
+
+
+@pytest.fixture
+def base_falsa(monkeypatch):
+    """Reemplaza buscar_por_hash/guardar_analisis por un diccionario hash -> análisis"""
+    guardados = {}
+
+    def guardar_analisis(usuario, nombre, resumen, tablas, hash_contenido=None, **kwargs):
+        guardados[hash_contenido] = {"nombre_archivo": nombre, "resumen": resumen, "tablas_tecnicas": tablas}
+
+    monkeypatch.setattr(pipeline, "buscar_por_hash", guardados.get)
+    monkeypatch.setattr(pipeline, "guardar_analisis", guardar_analisis)
+    # Sin OCR de respaldo: un PDF corrupto no devuelve texto
+    monkeypatch.setattr(utils, "OCR_AVAILABLE", False)
+    return guardados
+
+
+def _procesar(archivos):
+    llm = LLMSimulado(distribucion="fija", latencia_media_s=0.0, tokens_por_segundo=1e6)
+    return list(pipeline.procesar_lote(archivos, llm, "Resume:\n{text}", "usuario", combinado=True))
+
+
+def _final_conjunto(eventos):
+    return [e for e in eventos if e["indice"] is None and e["etapa"] in pipeline.ETAPAS_FINALES][-1]
+
+
+def test_conjunto_completo_se_guarda_y_se_cachea(tmp_path, base_falsa):
+    archivos = [("a.pdf", _pdf(tmp_path, "a.pdf", "ET-TD-001")), ("b.pdf", _pdf(tmp_path, "b.pdf", "ET-TD-002"))]
+
+    final = _final_conjunto(_procesar(archivos))
+    assert final["etapa"] == pipeline.ETAPA_LISTO
+    assert len(base_falsa) == 1
+
+    assert _final_conjunto(_procesar(archivos))["etapa"] == pipeline.ETAPA_CACHE
+
+
+def test_conjunto_con_un_archivo_fallido_no_se_guarda(tmp_path, base_falsa):
+    archivos = [("a.pdf", _pdf(tmp_path, "a.pdf", "ET-TD-001")), ("b.pdf", b"%PDF-1.4 corrupto")]
+
+    for _ in range(2):
+        eventos = _procesar(archivos)
+        final = _final_conjunto(eventos)
+        assert final["etapa"] == pipeline.ETAPA_ERROR
+        assert "b.pdf" in final["error"]
+        assert final["resultado"] is None
+        assert any(e["indice"] == 1 and e["etapa"] == pipeline.ETAPA_ERROR for e in eventos)
+        assert not base_falsa
@@ -0,0 +1,157 @@
+"""
+Pruebas de database_supabase.PoolConexiones con una conexión simulada que
+imita a psycopg2 (closed, cursor, rollback, estado de la transacción), sin
+servidor de PostgreSQL.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from database_supabase import PoolConexiones
+
+
+class ConexionFalsa:
+    def __init__(self):
+        self.closed = 0
+        self.rota = False
+        self.consultas = 0
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class CursorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        if self.conn.rota:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.consultas += 1
+
+
+class Conector:
+    """Callable `conectar` del pool que recuerda las conexiones que abrió"""
+
+    def __init__(self):
+        self.abiertas = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        conn = ConexionFalsa()
+        with self._lock:
+            self.abiertas.append(conn)
+        return conn
+
+
+def test_reutiliza_conexiones_con_uso_concurrente():
+    conectar = Conector()
+    pool = PoolConexiones(conectar, max_conexiones=4, idle_timeout=60, espera_max=5, verificar_tras=60)
+    en_uso = []
+    maximo_en_uso = []
+    lock = threading.Lock()
+
+    def usar(_):
+        conn = pool.obtener()
+        with lock:
+            en_uso.append(conn)
+            maximo_en_uso.append(len(en_uso))
+        time.sleep(0.002)
+        with lock:
+            en_uso.remove(conn)
+        pool.devolver(conn)
+
+    with ThreadPoolExecutor(max_workers=16) as hilos:
+        list(hilos.map(usar, range(400)))
+
+    assert pool.creadas <= 4
+    assert len(conectar.abiertas) == pool.creadas
+    assert max(maximo_en_uso) <= 4
+    assert pool.creadas + pool.reutilizadas == 400
+    assert pool.reutilizadas >= 396
+
+
+def test_reutiliza_la_misma_conexion_en_uso_secuencial():
+    pool = PoolConexiones(Conector(), max_conexiones=2, idle_timeout=60, verificar_tras=60)
+    for _ in range(10):
+        conn = pool.obtener()
+        pool.devolver(conn)
+    assert pool.creadas == 1
+    assert pool.reutilizadas == 9
+
+
+def test_cierra_conexiones_inactivas():
+    conectar = Conector()
+    pool = PoolConexiones(conectar, max_conexiones=2, idle_timeout=0.05, verificar_tras=60)
+    primera = pool.obtener()
+    pool.devolver(primera)
+
+    time.sleep(0.1)
+    segunda = pool.obtener()
+
+    assert segunda is not primera
+    assert primera.closed
+    assert pool.creadas == 2
+    assert pool.reutilizadas == 0
+
+
+def test_descarta_conexiones_cerradas_al_devolverlas():
+    pool = PoolConexiones(Conector(), max_conexiones=2, verificar_tras=60)
+    conn = pool.obtener()
+    conn.close()
+    pool.devolver(conn)
+
+    nueva = pool.obtener()
+    assert nueva is not conn
+    assert pool.creadas == 2
+
+
+def test_descarta_conexiones_que_fallan_la_verificacion():
+    # verificar_tras=0: SELECT 1 antes de cada reutilización
+    pool = PoolConexiones(Conector(), max_conexiones=2, verificar_tras=0)
+    conn = pool.obtener()
+    pool.devolver(conn)
+    conn.rota = True
+
+    nueva = pool.obtener()
+    assert nueva is not conn
+    assert conn.closed
+    assert pool.creadas == 2
+    assert pool.reutilizadas == 0
+
+
+def test_devolver_con_descartar_cierra_la_conexion():
+    pool = PoolConexiones(Conector(), max_conexiones=1)
+    conn = pool.obtener()
+    pool.devolver(conn, descartar=True)
+    assert conn.closed
+    assert pool.obtener() is not conn
+
+
+def test_espera_max_sin_conexiones_libres():
+    pool = PoolConexiones(Conector(), max_conexiones=1, espera_max=0.05)
+    conn = pool.obtener()
+    with pytest.raises(TimeoutError):
+        pool.obtener()
+    pool.devolver(conn)
+    assert pool.obtener() is conn
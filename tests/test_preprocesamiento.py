@@ -0,0 +1,76 @@
+"""
+Pruebas de preprocesamiento.py sobre páginas del corpus sintético
+(benchmarks/corpus_sintetico.py): se quitan encabezados, pies y numeración
+sin perder los valores técnicos.
+"""
+
+import re
+import random
+
+from langchain_core.documents import Document
+
+from preprocesamiento import preprocesar_documento, limpiar_texto, _es_numero_pagina
+from benchmarks.corpus_sintetico import lineas_pagina
+
+CODIGO = "ET-TD-042"
+ENCABEZADO = f"MAGNETRON S.A.S. - Pliego de condiciones técnicas {CODIGO}"
+_PATRON_TECNICO = re.compile(r"\bk(V|VA)\b|\bBIL\b")
+
+
+def _paginas(total, fuente="pliego.pdf"):
+    rng = random.Random(0)
+    return [
+        Document(page_content="\n".join(lineas_pagina(rng, n, total, CODIGO)), metadata={"source": fuente, "page": n - 1})
+        for n in range(1, total + 1)
+    ]
+
+
+def _compactar(linea):
+    return " ".join(linea.split())
+
+
+def test_quita_encabezados_y_pies_repetidos():
+    docs = _paginas(8)
+    limpios, estadisticas = preprocesar_documento(docs)
+
+    for numero, doc in enumerate(limpios, start=1):
+        assert ENCABEZADO not in doc.page_content
+        assert f"Página {numero} de 8" not in doc.page_content
+    assert estadisticas["lineas_repetidas"] >= 1
+    assert estadisticas["tokens_despues"] < estadisticas["tokens_antes"]
+
+
+def test_conserva_las_lineas_con_valores_tecnicos():
+    docs = _paginas(8)
+    limpios, _ = preprocesar_documento(docs)
+
+    tecnicas = 0
+    for original, limpio in zip(docs, limpios):
+        conservadas = set(limpio.page_content.splitlines())
+        for linea in original.page_content.splitlines():
+            if _PATRON_TECNICO.search(linea) and linea != ENCABEZADO:
+                tecnicas += 1
+                assert _compactar(linea) in conservadas
+    assert tecnicas > 0
+
+
+def test_con_pocas_paginas_no_se_quitan_lineas_repetidas():
+    docs = _paginas(2)
+    limpios, estadisticas = preprocesar_documento(docs)
+    assert estadisticas["lineas_repetidas"] == 0
+    assert all(limpio.page_content.startswith(ENCABEZADO) for limpio in limpios)
+
+
+def test_compacta_puntos_guia_y_espacios():
+    indice = "3.2 Pintura ............ 14\n\n\n\n4. Accesorios …… 15\nBIL   95 kV"
+    assert limpiar_texto(indice) == "3.2 Pintura 14\n\n4. Accesorios 15\nBIL 95 kV"
+
+
+def test_numero_de_pagina_frente_a_valores_sueltos():
+    assert _es_numero_pagina("Página 3 de 40", 3)
+    assert _es_numero_pagina("Pág. 7", 7)
+    assert _es_numero_pagina("12/40", 12)
+    assert _es_numero_pagina("- 12 -", 12)
+    # Un número suelto que no es el de la página es un dato (p. ej. BIL 95)
+    assert not _es_numero_pagina("95", 3)
+    assert not _es_numero_pagina("13,2 kV", 13)
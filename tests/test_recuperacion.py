@@ -0,0 +1,89 @@
+"""
+Pruebas de recuperacion.py: ranking BM25 y resumen por secciones con el
+modelo simulado (llm_simulado.py).
+"""
+
+import random
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+
+from promots import SECCIONES_RESUMEN
+from recuperacion import IndiceBM25, resumen_por_secciones, trocear_documento
+from llm_simulado import LLMSimulado
+from benchmarks.corpus_sintetico import lineas_pagina
+
+TROZOS = [
+    "Pintura: imprimante epóxico y acabado poliuretano, 120 µm de película seca, color RAL 7035.",
+    "Embalaje en guacal de madera para transporte terrestre hasta el almacén del cliente.",
+    "Tensión primaria 13,2 kV, BIL 95 kV; tensión secundaria 214/123 V. Grupo de conexión Dyn5.",
+    "Garantía de 24 meses a partir de la puesta en servicio.",
+    "Termómetro de dial con contactos de alarma e indicador magnético de nivel de aceite.",
+]
+
+
+class Llamadas(BaseCallbackHandler):
+    """Cuenta las llamadas al modelo y guarda sus prompts"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.prompts.extend("\n\n".join(str(m.content) for m in mensajes) for mensajes in messages)
+
+
+def _llm(llamadas):
+    llm = LLMSimulado(distribucion="fija", latencia_media_s=0.0, tokens_por_segundo=1e6)
+    return llm.with_config(callbacks=[llamadas])
+
+
+def _paginas(total):
+    rng = random.Random(0)
+    return [
+        Document(page_content="\n".join(lineas_pagina(rng, n, total, "ET-TD-007")), metadata={"page": n - 1})
+        for n in range(1, total + 1)
+    ]
+
+
+def test_bm25_ubica_el_bil_primero_para_parametros_electricos():
+    indice = IndiceBM25(TROZOS)
+    resultados = indice.buscar(SECCIONES_RESUMEN[2]["terminos"], 3)
+    assert resultados[0] == 2
+
+
+def test_bm25_omite_textos_sin_coincidencias():
+    indice = IndiceBM25(TROZOS)
+    assert indice.buscar("garantía", 3) == [3]
+    assert indice.buscar("ferroresonancia", 3) == []
+
+
+def test_bm25_ignora_tildes_y_mayusculas():
+    indice = IndiceBM25(TROZOS)
+    assert indice.puntuar("TENSION") == indice.puntuar("tensión")
+
+
+def test_secciones_en_orden_con_top_k_trozos_cada_una():
+    docs = _paginas(12)
+    top_k = 3
+    assert len(trocear_documento(docs)) > top_k
+    llamadas = Llamadas()
+
+    resumen = "".join(resumen_por_secciones(docs, _llm(llamadas), top_k=top_k))
+
+    posiciones = [resumen.find(seccion["titulo"]) for seccion in SECCIONES_RESUMEN.values()]
+    assert -1 not in posiciones
+    assert posiciones == sorted(posiciones)
+    assert len(llamadas.prompts) == len(SECCIONES_RESUMEN)
+    assert all(prompt.count("[Página ") <= top_k for prompt in llamadas.prompts)
+    seccion_2 = next(p for p in llamadas.prompts if f'"{SECCIONES_RESUMEN[2]["titulo"]}"' in p)
+    assert "BIL" in seccion_2
+
+
+def test_documento_corto_usa_una_sola_llamada():
+    docs = _paginas(1)
+    llamadas = Llamadas()
+
+    resumen = "".join(resumen_por_secciones(docs, _llm(llamadas), top_k=50))
+
+    assert len(llamadas.prompts) == 1
+    assert all(seccion["titulo"] in resumen for seccion in SECCIONES_RESUMEN.values())
@@ -0,0 +1,68 @@
+"""
+Pruebas del presupuesto de tokens del resumen (utils._preparar_resumen):
+ningún prompt enviado al modelo supera max_tokens, con las instrucciones
+incluidas.
+"""
+
+import random
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+
+import utils
+from llm_simulado import LLMSimulado
+from preprocesamiento import preprocesar_documento
+from benchmarks.corpus_sintetico import lineas_pagina
+
+PROMPT = "Redacta el resumen ejecutivo del pliego técnico siguiente, con sus 9 secciones:\n\n{document_text}"
+
+
+class Prompts(BaseCallbackHandler):
+    """Guarda el texto de cada prompt que recibe el modelo"""
+
+    def __init__(self):
+        self.textos = []
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.textos.extend("\n\n".join(str(m.content) for m in mensajes) for mensajes in messages)
+
+
+def _docs(paginas):
+    rng = random.Random(0)
+    return [
+        Document(page_content="\n".join(lineas_pagina(rng, n, paginas, "ET-TD-001")), metadata={"page": n - 1})
+        for n in range(1, paginas + 1)
+    ]
+
+
+def _llm():
+    return LLMSimulado(distribucion="fija", latencia_media_s=0.0, tokens_por_segundo=1e6)
+
+
+def test_documento_justo_bajo_el_presupuesto_no_excede_con_el_prompt():
+    docs = _docs(6)
+    llm = _llm()
+    modelo = utils._nombre_modelo(llm)
+    # El texto cabe, pero no junto con las instrucciones del prompt
+    max_tokens = preprocesar_documento(_docs(6), modelo)[1]["tokens_despues"] + 1
+    prompts = Prompts()
+
+    prompt_final, resumen = utils._preparar_resumen(docs, llm.with_config(callbacks=[prompts]), PROMPT, max_tokens)
+
+    assert prompts.textos, "debió resumir por fragmentos"
+    if prompt_final is not None:
+        prompts.textos.append(prompt_final)
+    for texto in prompts.textos:
+        assert utils.contar_tokens(texto, modelo) <= max_tokens
+
+
+def test_documento_que_cabe_va_en_una_sola_llamada():
+    docs = _docs(3)
+    llm = _llm()
+    prompts = Prompts()
+
+    prompt_final, resumen = utils._preparar_resumen(docs, llm.with_config(callbacks=[prompts]), PROMPT, 100_000)
+
+    assert resumen is None
+    assert not prompts.textos
+    assert prompt_final.startswith("Redacta el resumen ejecutivo")
@@ -0,0 +1,392 @@
+"""
+trabajos.py - Cola de trabajos en segundo plano para los análisis
+
+Ejecuta la cadena extracción → resumen → tablas → guardado fuera del ciclo
+de ejecución de Streamlit, de modo que sobrevive a reruns, cierres de
+pestaña y reconexiones. Cada trabajo tiene un ID, un estado y un resultado
+persistidos en un archivo SQLite local; la interfaz los consulta por ID.
+Los trabajos de distintos usuarios se atienden por turnos (round-robin).
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+from corelogic import get_llm, get_config
+from promots import get_prompt_summary_str
+from utils import (
+    extract_text_from_pdf_bytes,
+    resumen_documento,
+    resumen_documento_stream,
+    medir_stream,
+    calcular_hash_pdf,
+    NIVEL_AVANCE,
+    MODO_COMPLETO
+)
+from table_generator import generar_tablas_desde_resumen, generar_tablas_stream, unir_tablas
+from database_supabase import buscar_por_hash, guardar_analisis
+from pipeline import procesar_lote
+from metricas import acumular_etapas
+from consumo_llm import ConsumoLLM, con_consumo
+
+# Ubicación de la tabla de trabajos y de los PDFs pendientes
+DIRECTORIO_TRABAJOS = Path(os.getenv("TRABAJOS_DIR", Path(__file__).resolve().with_name(".trabajos")))
+MAX_TRABAJOS_SIMULTANEOS = int(os.getenv("MAX_TRABAJOS_SIMULTANEOS", "2"))
+
+# Estados de un trabajo
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_EN_PROCESO = "en_proceso"
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+
+ESTADOS_ACTIVOS = (ESTADO_PENDIENTE, ESTADO_EN_PROCESO)
+
+
+class GestorTrabajos:
+    """
+    Cola persistente de análisis con un pool fijo de hilos trabajadores.
+
+    Args:
+        directorio (Path): Carpeta con trabajos.db y los PDFs pendientes
+        max_simultaneos (int): Trabajos que se ejecutan a la vez
+    """
+
+    def __init__(self, directorio=DIRECTORIO_TRABAJOS, max_simultaneos=MAX_TRABAJOS_SIMULTANEOS):
+        self._directorio = Path(directorio)
+        self._directorio.mkdir(parents=True, exist_ok=True)
+        self._ruta_db = self._directorio / "trabajos.db"
+        self._colas = OrderedDict()  # usuario -> deque de IDs (orden de turno)
+        self._cond = threading.Condition()
+        self._parciales = {}  # ID -> {"resumen": str, "tablas": {n: str}}
+
+        self._crear_tabla()
+        self._reanudar_pendientes()
+
+        for i in range(max_simultaneos):
+            threading.Thread(target=self._trabajar, name=f"trabajo-{i}", daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+    def enviar(self, usuario, archivos, combinado=False, forzar=False):
+        """
+        Encola un análisis y devuelve su ID de inmediato.
+
+        Args:
+            usuario (str): Usuario que solicita el análisis
+            archivos (list): Lista de (nombre, pdf_bytes)
+            combinado (bool): Un solo resumen para todos los archivos
+            forzar (bool): Ignorar la caché y regenerar el análisis
+
+        Returns:
+            str: ID del trabajo
+        """
+        trabajo_id = uuid.uuid4().hex
+        carpeta = self._directorio / trabajo_id
+        carpeta.mkdir()
+        for i, (_, pdf_bytes) in enumerate(archivos):
+            (carpeta / f"{i}.pdf").write_bytes(pdf_bytes)
+
+        ahora = time.time()
+        with self._conectar() as conn:
+            conn.execute(
+                """
+                INSERT INTO trabajos (id, usuario, nombres, combinado, forzar, estado, progreso, creado, actualizado)
+                VALUES (?, ?, ?, ?, ?, ?, '{}', ?, ?)
+                """,
+                (trabajo_id, usuario, json.dumps([nombre for nombre, _ in archivos]),
+                 int(combinado), int(forzar), ESTADO_PENDIENTE, ahora, ahora),
+            )
+        self._encolar(usuario, trabajo_id)
+        print(f"🗂️ Trabajo {trabajo_id} encolado para {usuario} ({len(archivos)} archivo(s))")
+        return trabajo_id
+
+    def obtener(self, trabajo_id):
+        """
+        Devuelve el estado de un trabajo (o None si no existe).
+
+        Returns:
+            dict: id, usuario, nombres, estado, progreso, resultados, error,
+            parcial (texto en curso) y posicion (en la cola, si está pendiente)
+        """
+        with self._conectar() as conn:
+            fila = conn.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        if fila is None:
+            return None
+        trabajo = self._a_dict(fila)
+        trabajo["parcial"] = self._parciales.get(trabajo_id)
+        if trabajo["estado"] == ESTADO_PENDIENTE:
+            trabajo["posicion"] = self._posicion(trabajo_id)
+        return trabajo
+
+    def listar(self, usuario, limite=10):
+        """Trabajos más recientes de un usuario, del más nuevo al más antiguo"""
+        with self._conectar() as conn:
+            filas = conn.execute(
+                "SELECT * FROM trabajos WHERE usuario = ? ORDER BY creado DESC LIMIT ?",
+                (usuario, limite),
+            ).fetchall()
+        return [self._a_dict(fila) for fila in filas]
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _conectar(self):
+        """Conexión SQLite de corta duración: commit al salir y cierre siempre"""
+        conn = sqlite3.connect(self._ruta_db, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _crear_tabla(self):
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    usuario TEXT NOT NULL,
+                    nombres TEXT NOT NULL,
+                    combinado INTEGER NOT NULL DEFAULT 0,
+                    forzar INTEGER NOT NULL DEFAULT 0,
+                    estado TEXT NOT NULL,
+                    progreso TEXT NOT NULL DEFAULT '{}',
+                    resultados TEXT,
+                    error TEXT,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_usuario ON trabajos (usuario, creado DESC)")
+
+    def _actualizar(self, trabajo_id, **campos):
+        campos["actualizado"] = time.time()
+        asignaciones = ", ".join(f"{campo} = ?" for campo in campos)
+        with self._conectar() as conn:
+            conn.execute(f"UPDATE trabajos SET {asignaciones} WHERE id = ?", (*campos.values(), trabajo_id))
+
+    @staticmethod
+    def _a_dict(fila):
+        trabajo = dict(fila)
+        trabajo["nombres"] = json.loads(trabajo["nombres"])
+        trabajo["progreso"] = json.loads(trabajo["progreso"] or "{}")
+        trabajo["resultados"] = json.loads(trabajo["resultados"]) if trabajo["resultados"] else []
+        trabajo["combinado"] = bool(trabajo["combinado"])
+        trabajo["forzar"] = bool(trabajo["forzar"])
+        return trabajo
+
+    def _reanudar_pendientes(self):
+        """Vuelve a encolar los trabajos que quedaron sin terminar en un reinicio"""
+        with self._conectar() as conn:
+            filas = conn.execute(
+                "SELECT id, usuario FROM trabajos WHERE estado IN (?, ?) ORDER BY creado",
+                ESTADOS_ACTIVOS,
+            ).fetchall()
+            conn.execute(
+                "UPDATE trabajos SET estado = ? WHERE estado = ?",
+                (ESTADO_PENDIENTE, ESTADO_EN_PROCESO),
+            )
+        for fila in filas:
+            self._encolar(fila["usuario"], fila["id"])
+        if filas:
+            print(f"🔄 {len(filas)} trabajo(s) pendientes reanudados")
+
+    # ------------------------------------------------------------------
+    # Planificación por turnos entre usuarios
+    # ------------------------------------------------------------------
+    def _encolar(self, usuario, trabajo_id):
+        with self._cond:
+            self._colas.setdefault(usuario, deque()).append(trabajo_id)
+            self._cond.notify()
+
+    def _siguiente(self):
+        """Toma el próximo trabajo del usuario al que le toca y lo pasa al final del turno"""
+        with self._cond:
+            while not self._colas:
+                self._cond.wait()
+            usuario, cola = next(iter(self._colas.items()))
+            trabajo_id = cola.popleft()
+            del self._colas[usuario]
+            if cola:
+                self._colas[usuario] = cola
+            return trabajo_id
+
+    def _posicion(self, trabajo_id):
+        """Posición aproximada del trabajo en el orden de atención (1 = el siguiente)"""
+        with self._cond:
+            colas = [list(cola) for cola in self._colas.values()]
+        orden = []
+        for ronda in range(max((len(cola) for cola in colas), default=0)):
+            orden.extend(cola[ronda] for cola in colas if ronda < len(cola))
+        return orden.index(trabajo_id) + 1 if trabajo_id in orden else None
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+    def _trabajar(self):
+        while True:
+            trabajo_id = self._siguiente()
+            trabajo = self.obtener(trabajo_id)
+            if trabajo is None or trabajo["estado"] not in ESTADOS_ACTIVOS:
+                continue
+
+            self._actualizar(trabajo_id, estado=ESTADO_EN_PROCESO)
+            try:
+                resultados = self._ejecutar(trabajo)
+                self._actualizar(trabajo_id, estado=ESTADO_COMPLETADO, resultados=json.dumps(resultados, default=str))
+                print(f"✅ Trabajo {trabajo_id} completado")
+            except Exception as e:
+                print(f"❌ Trabajo {trabajo_id} falló: {e}")
+                self._actualizar(trabajo_id, estado=ESTADO_ERROR, error=str(e))
+            finally:
+                self._parciales.pop(trabajo_id, None)
+                shutil.rmtree(self._directorio / trabajo_id, ignore_errors=True)
+
+    def _ejecutar(self, trabajo):
+        carpeta = self._directorio / trabajo["id"]
+        archivos = [
+            (nombre, (carpeta / f"{i}.pdf").read_bytes())
+            for i, nombre in enumerate(trabajo["nombres"])
+        ]
+
+        if len(archivos) == 1:
+            nombre, pdf_bytes = archivos[0]
+            return [self._ejecutar_archivo(trabajo, nombre, pdf_bytes)]
+
+        # Archivos con el mismo nombre se distinguen por su posición en el lote
+        nombres = trabajo["nombres"]
+        repetidos = {nombre for nombre in nombres if nombres.count(nombre) > 1}
+
+        progreso = {}
+        resultados = []
+        for evento in procesar_lote(
+            archivos,
+            get_llm(),
+            get_prompt_summary_str(),
+            trabajo["usuario"],
+            max_tokens=get_config("max_tokens_documento"),
+            combinado=trabajo["combinado"],
+            forzar=trabajo["forzar"],
+            modo=get_config("modo_resumen", MODO_COMPLETO),
+        ):
+            clave = evento["nombre"]
+            if clave in repetidos and evento["indice"] is not None:
+                clave = f"{clave} (#{evento['indice'] + 1})"
+            progreso[clave] = {"etapa": evento["etapa"], "error": evento["error"]}
+            if evento["resultado"]:
+                resultados.append(evento["resultado"])
+            self._actualizar(trabajo["id"], progreso=json.dumps(progreso))
+        return resultados
+
+    def _ejecutar_archivo(self, trabajo, nombre, pdf_bytes):
+        """Analiza un solo PDF dejando el texto parcial disponible para la interfaz"""
+        trabajo_id = trabajo["id"]
+
+        estado = {"etapa": None, "error": None}
+
+        def etapa(nombre_etapa):
+            estado.update(etapa=nombre_etapa, detalle=None, avance=None)
+            self._actualizar(trabajo_id, progreso=json.dumps({nombre: estado}))
+
+        def progreso(nivel, mensaje, avance=None):
+            # Avisos de extracción/OCR/resumen: el último queda como detalle de la etapa
+            estado.update(detalle=mensaje, avance=avance if nivel == NIVEL_AVANCE else None)
+            self._actualizar(trabajo_id, progreso=json.dumps({nombre: estado}))
+
+        hash_pdf = calcular_hash_pdf(pdf_bytes)
+        if not trabajo["forzar"]:
+            existente = buscar_por_hash(hash_pdf)
+            if existente:
+                etapa("cache")
+                return {
+                    "nombre": nombre,
+                    "resumen": existente["resumen"],
+                    "tablas": existente.get("tablas_tecnicas"),
+                    "desde_cache": True,
+                    "fecha_hora": existente["fecha_hora"].strftime('%d/%m/%Y %H:%M'),
+                }
+
+        duraciones = {}
+        etapa("extrayendo")
+        with acumular_etapas(duraciones):
+            docs = extract_text_from_pdf_bytes(pdf_bytes, nombre, progreso=progreso)
+        if not docs:
+            raise ValueError("No se pudo extraer texto del PDF")
+
+        consumo = ConsumoLLM()
+        llm = con_consumo(get_llm(), consumo)
+        metricas = {}
+        parcial = {"resumen": "", "tablas": {}}
+        self._parciales[trabajo_id] = parcial
+
+        # Con "streaming" el resumen y las tablas llegan token a token y la
+        # interfaz los ve mientras se generan; sin él, cada uno aparece al
+        # terminar. Un error del LLM llega como excepción: el trabajo queda
+        # en error y el análisis no se guarda ni se cachea
+        streaming = get_config("streaming", True)
+        etapa("resumiendo")
+        with acumular_etapas(duraciones):
+            if streaming:
+                for fragmento in medir_stream(
+                    resumen_documento_stream(
+                        docs, llm, get_prompt_summary_str(),
+                        max_tokens=get_config("max_tokens_documento"), progreso=progreso,
+                        modo=get_config("modo_resumen", MODO_COMPLETO), lanzar_errores=True
+                    ),
+                    "resumen",
+                    metricas,
+                ):
+                    parcial["resumen"] += fragmento
+            else:
+                inicio = time.perf_counter()
+                parcial["resumen"] = resumen_documento(
+                    docs, llm, get_prompt_summary_str(),
+                    max_tokens=get_config("max_tokens_documento"), progreso=progreso,
+                    modo=get_config("modo_resumen", MODO_COMPLETO), lanzar_errores=True
+                )
+                metricas["resumen"] = {"ttft_s": None, "total_s": time.perf_counter() - inicio}
+        resumen = parcial["resumen"].strip()
+
+        etapa("tablas")
+        inicio = time.perf_counter()
+        with acumular_etapas(duraciones):
+            if streaming:
+                for numero, fragmento in generar_tablas_stream(resumen, llm, metricas, lanzar_errores=True):
+                    if fragmento:
+                        parcial["tablas"][numero] = parcial["tablas"].get(numero, "") + fragmento
+            else:
+                generar_tablas_desde_resumen(resumen, llm, al_completar_tabla=parcial["tablas"].__setitem__,
+                                             lanzar_errores=True)
+        ttfts = [m["ttft_s"] for clave, m in metricas.items() if clave.startswith("tabla_") and m["ttft_s"] is not None]
+        metricas["tablas"] = {"ttft_s": min(ttfts) if ttfts else None, "total_s": time.perf_counter() - inicio}
+        tablas = unir_tablas(parcial["tablas"])
+
+        totales = consumo.totales()
+        guardar_analisis(trabajo["usuario"], nombre, resumen, tablas, hash_contenido=hash_pdf,
+                         duraciones_etapas=duraciones, consumo_llm=totales)
+        etapa("listo")
+        return {"nombre": nombre, "resumen": resumen, "tablas": tablas, "metricas": metricas, "consumo": totales}
+
+
+_gestor = None
+_gestor_lock = threading.Lock()
+
+
+def obtener_gestor():
+    """Devuelve el gestor de trabajos del proceso, creándolo la primera vez"""
+    global _gestor
+    if _gestor is None:
+        with _gestor_lock:
+            if _gestor is None:
+                _gestor = GestorTrabajos()
+    return _gestor
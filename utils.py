@@ -2,186 +2,862 @@
 
 import tempfile
 import os
-import streamlit as st
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.docstore.document import Document
+import hashlib
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from importlib.util import find_spec
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from langchain_core.documents import Document
+from extractores import extraer_textos, extractor_configurado
+from cache_ocr import obtener_cache_ocr, clave_ocr
+from metricas import span
 
-# Importaciones para OCR
-try:
-    import pytesseract
-    from pdf2image import convert_from_path
-    from PIL import Image
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+# Dependencias del OCR: solo se comprueba que estén instaladas; se importan
+# en las funciones que las usan, la primera vez que hay páginas escaneadas
+OCR_AVAILABLE = all(find_spec(modulo) for modulo in ("pytesseract", "pdf2image", "PIL"))
+
+# Parámetros del OCR
+OCR_DPI = 300
+OCR_IDIOMA = "spa+eng"
+# OCR adaptativo: primera pasada rápida y solo las páginas dudosas a OCR_DPI
+OCR_ADAPTATIVO = True
+OCR_DPI_RAPIDO = 200
+OCR_CONFIANZA_MINIMA = 70
+# Páginas que rasteriza cada tarea: acota la memoria a workers × ventana imágenes
+OCR_PAGINAS_POR_VENTANA = 4
+OCR_MAX_WORKERS = os.cpu_count() or 1
+# Menos caracteres que esto en una página = probablemente escaneada
+UMBRAL_CHARS_OCR = 50
+
+# Niveles de los avisos de progreso
+NIVEL_INFO = "info"
+NIVEL_EXITO = "exito"
+NIVEL_AVISO = "aviso"
+NIVEL_ERROR = "error"
+NIVEL_AVANCE = "avance"
+
+# Parámetros del resumen por fragmentos (map-reduce)
+MAX_TOKENS_DOCUMENTO = 300000
+TOKENS_POR_FRAGMENTO = 60000
+MAX_CONCURRENCIA_LLM = 4
+
+# Modos del resumen: documento completo o por secciones con recuperación
+MODO_COMPLETO = "completo"
+MODO_SECCIONES = "secciones"
+
+PREGUNTA_MAPA = (
+    "El documento anterior es el fragmento {indice} de {total} del pliego (páginas {desde}-{hasta}). "
+    "Extrae únicamente la información presente en este fragmento siguiendo el índice de secciones (1-9) "
+    "y omite las secciones sin datos."
+)
+PREGUNTA_REDUCCION = (
+    "El documento anterior contiene resúmenes parciales de fragmentos consecutivos del MISMO pliego. "
+    "Consolídalos en un único Resumen Ejecutivo con las secciones 1-9, sin repetir datos, conservando "
+    "todos los valores numéricos y señalando las contradicciones entre fragmentos."
+)
 
 
-def extract_text_from_pdf_bytes(uploaded_file_content_bytes, filename):
+def calcular_hash_pdf(pdf_bytes):
     """
-    Extrae el texto de cada PDF usando PyPDFLoader.
-    Si el PDF es escaneado (imagen plana sin texto), aplica OCR automáticamente.
+    Calcula el hash SHA-256 del contenido binario de un PDF.
+    Identifica el pliego por su contenido, independiente del nombre del archivo.
     
     Args:
-        uploaded_file_content_bytes: Contenido binario del archivo PDF
-        filename: Nombre del archivo PDF
+        pdf_bytes: Contenido binario del archivo PDF
         
     Returns:
-        Lista de objetos Document con el texto extraído
+        str: Hash SHA-256 en hexadecimal
+    """
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _avisar(progreso, nivel, mensaje, avance=None):
+    """
+    Entrega un aviso de progreso al callback del llamador o, si no hay,
+    lo imprime en consola. Así el pipeline no depende de ninguna interfaz.
+    
+    Args:
+        progreso: Callable progreso(nivel, mensaje, avance) o None
+        nivel (str): Uno de los NIVEL_*
+        mensaje (str): Texto del aviso
+        avance (float, optional): Fracción completada (0-1) para NIVEL_AVANCE
     """
+    if progreso is not None:
+        progreso(nivel, mensaje, avance)
+    else:
+        print(mensaje)
+
+
+@contextmanager
+def _pdf_temporal(pdf_bytes):
+    """
+    Escribe el PDF en un único archivo temporal para las herramientas que
+    necesitan una ruta (poppler/pdf2image) y lo elimina siempre al salir,
+    aunque haya una excepción.
+    """
+    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
     try:
-        # Guardar temporalmente el PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file_content_bytes)
-            tmp_file_path = tmp_file.name
-        
-        # Intentar extracción normal con PyPDFLoader
-        loader = PyPDFLoader(tmp_file_path)
-        langchain_docs = loader.load()
-        
-        # Calcular cantidad de texto extraído
-        total_text = "".join([doc.page_content for doc in langchain_docs])
-        total_chars = len(total_text.strip())
-        total_pages = len(langchain_docs)
-        avg_chars_per_page = total_chars / total_pages if total_pages > 0 else 0
-        
-        # Detectar si necesita OCR
-        # Criterio: menos de 50 caracteres por página = probablemente escaneado
-        needs_ocr = avg_chars_per_page < 50
+        with tmp_file:
+            tmp_file.write(pdf_bytes)
+        yield tmp_file.name
+    finally:
+        try:
+            os.remove(tmp_file.name)
+        except FileNotFoundError:
+            pass
+
+
+def _extraer_paginas(pdf_bytes, filename, extractor=None):
+    """
+    Extrae el texto de cada página directamente desde memoria con el backend
+    indicado o el configurado en config.json (ver extractores.py).
+    
+    Returns:
+        Lista de objetos Document, uno por página
+    """
+    extractor = extractor or extractor_configurado()
+    textos = extraer_textos(pdf_bytes, extractor)
+    return [
+        Document(
+            page_content=texto or "",
+            metadata={
+                "source": filename,
+                "page": i,
+                "total_pages": len(textos),
+                "extraction_method": "texto",
+                "extractor": extractor
+            }
+        )
+        for i, texto in enumerate(textos)
+    ]
+
+
+def extract_text_from_pdf_bytes(uploaded_file_content_bytes, filename, progreso=None, extractor=None):
+    """
+    Extrae el texto de cada PDF con el backend configurado (pypdf por
+    defecto), leyendo desde memoria sin archivos temporales ni copias del
+    contenido (acepta bytes, bytearray o memoryview).
+    Las páginas sin texto suficiente (escaneadas) se procesan con OCR de forma
+    individual y se integran al resultado en su posición original, de modo que
+    los anexos escaneados de un pliego digital no se pierden. Solo el OCR
+    usa un archivo temporal, porque poppler necesita una ruta.
+    
+    Args:
+        uploaded_file_content_bytes: Contenido binario del archivo PDF
+        filename: Nombre del archivo PDF
+        progreso: Callback progreso(nivel, mensaje, avance) (opcional)
+        extractor (str, optional): Backend de extracción (ver extractores.py)
         
-        if needs_ocr:
-            st.warning(f"⚠️ El PDF '{filename}' parece ser una imagen escaneada (promedio: {avg_chars_per_page:.0f} caracteres/página)")
+    Returns:
+        Lista de objetos Document con el texto extraído, uno por página y con
+        metadata["extraction_method"] igual a "texto" u "OCR"
+    """
+    with span("extraccion", archivo=filename):
+        try:
+            langchain_docs = _extraer_paginas(uploaded_file_content_bytes, filename, extractor)
+            total_pages = len(langchain_docs)
             
-            if OCR_AVAILABLE:
-                with st.spinner("🔍 Aplicando OCR... Esto puede tomar unos segundos."):
-                    ocr_docs = extract_text_with_ocr(tmp_file_path, filename, total_pages)
+            # Detectar por página cuáles necesitan OCR
+            paginas_ocr = [
+                i for i, doc in enumerate(langchain_docs)
+                if len(doc.page_content.strip()) < UMBRAL_CHARS_OCR
+            ]
+            
+            if paginas_ocr:
+                _avisar(progreso, NIVEL_AVISO, f"⚠️ {len(paginas_ocr)} de {total_pages} páginas de '{filename}' parecen escaneadas (menos de {UMBRAL_CHARS_OCR} caracteres)")
                 
-                # Si el OCR extrajo más texto, usar ese resultado
-                ocr_text = "".join([doc.page_content for doc in ocr_docs])
-                if len(ocr_text.strip()) > total_chars:
-                    langchain_docs = ocr_docs
-                    st.success(f"✅ OCR completado exitosamente: {len(ocr_text)} caracteres extraídos")
+                if OCR_AVAILABLE:
+                    _avisar(progreso, NIVEL_INFO, f"🔍 Aplicando OCR a {len(paginas_ocr)} páginas... Esto puede tomar unos segundos.")
+                    with _pdf_temporal(uploaded_file_content_bytes) as ruta_pdf:
+                        ocr_docs = extract_text_with_ocr(ruta_pdf, filename, total_pages, paginas=paginas_ocr, progreso=progreso)
+                    
+                    # Reemplazar cada página solo si el OCR extrajo más texto
+                    paginas_recuperadas = 0
+                    for ocr_doc in ocr_docs:
+                        i = ocr_doc.metadata["page"]
+                        if len(ocr_doc.page_content.strip()) > len(langchain_docs[i].page_content.strip()):
+                            langchain_docs[i] = ocr_doc
+                            paginas_recuperadas += 1
+                    
+                    if paginas_recuperadas:
+                        _avisar(progreso, NIVEL_EXITO, f"✅ OCR completado exitosamente: {paginas_recuperadas} páginas recuperadas")
+                    else:
+                        _avisar(progreso, NIVEL_INFO, "ℹ️ Usando extracción normal")
                 else:
-                    st.info("ℹ️ Usando extracción normal")
+                    _avisar(progreso, NIVEL_ERROR, "❌ OCR no disponible. Verifica que pytesseract, pdf2image y Pillow estén instalados.")
+                    _avisar(progreso, NIVEL_INFO, "💡 El PDF será procesado con el texto disponible, aunque puede ser limitado.")
             else:
-                st.error("❌ OCR no disponible. Verifica que pytesseract, pdf2image y Pillow estén instalados.")
-                st.info("💡 El PDF será procesado con el texto disponible, aunque puede ser limitado.")
-        else:
-            st.success(f"✅ Texto extraído exitosamente: {total_chars} caracteres")
-        
-        # Limpiar archivo temporal
-        os.remove(tmp_file_path)
-        
-        # Actualizar metadata
-        for doc in langchain_docs:
-            doc.metadata["source"] = filename
-        
-        return langchain_docs
-        
+                total_chars = sum(len(doc.page_content.strip()) for doc in langchain_docs)
+                _avisar(progreso, NIVEL_EXITO, f"✅ Texto extraído exitosamente: {total_chars} caracteres")
+            
+            return langchain_docs
+            
+        except Exception as e:
+            # Si falla la extracción normal, intentar OCR como respaldo
+            if OCR_AVAILABLE:
+                _avisar(progreso, NIVEL_AVISO, f"⚠️ Error en extracción normal: {e}")
+                _avisar(progreso, NIVEL_INFO, "🔄 Intentando OCR como respaldo...")
+                try:
+                    with _pdf_temporal(uploaded_file_content_bytes) as ruta_pdf:
+                        ocr_docs = extract_text_with_ocr(ruta_pdf, filename, progreso=progreso)
+                    
+                    if ocr_docs:
+                        _avisar(progreso, NIVEL_EXITO, "✅ OCR completado exitosamente")
+                        return ocr_docs
+                except Exception as ocr_error:
+                    _avisar(progreso, NIVEL_ERROR, f"❌ Error en OCR: {ocr_error}")
+            
+            _avisar(progreso, NIVEL_ERROR, f"Error al extraer texto de '{filename}': {e}")
+            return []
+
+
+def _inicializar_worker_ocr():
+    """Limita a un hilo cada proceso de Tesseract para no sobresuscribir la CPU"""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+# Pool de OCR único por proceso: las extracciones simultáneas (pipeline,
+# trabajos en segundo plano) comparten OCR_MAX_WORKERS procesos en lugar de
+# crear cada una los suyos
+_pool_ocr = None
+_pool_ocr_lock = threading.Lock()
+
+
+def _obtener_pool_ocr():
+    """Devuelve el pool de procesos de OCR, creándolo en el primer uso"""
+    global _pool_ocr
+    with _pool_ocr_lock:
+        if _pool_ocr is None:
+            _pool_ocr = ProcessPoolExecutor(max_workers=OCR_MAX_WORKERS, initializer=_inicializar_worker_ocr)
+        return _pool_ocr
+
+
+def cerrar_pool_ocr():
+    """Termina los procesos del pool de OCR; se recrea en el próximo uso"""
+    global _pool_ocr
+    with _pool_ocr_lock:
+        pool, _pool_ocr = _pool_ocr, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _descartar_pool_ocr(pool):
+    """Olvida un pool roto (murió un worker) para que el próximo OCR cree otro"""
+    global _pool_ocr
+    with _pool_ocr_lock:
+        if _pool_ocr is pool:
+            _pool_ocr = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(cerrar_pool_ocr)
+
+
+def _binarizar(image):
+    """Escala de grises y umbral de Otsu: texto negro sobre fondo blanco"""
+    gris = image.convert("L")
+    histograma = gris.histogram()
+    total = sum(histograma)
+    suma_total = sum(nivel * n for nivel, n in enumerate(histograma))
+    suma_fondo = peso_fondo = 0
+    mejor_umbral, mejor_varianza = 127, 0.0
+    for nivel, n in enumerate(histograma):
+        peso_fondo += n
+        peso_frente = total - peso_fondo
+        if peso_fondo == 0:
+            continue
+        if peso_frente == 0:
+            break
+        suma_fondo += nivel * n
+        media_fondo = suma_fondo / peso_fondo
+        media_frente = (suma_total - suma_fondo) / peso_frente
+        varianza = peso_fondo * peso_frente * (media_fondo - media_frente) ** 2
+        if varianza > mejor_varianza:
+            mejor_umbral, mejor_varianza = nivel, varianza
+    return gris.point(lambda p: 255 if p > mejor_umbral else 0)
+
+
+def _ocr_imagen(image, lang, rotacion=0, binarizar=True):
+    """
+    Extrae el texto de una imagen con una sola pasada de Tesseract
+    (image_to_data), que además da la confianza de cada palabra.
+    
+    Args:
+        image: Imagen PIL de la página
+        lang (str): Idioma(s) de Tesseract, o None para el por defecto
+        rotacion (int): Grados a girar para enderezar la página (OSD)
+        binarizar (bool): Pasar a escala de grises y binarizar antes
+    
+    Returns:
+        tuple: (texto, confianza media 0-100 o None si no hay palabras)
+    """
+    if rotacion:
+        image = image.rotate(-rotacion, expand=True)
+    if binarizar:
+        image = _binarizar(image)
+    import pytesseract
+    
+    datos = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    
+    # Agrupar las palabras por línea en orden de lectura
+    lineas = {}
+    confianzas = []
+    for i, palabra in enumerate(datos["text"]):
+        if not palabra.strip():
+            continue
+        confianza = float(datos["conf"][i])
+        if confianza >= 0:
+            confianzas.append(confianza)
+        clave = (datos["block_num"][i], datos["par_num"][i], datos["line_num"][i])
+        lineas.setdefault(clave, []).append(palabra)
+    
+    # Una línea en blanco entre párrafos
+    partes = []
+    parrafo_anterior = None
+    for (bloque, parrafo, _), palabras in lineas.items():
+        if parrafo_anterior is not None and (bloque, parrafo) != parrafo_anterior:
+            partes.append("")
+        partes.append(" ".join(palabras))
+        parrafo_anterior = (bloque, parrafo)
+    
+    confianza_media = sum(confianzas) / len(confianzas) if confianzas else None
+    return "\n".join(partes), confianza_media
+
+
+def _ocr_ventana(pdf_path, primera_pagina, ultima_pagina, dpi, lang=OCR_IDIOMA, rotacion=0, binarizar=True):
+    """
+    Rasteriza y aplica OCR a un rango de páginas dentro de un proceso del pool.
+    Solo las imágenes de esta ventana existen en memoria a la vez. Las páginas
+    cuyos píxeles ya pasaron por Tesseract se toman de la caché OCR.
+    
+    Args:
+        pdf_path: Ruta del archivo PDF
+        primera_pagina: Primera página del rango (1-indexada)
+        ultima_pagina: Última página del rango (1-indexada, inclusiva)
+        dpi: Resolución de rasterizado
+        lang, rotacion, binarizar: Ver _ocr_imagen
+    
+    Returns:
+        tuple: (primera_pagina, lista de dicts {texto, confianza, segundos, dpi}
+        en orden de página, páginas obtenidas de la caché)
+    """
+    from pdf2image import convert_from_path
+    
+    try:
+        cache = obtener_cache_ocr()
     except Exception as e:
-        # Si falla la extracción normal, intentar OCR como respaldo
-        if OCR_AVAILABLE:
-            st.warning(f"⚠️ Error en extracción normal: {e}")
-            st.info("🔄 Intentando OCR como respaldo...")
-            try:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                    tmp_file.write(uploaded_file_content_bytes)
-                    tmp_file_path = tmp_file.name
-                
-                ocr_docs = extract_text_with_ocr(tmp_file_path, filename)
-                os.remove(tmp_file_path)
-                
-                if ocr_docs:
-                    st.success("✅ OCR completado exitosamente")
-                    return ocr_docs
-            except Exception as ocr_error:
-                st.error(f"❌ Error en OCR: {ocr_error}")
-        
-        st.error(f"Error al extraer texto de '{filename}': {e}")
-        return []
+        print(f"⚠️ Caché OCR no disponible: {e}")
+        cache = None
+    
+    inicio = time.perf_counter()
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=primera_pagina, last_page=ultima_pagina)
+    # El rasterizado se reparte en partes iguales entre las páginas de la ventana
+    segundos_rasterizado = (time.perf_counter() - inicio) / max(len(images), 1)
+    
+    config = f"rotacion={rotacion}|binarizar={binarizar}"
+    resultados = []
+    aciertos = 0
+    for image in images:
+        inicio = time.perf_counter()
+        clave = clave_ocr(image, lang, config, dpi)
+        guardado = cache.obtener(clave) if cache else None
+        if guardado is None:
+            texto, confianza = _ocr_imagen(image, lang, rotacion, binarizar)
+            if cache:
+                cache.guardar(clave, texto, confianza)
+        else:
+            texto, confianza = guardado
+            aciertos += 1
+        resultados.append({
+            "texto": texto,
+            "confianza": confianza,
+            "segundos": segundos_rasterizado + time.perf_counter() - inicio,
+            "dpi": dpi,
+        })
+        image.close()
+    return primera_pagina, resultados, aciertos
+
+
+def _agrupar_en_ventanas(paginas, tamano):
+    """
+    Agrupa números de página ordenados (1-indexados) en rangos contiguos
+    de como máximo `tamano` páginas.
+    
+    Returns:
+        list: Tuplas (primera_pagina, ultima_pagina)
+    """
+    ventanas = []
+    for pagina in paginas:
+        if ventanas and pagina == ventanas[-1][1] + 1 and pagina - ventanas[-1][0] < tamano:
+            ventanas[-1][1] = pagina
+        else:
+            ventanas.append([pagina, pagina])
+    return [tuple(ventana) for ventana in ventanas]
+
+
+def _parametros_documento(pdf_path, pagina):
+    """
+    Resuelve una sola vez por documento el idioma de Tesseract (los de
+    OCR_IDIOMA que estén instalados) y la orientación de las páginas (OSD
+    sobre la primera página a procesar), en lugar de reintentar por página.
+    
+    Returns:
+        tuple: (lang o None, rotacion en grados)
+    """
+    import pytesseract
+    from pdf2image import convert_from_path
+    
+    try:
+        instalados = set(pytesseract.get_languages(config=""))
+    except Exception:
+        instalados = set()
+    lang = "+".join(idioma for idioma in OCR_IDIOMA.split("+") if idioma in instalados) or None
+    
+    rotacion = 0
+    try:
+        image = convert_from_path(pdf_path, dpi=OCR_DPI_RAPIDO, first_page=pagina, last_page=pagina)[0]
+        rotacion = int(pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT).get("rotate", 0))
+        image.close()
+    except Exception:
+        # Sin datos de OSD o página con muy poco texto: orientación normal
+        pass
+    return lang, rotacion
+
+
+def _ocr_paginas(pdf_path, paginas, dpi, lang, rotacion, binarizar, progreso=None):
+    """
+    Aplica OCR a las páginas indicadas (0-indexadas) en el pool de procesos
+    compartido.
+    
+    Returns:
+        tuple: (dict página -> resultado de _ocr_ventana, páginas desde caché)
+    """
+    ventanas = _agrupar_en_ventanas([i + 1 for i in paginas], OCR_PAGINAS_POR_VENTANA)
+    workers = max(1, min(OCR_MAX_WORKERS, len(ventanas)))
+    
+    resultados = {}
+    paginas_cache = 0
+    
+    pool = _obtener_pool_ocr()
+    futuros = [
+        pool.submit(_ocr_ventana, pdf_path, primera, ultima, dpi, lang, rotacion, binarizar)
+        for primera, ultima in ventanas
+    ]
+    try:
+        for futuro in as_completed(futuros):
+            primera, resultados_ventana, aciertos = futuro.result()
+            paginas_cache += aciertos
+            for desplazamiento, resultado in enumerate(resultados_ventana):
+                resultados[primera - 1 + desplazamiento] = resultado
+            
+            # Actualizar progreso
+            _avisar(
+                progreso, NIVEL_AVANCE,
+                f"📷 OCR a {dpi} DPI: {len(resultados)}/{len(paginas)} páginas procesadas ({workers} procesos)...",
+                min(len(resultados) / len(paginas), 1.0),
+            )
+    except BrokenProcessPool:
+        # Un worker murió (p. ej. sin memoria)
+        _descartar_pool_ocr(pool)
+        raise
+    except BaseException:
+        for futuro in futuros:
+            futuro.cancel()
+        raise
+    return resultados, paginas_cache
 
 
-def extract_text_with_ocr(pdf_path, filename, total_pages=None):
+def extract_text_with_ocr(pdf_path, filename, total_pages=None, paginas=None, progreso=None):
     """
     Aplica OCR a un PDF escaneado usando Tesseract.
+    Las páginas se rasterizan por ventanas acotadas y se procesan en un pool
+    de procesos del tamaño de la CPU, de modo que la memoria no crece con el
+    número de páginas del documento.
+    
+    En modo adaptativo (OCR_ADAPTATIVO) la primera pasada usa OCR_DPI_RAPIDO
+    sobre la imagen binarizada, y solo las páginas cuya confianza media queda
+    por debajo de OCR_CONFIANZA_MINIMA se repiten a OCR_DPI; de las dos
+    lecturas se conserva la de mayor confianza.
     
     Args:
         pdf_path: Ruta del archivo PDF temporal
         filename: Nombre del archivo original
-        total_pages: Número total de páginas (opcional, para mostrar progreso)
+        total_pages: Número total de páginas (opcional, se consulta si falta)
+        paginas: Índices de página (0-indexados) a procesar; por defecto todas
+        progreso: Callback progreso(nivel, mensaje, avance) (opcional)
     
     Returns:
-        Lista de objetos Document con el texto extraído por OCR
+        Lista de objetos Document con el texto extraído por OCR, en orden de
+        página; la metadata incluye ocr_confianza, ocr_segundos, ocr_dpi,
+        ocr_idioma y ocr_rotacion
     """
     if not OCR_AVAILABLE:
         raise ImportError("OCR no disponible. Instala: pip install pytesseract pdf2image Pillow")
     
-    try:
-        # Convertir PDF a imágenes (DPI 300 para buena calidad)
-        images = convert_from_path(pdf_path, dpi=300)
-        
-        # Preparar documentos
-        ocr_docs = []
-        
-        # Crear barra de progreso
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Aplicar OCR a cada página
-        for i, image in enumerate(images):
-            # Actualizar progreso
-            progress = (i + 1) / len(images)
-            progress_bar.progress(progress)
-            status_text.text(f"📷 Procesando página {i+1}/{len(images)} con OCR...")
-            
-            # Extraer texto con Tesseract (español + inglés)
-            try:
-                text = pytesseract.image_to_string(image, lang='spa+eng')
-            except Exception:
-                # Si falla con español, intentar solo inglés
-                try:
-                    text = pytesseract.image_to_string(image, lang='eng')
-                except Exception:
-                    # Si todo falla, usar sin especificar idioma
-                    text = pytesseract.image_to_string(image)
-            
-            # Crear documento para esta página
-            doc = Document(
-                page_content=text,
-                metadata={
-                    "source": filename,
-                    "page": i,
-                    "extraction_method": "OCR"
-                }
+    with span("ocr", archivo=filename, paginas=len(paginas) if paginas is not None else total_pages):
+        try:
+            if paginas is None:
+                if not total_pages:
+                    from pdf2image import pdfinfo_from_path
+                    total_pages = pdfinfo_from_path(pdf_path)["Pages"]
+                paginas = range(total_pages)
+            paginas = sorted(paginas)
+            if not paginas:
+                return []
+            
+            lang, rotacion = _parametros_documento(pdf_path, paginas[0] + 1)
+            dpi_inicial = OCR_DPI_RAPIDO if OCR_ADAPTATIVO else OCR_DPI
+            resultados, paginas_cache = _ocr_paginas(
+                pdf_path, paginas, dpi_inicial, lang, rotacion, OCR_ADAPTATIVO, progreso
             )
-            ocr_docs.append(doc)
-        
-        # Limpiar barra de progreso
-        progress_bar.empty()
-        status_text.empty()
-        
-        return ocr_docs
-        
-    except Exception as e:
-        st.error(f"Error durante el proceso de OCR: {e}")
-        raise
+            
+            if OCR_ADAPTATIVO:
+                dudosas = [i for i in paginas if (resultados[i]["confianza"] or 0) < OCR_CONFIANZA_MINIMA]
+                if dudosas:
+                    _avisar(progreso, NIVEL_INFO, f"🔁 {len(dudosas)} páginas con confianza menor a {OCR_CONFIANZA_MINIMA}%: OCR a {OCR_DPI} DPI")
+                    segunda, aciertos = _ocr_paginas(pdf_path, dudosas, OCR_DPI, lang, rotacion, True, progreso)
+                    paginas_cache += aciertos
+                    for i in dudosas:
+                        mejor, otra = segunda[i], resultados[i]
+                        if (segunda[i]["confianza"] or 0) < (resultados[i]["confianza"] or 0):
+                            mejor, otra = otra, mejor
+                        mejor["segundos"] += otra["segundos"]
+                        resultados[i] = mejor
+            
+            if paginas_cache:
+                _avisar(progreso, NIVEL_INFO, f"♻️ {paginas_cache} páginas tomadas de la caché OCR")
+            
+            confianzas = [r["confianza"] for r in resultados.values() if r["confianza"] is not None]
+            segundos_por_pagina = sum(r["segundos"] for r in resultados.values()) / len(paginas)
+            _avisar(
+                progreso, NIVEL_INFO,
+                f"📷 OCR: {len(paginas)} páginas, {segundos_por_pagina:.2f} s/página, confianza media "
+                + (f"{sum(confianzas) / len(confianzas):.0f}%" if confianzas else "sin datos")
+            )
+            
+            # Crear un documento por página, en orden
+            ocr_docs = [
+                Document(
+                    page_content=resultados[i]["texto"],
+                    metadata={
+                        "source": filename,
+                        "page": i,
+                        "extraction_method": "OCR",
+                        "ocr_confianza": round(resultados[i]["confianza"], 1) if resultados[i]["confianza"] is not None else None,
+                        "ocr_segundos": round(resultados[i]["segundos"], 3),
+                        "ocr_dpi": resultados[i]["dpi"],
+                        "ocr_idioma": lang,
+                        "ocr_rotacion": rotacion
+                    }
+                )
+                for i in paginas
+            ]
+            
+            return ocr_docs
+            
+        except Exception as e:
+            _avisar(progreso, NIVEL_ERROR, f"Error durante el proceso de OCR: {e}")
+            raise
+
+
+@lru_cache(maxsize=8)
+def _codificador_tokens(modelo):
+    """Devuelve el tokenizador de tiktoken para el modelo (o None si no hay)"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(modelo) if modelo else tiktoken.get_encoding("o200k_base")
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+
+def contar_tokens(texto, modelo=None):
+    """
+    Cuenta los tokens de un texto con el tokenizador del modelo.
+    Si tiktoken no está disponible, estima 4 caracteres por token.
+    
+    Args:
+        texto (str): Texto a medir
+        modelo (str, optional): Nombre del modelo (ej. "gpt-4.1-mini")
+    
+    Returns:
+        int: Número de tokens
+    """
+    codificador = _codificador_tokens(modelo)
+    if codificador is None:
+        return len(texto) // 4 + 1
+    return len(codificador.encode(texto, disallowed_special=()))
+
+
+def _nombre_modelo(llm_instance):
+    """Obtiene el nombre del modelo de una instancia de LangChain"""
+    # Modelo envuelto con .with_config() (p. ej. por consumo_llm.con_consumo)
+    llm_instance = getattr(llm_instance, "bound", llm_instance)
+    return getattr(llm_instance, "model_name", None) or getattr(llm_instance, "model", None)
 
 
-def resumen_documento(docs, llm_instance, resumen_prompt):
-    texto = "\n\n".join([doc.page_content for doc in docs])
-    texto_corto = texto[:1500000]
+def _texto_respuesta(respuesta):
+    """Extrae el texto de la respuesta de un LLM"""
+    return respuesta.content.strip() if hasattr(respuesta, 'content') else str(respuesta).strip()
+
+
+def _formatear_prompt(resumen_prompt, texto, pregunta=""):
+    """
+    Construye el prompt final a partir de un PromptTemplate (variables
+    context/question) o de un str (placeholder {document_text} o concatenación).
+    """
+    if "context" in getattr(resumen_prompt, "input_variables", []):
+        return resumen_prompt.format(context=texto, question=pregunta)
     
     # Verificar si el prompt tiene placeholder
     if "{document_text}" in resumen_prompt:
-        prompt_final = resumen_prompt.format(document_text=texto_corto)
+        prompt_final = resumen_prompt.format(document_text=texto)
     else:
         # Concatenar el prompt con el texto
-        prompt_final = f"{resumen_prompt}\n\n{texto_corto}"
+        prompt_final = f"{resumen_prompt}\n\n{texto}"
+    return f"{prompt_final}\n\n{pregunta}" if pregunta else prompt_final
+
+
+def _texto_con_paginas(docs):
+    """Une el texto de las páginas marcando el número de cada una"""
+    return "\n\n".join(
+        f"[Página {doc.metadata.get('page', i) + 1}]\n{doc.page_content}"
+        for i, doc in enumerate(docs)
+    )
+
+
+def _agrupar_por_tokens(textos, max_tokens, modelo=None):
+    """
+    Agrupa elementos consecutivos sin superar `max_tokens` por grupo.
+    Un elemento que por sí solo supera el presupuesto queda en su propio grupo.
+    
+    Args:
+        textos (list): Lista de (elemento, texto)
+    
+    Returns:
+        list: Lista de grupos (listas de elementos)
+    """
+    grupos = []
+    actual = []
+    tokens_actual = 0
+    for elemento, texto in textos:
+        tokens = contar_tokens(texto, modelo)
+        if actual and tokens_actual + tokens > max_tokens:
+            grupos.append(actual)
+            actual = []
+            tokens_actual = 0
+        actual.append(elemento)
+        tokens_actual += tokens
+    if actual:
+        grupos.append(actual)
+    return grupos
+
+
+def _tokens_por_fragmento(resumen_prompt, max_tokens, modelo=None):
+    """
+    Tokens de texto por fragmento del map-reduce: como mucho
+    TOKENS_POR_FRAGMENTO, y menos si hace falta para que el prompt completo
+    (instrucciones, pregunta y texto) no supere `max_tokens`.
+    """
+    pregunta_mapa = PREGUNTA_MAPA.format(indice=999, total=999, desde=99999, hasta=99999)
+    sobrecarga = max(
+        contar_tokens(_formatear_prompt(resumen_prompt, "", pregunta), modelo)
+        for pregunta in (pregunta_mapa, PREGUNTA_REDUCCION)
+    )
+    return max(1, min(TOKENS_POR_FRAGMENTO, max_tokens - sobrecarga))
+
+
+def _resumen_map_reduce(docs, llm_instance, resumen_prompt, max_tokens, modelo=None, progreso=None):
+    """
+    Resume un documento extenso por fragmentos: cada fragmento se resume en
+    paralelo con el mismo índice de 9 secciones (map) y luego los resúmenes
+    parciales se consolidan hasta que caben en una sola llamada (reduce).
+    
+    Returns:
+        tuple: (prompt de la reducción final, None) o (None, resumen) si
+        el documento quedó en un único resumen parcial
+    """
+    por_fragmento = _tokens_por_fragmento(resumen_prompt, max_tokens, modelo)
+    fragmentos = _agrupar_por_tokens(
+        [(doc, _texto_con_paginas([doc])) for doc in docs], por_fragmento, modelo
+    )
+    _avisar(progreso, NIVEL_INFO, f"📚 Documento extenso: se resumirá en {len(fragmentos)} fragmentos en paralelo")
+    
+    prompts_mapa = []
+    for indice, fragmento in enumerate(fragmentos, start=1):
+        pregunta = PREGUNTA_MAPA.format(
+            indice=indice,
+            total=len(fragmentos),
+            desde=fragmento[0].metadata.get("page", 0) + 1,
+            hasta=fragmento[-1].metadata.get("page", 0) + 1,
+        )
+        prompts_mapa.append(_formatear_prompt(resumen_prompt, _texto_con_paginas(fragmento), pregunta))
+    
+    config = {"max_concurrency": MAX_CONCURRENCIA_LLM}
+    parciales = [_texto_respuesta(r) for r in llm_instance.batch(prompts_mapa, config=config)]
+    
+    # Si los resúmenes parciales aún no caben, consolidarlos por niveles
+    while len(parciales) > 1 and contar_tokens("\n\n---\n\n".join(parciales), modelo) > por_fragmento:
+        grupos = _agrupar_por_tokens([(p, p) for p in parciales], por_fragmento, modelo)
+        if len(grupos) == len(parciales):
+            break
+        prompts = [
+            _formatear_prompt(resumen_prompt, "\n\n---\n\n".join(grupo), PREGUNTA_REDUCCION)
+            for grupo in grupos
+        ]
+        parciales = [_texto_respuesta(r) for r in llm_instance.batch(prompts, config=config)]
+    
+    if len(parciales) == 1:
+        return None, parciales[0]
+    
+    return _formatear_prompt(resumen_prompt, "\n\n---\n\n".join(parciales), PREGUNTA_REDUCCION), None
+
+
+def _preparar_resumen(docs, llm_instance, resumen_prompt, max_tokens, progreso=None):
+    """
+    Preprocesa el texto, decide entre llamada única y map-reduce y devuelve
+    el prompt de la llamada final (o el resumen ya listo si no hace falta
+    otra llamada).
+    """
+    from preprocesamiento import preprocesar_documento, porcentaje_reduccion
+    
+    max_tokens = max_tokens or MAX_TOKENS_DOCUMENTO
+    modelo = _nombre_modelo(llm_instance)
+    
+    # Quitar encabezados, pies y relleno antes de medir y enviar el texto
+    docs, estadisticas = preprocesar_documento(docs, modelo)
+    _avisar(
+        progreso, NIVEL_INFO,
+        f"🧹 Texto preprocesado: {estadisticas['tokens_antes']} → {estadisticas['tokens_despues']} tokens "
+        f"(-{porcentaje_reduccion(estadisticas):.1f}%)"
+    )
+    if estadisticas["tokens_despues"] > max_tokens:
+        return _resumen_map_reduce(docs, llm_instance, resumen_prompt, max_tokens, modelo, progreso)
+    
+    # El presupuesto es del prompt completo (instrucciones incluidas), igual
+    # que en cada llamada del map-reduce
+    prompt_final = _formatear_prompt(resumen_prompt, "\n\n".join([doc.page_content for doc in docs]))
+    if contar_tokens(prompt_final, modelo) > max_tokens:
+        return _resumen_map_reduce(docs, llm_instance, resumen_prompt, max_tokens, modelo, progreso)
+    return prompt_final, None
+
+
+def resumen_documento(docs, llm_instance, resumen_prompt, max_tokens=None, progreso=None, modo=MODO_COMPLETO,
+                      lanzar_errores=False):
+    """
+    Genera el resumen ejecutivo de un documento.
+    Si el texto cabe en el presupuesto de tokens se envía en una sola llamada;
+    si no, se activa automáticamente el modo por fragmentos (map-reduce), sin
+    truncar el documento. En MODO_SECCIONES cada sección se redacta aparte
+    con los trozos relevantes del pliego (ver recuperacion.py) y
+    `resumen_prompt` no se usa.
+    
+    Args:
+        docs: Lista de objetos Document
+        llm_instance: Instancia del modelo LLM
+        resumen_prompt: PromptTemplate o str con el prompt del resumen
+        max_tokens (int, optional): Presupuesto de tokens para el documento
+        progreso: Callback progreso(nivel, mensaje, avance) (opcional)
+        modo (str): MODO_COMPLETO o MODO_SECCIONES
+        lanzar_errores (bool): Propagar el error en lugar de devolver un texto
+            de aviso, para que un análisis fallido no se guarde ni se cachee
+    
+    Returns:
+        str: Resumen generado
+    """
+    if modo == MODO_SECCIONES:
+        return "".join(resumen_documento_stream(docs, llm_instance, resumen_prompt, max_tokens, progreso, modo,
+                                                lanzar_errores=lanzar_errores)).strip()
     
     try:
-        respuesta = llm_instance.invoke(prompt_final)
-        return respuesta.content.strip() if hasattr(respuesta, 'content') else str(respuesta).strip()
+        with span("resumen_llm", modo=modo, paginas=len(docs)):
+            prompt_final, resumen = _preparar_resumen(docs, llm_instance, resumen_prompt, max_tokens, progreso)
+            if resumen is not None:
+                return resumen
+            
+            respuesta = llm_instance.invoke(prompt_final)
+            return _texto_respuesta(respuesta)
     except Exception as e:
-        st.error(f"Error generando resumen: {e}")
+        _avisar(progreso, NIVEL_ERROR, f"Error generando resumen: {e}")
+        if lanzar_errores:
+            raise
         return "No se pudo generar el resumen."
 
 
+def resumen_documento_stream(docs, llm_instance, resumen_prompt, max_tokens=None, progreso=None, modo=MODO_COMPLETO,
+                             lanzar_errores=False):
+    """
+    Versión en streaming de resumen_documento: produce el texto del resumen
+    a medida que el modelo lo genera (con `.stream()` de LangChain).
+    En modo map-reduce solo se transmite la consolidación final.
+    
+    Args:
+        docs: Lista de objetos Document
+        llm_instance: Instancia del modelo LLM
+        resumen_prompt: PromptTemplate o str con el prompt del resumen
+        max_tokens (int, optional): Presupuesto de tokens para el documento
+        progreso: Callback progreso(nivel, mensaje, avance) (opcional)
+        modo (str): MODO_COMPLETO o MODO_SECCIONES
+        lanzar_errores (bool): Propagar el error en lugar de devolver un texto
+            de aviso, para que un análisis fallido no se guarde ni se cachee
+    
+    Yields:
+        str: Fragmentos de texto del resumen
+    """
+    try:
+        with span("resumen_llm", modo=modo, paginas=len(docs)):
+            if modo == MODO_SECCIONES:
+                from recuperacion import resumen_por_secciones
+                yield from resumen_por_secciones(docs, llm_instance, progreso=progreso,
+                                                 lanzar_errores=lanzar_errores)
+                return
+            
+            prompt_final, resumen = _preparar_resumen(docs, llm_instance, resumen_prompt, max_tokens, progreso)
+            if resumen is not None:
+                yield resumen
+                return
+            
+            for chunk in llm_instance.stream(prompt_final):
+                texto = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if texto:
+                    yield texto
+    except Exception as e:
+        _avisar(progreso, NIVEL_ERROR, f"Error generando resumen: {e}")
+        if lanzar_errores:
+            raise
+        yield "No se pudo generar el resumen."
+
+
+def medir_stream(fragmentos, etapa, metricas):
+    """
+    Envuelve un generador de texto y registra en metricas[etapa] el tiempo
+    hasta el primer token (ttft_s) y el tiempo total (total_s), en segundos.
+    
+    Args:
+        fragmentos: Iterable de fragmentos de texto
+        etapa (str): Nombre de la etapa (ej. "resumen")
+        metricas (dict): Diccionario donde se guardan las mediciones
+    
+    Yields:
+        str: Los mismos fragmentos recibidos
+    """
+    inicio = time.perf_counter()
+    ttft = None
+    for fragmento in fragmentos:
+        if ttft is None and fragmento:
+            ttft = time.perf_counter() - inicio
+        yield fragmento
+    total = time.perf_counter() - inicio
+    metricas[etapa] = {"ttft_s": ttft, "total_s": total}
+    print(f"⏱️ {etapa}: primer token {ttft if ttft is not None else float('nan'):.2f}s, total {total:.2f}s")
+
+